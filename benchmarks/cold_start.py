@@ -0,0 +1,113 @@
+"""Repeatable offline cold-start benchmark for advanced_orchestrator.
+
+    python benchmarks/cold_start.py --runs 10
+    python benchmarks/cold_start.py --runs 10 --save benchmarks/cold_start_baseline.json
+    python benchmarks/cold_start.py --runs 10 --baseline benchmarks/cold_start_baseline.json
+
+Each run is a fresh interpreter that times the module import, the first
+query (which builds agents and clients lazily) and a second, warm query.
+AWS clients are replaced by in-process fakes, so no network or
+credentials are needed. With --baseline the run fails (exit 1) when a
+median regresses by more than --tolerance.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda')
+
+CHILD = r'''
+import io, json, sys, time
+sys.path.insert(0, sys.argv[1])
+started = time.perf_counter()
+import advanced_orchestrator as ao
+import aws_clients
+import_ms = (time.perf_counter() - started) * 1000
+
+class Body(io.BytesIO):
+    pass
+
+class FakeRuntime:
+    def invoke_model(self, modelId, body):
+        prompt = json.loads(body)['messages'][0]['content']
+        if prompt.startswith('Extract'):
+            text = '{"department": "police", "years_of_service": 15}'
+        elif prompt.startswith('Rewrite'):
+            text = 'police vacation days with 15 years of service'
+        elif prompt.startswith('You are a fact-checking'):
+            text = '{"is_valid": true, "confidence": 0.9, "issues": []}'
+        else:
+            text = 'Police officers with 15 years of service accrue 20 vacation days per year.'
+        return {'body': Body(json.dumps({'content': [{'text': text}]}).encode())}
+
+class FakeAgentRuntime:
+    def retrieve(self, **kwargs):
+        return {'retrievalResults': [
+            {'content': {'text': 'Police officers with 15 years of service accrue 20 vacation days per year.'},
+             'location': {'s3Location': {'uri': 's3://policies/vacation.pdf'}}, 'score': 0.82},
+            {'content': {'text': 'Sick leave accrues at 8 hours per month.'},
+             'location': {'s3Location': {'uri': 's3://policies/sick.pdf'}}, 'score': 0.55}]}
+
+fakes = {'bedrock-runtime': FakeRuntime(), 'bedrock-agent-runtime': FakeAgentRuntime()}
+aws_clients._create = lambda service, stage, resource: fakes[service]
+
+def invoke(query):
+    event = {'body': json.dumps({'action': 'query', 'query': query, 'session_id': 'bench'})}
+    started = time.perf_counter()
+    response = ao.lambda_handler(event, None)
+    assert response['statusCode'] == 200, response['body']
+    return (time.perf_counter() - started) * 1000
+
+first_ms = invoke('How many vacation days do police officers get?')
+warm_ms = invoke('What about sick leave?')
+print('RESULT ' + json.dumps({'import_ms': import_ms, 'first_invoke_ms': first_ms, 'warm_invoke_ms': warm_ms,
+                              'init_ms': ao.INIT_PROFILE}))
+'''
+
+METRICS = ('import_ms', 'first_invoke_ms', 'warm_invoke_ms', 'cold_total_ms')
+
+
+def run_once(env):
+    out = subprocess.run([sys.executable, '-c', CHILD, LAMBDA_DIR], env=env, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr)
+    line = next(l for l in out.stdout.splitlines() if l.startswith('RESULT '))
+    result = json.loads(line[len('RESULT '):])
+    result['cold_total_ms'] = result['import_ms'] + result['first_invoke_ms']
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--save', help='Write the summary as a new baseline')
+    parser.add_argument('--baseline', help='Compare medians with a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed fractional regression')
+    args = parser.parse_args()
+
+    env = dict(os.environ, KNOWLEDGE_BASE_ID='bench-kb', AWS_REGION='us-east-1', MEMORY_BACKEND='memory',
+               ANSWER_CACHE='false', PYTHONDONTWRITEBYTECODE='1')
+    env.pop('ANSWER_CACHE_TABLE', None)
+    env.pop('DATA_SOURCE_ID', None)
+
+    runs = [run_once(env) for _ in range(args.runs)]
+    summary = {m: round(statistics.median(r[m] for r in runs), 1) for m in METRICS}
+    summary['p90_cold_total_ms'] = round(sorted(r['cold_total_ms'] for r in runs)[int(0.9 * (len(runs) - 1))], 1)
+    summary['init_ms'] = {k: round(statistics.median(r['init_ms'].get(k, 0) for r in runs), 1)
+                          for k in sorted(set().union(*(r['init_ms'] for r in runs)))}
+    print(json.dumps(summary, indent=2))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(summary, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = [f"{m}: {summary[m]} ms vs baseline {baseline[m]} ms"
+                       for m in METRICS if m in baseline and summary[m] > baseline[m] * (1 + args.tolerance)]
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,90 @@
+"""Prompt tokens per turn over a long conversation: verbatim window vs rolling summary.
+
+    python benchmarks/conversation_length_bench.py --turns 30 --latency-scale 0
+
+Runs one conversation of --turns queries (the VALIDATION_USE_CASES.md
+queries and their follow-ups, in order) through the orchestrator twice,
+with MEMORY_COMPACTION=window and =summary, against the load test's
+simulated Bedrock. Each turn's input tokens are read from its trace and
+split into the per-turn prompts (extraction, enhancement, generation,
+validation) and the occasional summary refresh.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'lambda'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import FOLLOW_UPS, LATENCY, Latency, SimulatedBedrock, load_use_cases
+
+
+def queries(cases, turns):
+    conversation = []
+    for case in cases:
+        conversation.append(case['query'])
+        conversation.extend(f"{f} ({case['query'][:40]})" for f in FOLLOW_UPS)
+    return (conversation * (turns // len(conversation) + 1))[:turns]
+
+
+def measure(ao, store, conversation, session_id):
+    ao._memory_store = store
+    orchestrator = ao.get_orchestrator()
+    turns = []
+    for query in conversation:
+        result = orchestrator.process(query, session_id, debug=True)
+        calls = result['debug']['calls']
+        turns.append({
+            'prompt_tokens': sum(c['input_tokens'] for c in calls if c['stage'] != 'summary'),
+            'generation_tokens': sum(c['input_tokens'] for c in calls if c['stage'] == 'generation'),
+            'summary_tokens': sum(c['input_tokens'] + c['output_tokens'] for c in calls if c['stage'] == 'summary'),
+            'context': result['memory']
+        })
+    item = store.backend.get(session_id)
+    return {
+        'prompt_tokens_by_turn': [t['prompt_tokens'] for t in turns],
+        'generation_tokens_by_turn': [t['generation_tokens'] for t in turns],
+        'summary_calls': sum(1 for t in turns if t['summary_tokens']),
+        'summary_tokens_total': sum(t['summary_tokens'] for t in turns),
+        'last_context': turns[-1]['context'],
+        'stored_item_bytes': len(json.dumps(item, default=str))
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--turns', type=int, default=30)
+    parser.add_argument('--latency-scale', type=float, default=0.0, help='Multiply every simulated latency')
+    parser.add_argument('--use-cases', default=os.path.join(ROOT, 'VALIDATION_USE_CASES.md'))
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ.update(KNOWLEDGE_BASE_ID='bench-kb', AWS_REGION='us-east-1', MEMORY_BACKEND='memory',
+                      ANSWER_CACHE='false', MODEL_CACHE='false', METRICS_EMF='false', MEMORY_L1_MAX_SESSIONS='0')
+    os.environ.pop('DATA_SOURCE_ID', None)
+    cases = load_use_cases(args.use_cases)
+    conversation = queries(cases, args.turns)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import advanced_orchestrator as ao
+        import aws_clients
+        from memory_store import InMemoryMemoryBackend, MemoryStore
+
+        aws_clients._create = lambda service, stage, resource: SimulatedBedrock(
+            cases, Latency(LATENCY, args.latency_scale, args.seed))
+        report = {
+            'window': measure(ao, MemoryStore(InMemoryMemoryBackend(), max_turns=ao.MEMORY_MAX_TURNS),
+                              conversation, 'bench-window'),
+            'summary': measure(ao, MemoryStore(InMemoryMemoryBackend(), max_turns=ao.MEMORY_WINDOW_TURNS,
+                                               summarizer=ao.build_summarizer()),
+                               conversation, 'bench-summary')
+        }
+
+    for mode in report.values():
+        by_turn = mode['prompt_tokens_by_turn']
+        tail = by_turn[len(by_turn) // 2:]
+        mode['prompt_tokens_second_half'] = {'min': min(tail), 'max': max(tail), 'mean': round(sum(tail) / len(tail), 1)}
+    print(json.dumps(report, indent=2))
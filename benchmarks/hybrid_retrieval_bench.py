@@ -0,0 +1,96 @@
+"""Offline recall@k/latency comparison of vector-only, BM25-only and hybrid (RRF) retrieval.
+
+    python benchmarks/hybrid_retrieval_bench.py --count 5000 --k 3
+
+The synthetic corpus has two query kinds: "exact" queries name a plan code
+that only one chunk contains but embed close to a whole topic, "semantic"
+queries embed close to one chunk but share no rare terms with it.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+from lexical_index import BM25Index, reciprocal_rank_fusion
+from vector_index import VectorIndex, build_index
+
+TOPICS = ['vacation accrual', 'sick leave', 'retirement tier', 'overtime pay', 'parental leave',
+          'holiday schedule', 'health benefits', 'bereavement leave']
+COUNTIES = ['Fresno', 'Kern', 'Marin', 'Napa', 'Orange', 'Placer', 'Shasta', 'Tulare', 'Yolo', 'Sonoma']
+
+
+def corpus(count, dim, rng):
+    centers = rng.standard_normal((len(TOPICS), dim)).astype(np.float32)
+    labels = rng.integers(len(TOPICS), size=count)
+    embeddings = centers[labels] + 0.35 * rng.standard_normal((count, dim)).astype(np.float32)
+    records = []
+    for i, label in enumerate(labels):
+        county = COUNTIES[i % len(COUNTIES)]
+        records.append({
+            'content': f"{county} County {TOPICS[label]} policy for plan code PX-{i:05d}. "
+                       f"Employees under this plan follow the standard {TOPICS[label]} rules.",
+            'source': f"synthetic://{i}"
+        })
+    return centers, labels, embeddings, records
+
+
+def queries(count, centers, labels, embeddings, rng):
+    out = []
+    for n, target in enumerate(rng.choice(len(labels), count, replace=False)):
+        topic = TOPICS[labels[target]]
+        if n % 2 == 0:
+            vector = centers[labels[target]] + 0.8 * rng.standard_normal(centers.shape[1])
+            out.append(('exact', f"What is the {topic} under plan code PX-{target:05d}?", vector, target))
+        else:
+            vector = embeddings[target] + 0.1 * rng.standard_normal(centers.shape[1])
+            out.append(('semantic', f"how does {topic} work for me", vector, target))
+    return out
+
+
+def timed(fn):
+    begin = time.perf_counter()
+    value = fn()
+    return value, (time.perf_counter() - begin) * 1000
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=5000)
+    parser.add_argument('--dim', type=int, default=256)
+    parser.add_argument('--queries', type=int, default=400)
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--rrf-k', type=int, default=60)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    centers, labels, embeddings, records = corpus(args.count, args.dim, rng)
+    workload = queries(args.queries, centers, labels, embeddings, rng)
+
+    with tempfile.TemporaryDirectory() as path:
+        build_index(path, embeddings, records)
+        vector_index = VectorIndex(path)
+        lexical_index, build_ms = timed(lambda: BM25Index(vector_index.records))
+        print(f"BM25 build: {build_ms:.1f} ms for {len(lexical_index)} chunks")
+
+        modes = {
+            'vector': lambda text, vector: vector_index.retrieve(vector, args.k),
+            'bm25': lambda text, vector: lexical_index.retrieve(text, args.k),
+            'hybrid': lambda text, vector: reciprocal_rank_fusion(
+                [vector_index.retrieve(vector, args.k * 2), lexical_index.retrieve(text, args.k * 2)],
+                args.rrf_k, args.k),
+        }
+        print(f"{'mode':<8}{'recall exact':>14}{'recall semantic':>17}{'recall all':>12}{'p50 ms':>9}{'p95 ms':>9}")
+        for name, search in modes.items():
+            hits = {'exact': [], 'semantic': []}
+            latencies = []
+            for kind, text, vector, target in workload:
+                documents, elapsed = timed(lambda: search(text, vector))
+                latencies.append(elapsed)
+                hits[kind].append(f"synthetic://{target}" in [d['source'] for d in documents])
+            overall = hits['exact'] + hits['semantic']
+            print(f"{name:<8}{np.mean(hits['exact']):>14.3f}{np.mean(hits['semantic']):>17.3f}"
+                  f"{np.mean(overall):>12.3f}{np.percentile(latencies, 50):>9.2f}{np.percentile(latencies, 95):>9.2f}")
@@ -0,0 +1,90 @@
+"""Streaming ingestion: peak memory and chunk throughput of IngestionPipeline.
+
+    python benchmarks/ingest_pipeline_bench.py --megabytes 20 --embed-ms 20
+
+Writes a synthetic text document of the given size to a temporary
+directory and ingests it with a stub embedder that sleeps --embed-ms per
+batch (Titan's round trip is the bottleneck, not the arithmetic). Runs
+once per --workers value and reports chunks/sec and the peak Python heap
+tracked by tracemalloc, which grows only by the hash the writer keeps per
+chunk as --megabytes grows, not with the document itself.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+
+from ingest import ChunkWriter, IngestionPipeline, LocalObjectStore
+
+WORDS = ('coverage deductible premium policy claim liability collision comprehensive renewal '
+         'exclusion endorsement beneficiary underwriting rider annuity term whole life auto home').split()
+
+
+def write_document(path, megabytes, seed):
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        written = 0
+        while written < megabytes * 1024 * 1024:
+            line = ' '.join(rng.choice(WORDS) for _ in range(200)) + '.\n'
+            f.write(line)
+            written += len(line)
+
+
+def stub_embedder(dim, delay_ms):
+    def embed_batch(texts):
+        time.sleep(delay_ms / 1000)
+        return [np.frombuffer(hashlib.sha256(t.encode()).digest() * (dim // 32 + 1), dtype=np.uint8)[:dim]
+                .astype(np.float32) for t in texts]
+    return embed_batch
+
+
+def measure(store, state_dir, args, workers):
+    pipeline = IngestionPipeline(store, stub_embedder(args.dim, args.embed_ms), chunk_size=args.chunk_size,
+                                 overlap=args.overlap, batch_size=args.batch_size, workers=workers)
+    writer = ChunkWriter(state_dir)
+    tracemalloc.start()
+    started = time.perf_counter()
+    stages = pipeline.run(store.list_objects(), writer.add)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    writer.finish()
+    return {
+        'workers': workers,
+        'chunks': writer.count,
+        'seconds': round(elapsed, 2),
+        'chunks_per_second': round(writer.count / elapsed, 1),
+        'peak_heap_mb': round(peak / 1024 / 1024, 2),
+        'embed_busy_ms': stages['embed']['busy_ms'],
+        'wait_ms': stages['wait']['busy_ms']
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--megabytes', type=float, default=20, help='Size of the synthetic document')
+    parser.add_argument('--embed-ms', type=float, default=20, help='Simulated latency per embedding batch')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4, 8])
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--chunk-size', type=int, default=300)
+    parser.add_argument('--overlap', type=int, default=50)
+    parser.add_argument('--dim', type=int, default=256)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        docs = os.path.join(tmp, 'docs')
+        os.makedirs(docs)
+        write_document(os.path.join(docs, 'large.txt'), args.megabytes, args.seed)
+        store = LocalObjectStore(docs)
+        runs = [measure(store, os.path.join(tmp, f'state{w}'), args, w) for w in args.workers]
+    print(json.dumps({'document_mb': args.megabytes, 'runs': runs}, indent=2))
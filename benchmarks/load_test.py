@@ -0,0 +1,340 @@
+"""Offline load test for lambda_handler against a simulated Bedrock backend.
+
+    python benchmarks/load_test.py --conversations 24 --turns 3 --concurrency 8
+    python benchmarks/load_test.py --latency-scale 0.1 --save benchmarks/load_baseline.json
+    python benchmarks/load_test.py --latency-scale 0.1 --baseline benchmarks/load_baseline.json
+
+Each conversation starts with a query from VALIDATION_USE_CASES.md and
+continues with follow-up turns in the same session. Bedrock models, the
+Knowledge Base and DynamoDB are replaced by in-process stand-ins that
+sleep for a sampled latency and return the use case's canned documents,
+answer and validation verdict, so the full pipeline runs without AWS.
+
+Latencies are log-normal per operation (median in ms and sigma);
+--latency takes a JSON file overriding entries of LATENCY and
+--latency-scale shrinks all of them for quick runs. The report has
+p50/p95/p99 per pipeline stage and end to end, plus requests/second;
+--save writes it as a baseline and --baseline fails (exit 1) when the
+end-to-end percentiles or throughput regress by more than --tolerance.
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'lambda'))
+
+# Median latency (ms) and log-normal sigma per simulated operation
+LATENCY = {
+    'extraction': {'median_ms': 450, 'sigma': 0.3},
+    'enhancement': {'median_ms': 550, 'sigma': 0.3},
+    'analysis': {'median_ms': 650, 'sigma': 0.3},
+    'generation': {'median_ms': 2400, 'sigma': 0.35},
+    'validation': {'median_ms': 1300, 'sigma': 0.3},
+    'embedding': {'median_ms': 60, 'sigma': 0.2},
+    'summary': {'median_ms': 600, 'sigma': 0.3},
+    'retrieve': {'median_ms': 320, 'sigma': 0.25},
+    'memory_get': {'median_ms': 8, 'sigma': 0.3},
+    'memory_write': {'median_ms': 12, 'sigma': 0.3},
+}
+
+FOLLOW_UPS = [
+    "What about if I had 20 years of service instead?",
+    "Does that change if I work part time?",
+    "How does that compare with sick leave?",
+    "Where is that written in the policy?",
+]
+
+PERCENTILES = (50, 95, 99)
+
+
+def load_use_cases(path):
+    """Query, source document, answer and validation verdict of each use case"""
+    with open(path) as f:
+        text = f.read()
+    cases = []
+    for section in re.split(r'\n## Use Case \d+: ', text)[1:]:
+        blocks = re.findall(r'### ([^\n]+)\n```(?:json)?\n(.*?)```', section, re.S)
+        parts = {heading.split(' (')[0].strip(): body.strip() for heading, body in blocks}
+        if 'Query' not in parts:
+            continue
+        cases.append({
+            'query': json.loads(parts['Query'])['query'],
+            'document': parts.get('Source Document Content', ''),
+            'answer': parts.get('RAG Response', 'The policy documents do not cover this.'),
+            'validation': parts.get('Validation Result', '{"is_valid": true, "confidence": 0.9, "issues": []}')
+        })
+    return cases
+
+
+class Latency:
+    def __init__(self, table, scale, seed):
+        self.table = table
+        self.scale = scale
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def sleep(self, op):
+        spec = self.table[op]
+        with self.lock:
+            sample = spec['median_ms'] * math.exp(self.rng.gauss(0, spec['sigma']))
+        time.sleep(sample * self.scale / 1000)
+
+
+class Body(io.BytesIO):
+    pass
+
+
+REWRITE_SUFFIX = re.compile(r'\s*\[[^\]]*\]$')
+
+
+def rewrite(query, context):
+    """Enhanced query as the simulated Haiku writes it; case_for strips the suffix again"""
+    return f"{query} [{context.strip() or 'employee policy'}]"
+
+
+class SimulatedBedrock:
+    """bedrock-runtime and bedrock-agent-runtime stand-in with canned use-case responses"""
+
+    def __init__(self, cases, latency):
+        self.latency = latency
+        self.cases = cases
+        self.by_query = {}
+        for case in cases:
+            self.by_query[case['query']] = case
+            for follow_up in FOLLOW_UPS:
+                self.by_query[f"{follow_up} ({case['query'][:40]})"] = case
+        self.default = cases[0]
+
+    def case_for(self, query):
+        return self.by_query.get(REWRITE_SUFFIX.sub('', query.strip()), self.default)
+
+    def invoke_model(self, modelId, body):
+        request = json.loads(body)
+        if 'inputText' in request:
+            self.latency.sleep('embedding')
+            rng = random.Random(request['inputText'])
+            return {'body': Body(json.dumps({'embedding': [rng.gauss(0, 1) for _ in range(1536)],
+                                             'inputTextTokenCount': len(request['inputText']) // 4}).encode())}
+        prompt = request['messages'][0]['content']
+        op, text = self.respond(prompt)
+        self.latency.sleep(op)
+        usage = {'input_tokens': len(prompt) // 4, 'output_tokens': max(1, len(text) // 4)}
+        return {'body': Body(json.dumps({'content': [{'text': text}], 'usage': usage}).encode())}
+
+    def invoke_model_with_response_stream(self, modelId, body):
+        prompt = json.loads(body)['messages'][0]['content']
+        op, text = self.respond(prompt)
+        self.latency.sleep(op)
+        words = text.split(' ')
+        events = [{'chunk': {'bytes': json.dumps({'type': 'message_start', 'message': {
+            'usage': {'input_tokens': len(prompt) // 4, 'output_tokens': 1}}}).encode()}}]
+        events += [{'chunk': {'bytes': json.dumps({'type': 'content_block_delta', 'delta': {
+            'type': 'text_delta', 'text': w + ' '}}).encode()}} for w in words]
+        events.append({'chunk': {'bytes': json.dumps({'type': 'message_delta', 'usage': {
+            'output_tokens': max(1, len(text) // 4)}}).encode()}})
+        return {'body': iter(events)}
+
+    def respond(self, prompt):
+        if prompt.startswith('Extract'):
+            return 'extraction', '{}'
+        if prompt.startswith('Analyze'):
+            query = re.search(r'\nQuery: "(.*)"', prompt).group(1)
+            return 'analysis', json.dumps({'entities': {}, 'enhanced_query': rewrite(query, '')})
+        if prompt.startswith('Rewrite'):
+            # A real rewrite depends on the entities, so speculation on stale ones misses
+            return 'enhancement', rewrite(re.search(r'Current query: "(.*)"', prompt).group(1),
+                                          re.search(r'User context: (.*)', prompt).group(1))
+        if prompt.startswith('Summarize'):
+            # Keep the previous summary and add one clause per folded question
+            previous = re.search(r'Previous summary: (.*)', prompt).group(1)
+            asked = '; '.join(q[:60] for q in re.findall(r'\nUser: (.*)', prompt))
+            return 'summary', ('' if previous == 'none' else previous + ' ') + f"The user asked about {asked}."
+        if prompt.startswith('You are a fact-checking'):
+            return 'validation', self.case_for(re.search(r'User Question: (.*)', prompt).group(1))['validation']
+        return 'generation', self.case_for(re.search(r'\nQuestion: (.*)', prompt).group(1))['answer']
+
+    def retrieve(self, knowledgeBaseId, retrievalQuery, retrievalConfiguration):
+        self.latency.sleep('retrieve')
+        case = self.case_for(retrievalQuery['text'])
+        filler = [c for c in self.cases if c is not case][:4]
+        documents = [case] + filler
+        return {'retrievalResults': [
+            {'content': {'text': c['document']},
+             'location': {'s3Location': {'uri': f"s3://policies/case-{i}.txt"}},
+             'score': round(0.85 - 0.1 * i, 2)}
+            for i, c in enumerate(documents)]}
+
+
+class SimulatedMemoryBackend:
+    """DynamoDB stand-in: in-memory items behind a round-trip delay"""
+
+    def __init__(self, backend, latency):
+        self.backend = backend
+        self.latency = latency
+
+    def get(self, session_id):
+        self.latency.sleep('memory_get')
+        return self.backend.get(session_id)
+
+    def version(self, session_id):
+        self.latency.sleep('memory_get')
+        return self.backend.version(session_id)
+
+    def write(self, session_id, expected_version, change):
+        self.latency.sleep('memory_write')
+        return self.backend.write(session_id, expected_version, change)
+
+
+def conversation(cases, index, turns):
+    case = cases[index % len(cases)]
+    queries = [case['query']] + [f"{f} ({case['query'][:40]})" for f in FOLLOW_UPS]
+    return f"load-{index}", queries[:turns]
+
+
+def percentiles(values):
+    ordered = sorted(values)
+    if not ordered:
+        return {f"p{p}": None for p in PERCENTILES}
+    return {f"p{p}": round(ordered[min(len(ordered) - 1, int(math.ceil(p / 100 * len(ordered))) - 1)], 1)
+            for p in PERCENTILES}
+
+
+def run(ao, cases, args):
+    end_to_end = []
+    stages = {}
+    calls = []
+    tokens = {'input': 0, 'output': 0}
+    speculation = {}
+    errors = 0
+    lock = threading.Lock()
+
+    def converse(index):
+        nonlocal errors
+        session_id, queries = conversation(cases, index, args.turns)
+        for query in queries:
+            body = {'action': 'query', 'query': query, 'session_id': session_id, 'debug': True,
+                    'stream': args.stream, 'async_validation': args.async_validation}
+            started = time.perf_counter()
+            response = ao.lambda_handler({'body': json.dumps(body)}, None)
+            elapsed = (time.perf_counter() - started) * 1000
+            if response['statusCode'] != 200:
+                with lock:
+                    errors += 1
+                continue
+            payload = response['body']
+            if args.stream:
+                payload = payload.strip().split('data: ')[-1]
+            debug = json.loads(payload)['debug']
+            with lock:
+                end_to_end.append(elapsed)
+                calls.append(len(debug['calls']))
+                tokens['input'] += debug['tokens']['input']
+                tokens['output'] += debug['tokens']['output']
+                for name, timing in debug['stages'].items():
+                    stages.setdefault(name, []).append(timing['duration_ms'])
+                for name, outcome in debug['speculation'].items():
+                    outcomes = speculation.setdefault(name, {})
+                    outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(converse, range(args.conversations)))
+    wall = time.perf_counter() - started
+    return {
+        'config': {'conversations': args.conversations, 'turns': args.turns, 'concurrency': args.concurrency,
+                   'latency_scale': args.latency_scale, 'stream': args.stream,
+                   'async_validation': args.async_validation, 'orchestrator_mode': args.mode,
+                   'query_analysis': args.analysis, 'model_cache': args.model_cache,
+                   'memory_compaction': args.memory_compaction},
+        'requests': len(end_to_end),
+        'errors': errors,
+        'requests_per_second': round(len(end_to_end) / wall, 2),
+        'end_to_end_ms': percentiles(end_to_end),
+        'calls_per_request': round(sum(calls) / len(calls), 2) if calls else None,
+        'tokens_per_request': {k: round(v / len(calls), 1) for k, v in tokens.items()} if calls else None,
+        'stages_ms': {name: percentiles(values) for name, values in sorted(stages.items())},
+        'speculation': dict(sorted(speculation.items()))
+    }
+
+
+def regressions(summary, baseline, tolerance):
+    found = []
+    for p, value in summary['end_to_end_ms'].items():
+        before = baseline.get('end_to_end_ms', {}).get(p)
+        if before and value > before * (1 + tolerance):
+            found.append(f"end_to_end {p}: {value} ms vs baseline {before} ms")
+    before = baseline.get('requests_per_second')
+    if before and summary['requests_per_second'] < before * (1 - tolerance):
+        found.append(f"requests_per_second: {summary['requests_per_second']} vs baseline {before}")
+    return found
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--conversations', type=int, default=24)
+    parser.add_argument('--turns', type=int, default=3, help='Queries per conversation (1-5)')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--mode', choices=('sync', 'async'), default='sync', help='ORCHESTRATOR_MODE')
+    parser.add_argument('--stream', action='store_true', help='Use streaming queries')
+    parser.add_argument('--async-validation', action='store_true', help='Defer validation off the request path')
+    parser.add_argument('--analysis', choices=('split', 'fused'), default='split', help='QUERY_ANALYSIS')
+    parser.add_argument('--model-cache', action='store_true', help='Memoize deterministic model calls (MODEL_CACHE)')
+    parser.add_argument('--memory-compaction', choices=('window', 'summary'), default='window', help='MEMORY_COMPACTION')
+    parser.add_argument('--latency', help='JSON file overriding entries of the latency table')
+    parser.add_argument('--latency-scale', type=float, default=1.0, help='Multiply every simulated latency')
+    parser.add_argument('--use-cases', default=os.path.join(ROOT, 'VALIDATION_USE_CASES.md'))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--save', help='Write the report as a new baseline')
+    parser.add_argument('--baseline', help='Compare with a saved baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='Allowed fractional regression')
+    args = parser.parse_args()
+
+    latency_table = dict(LATENCY)
+    if args.latency:
+        with open(args.latency) as f:
+            latency_table.update(json.load(f))
+    latency = Latency(latency_table, args.latency_scale, args.seed)
+    cases = load_use_cases(args.use_cases)
+
+    # The handler reads its configuration at import
+    os.environ.update(KNOWLEDGE_BASE_ID='load-test-kb', AWS_REGION='us-east-1', MEMORY_BACKEND='memory',
+                      ANSWER_CACHE='false', ORCHESTRATOR_MODE=args.mode, METRICS_EMF='false',
+                      QUERY_ANALYSIS=args.analysis, MODEL_CACHE='true' if args.model_cache else 'false',
+                      MEMORY_COMPACTION=args.memory_compaction)
+    os.environ.pop('MODEL_CACHE_TABLE', None)
+    os.environ.pop('ANSWER_CACHE_TABLE', None)
+    os.environ.pop('DATA_SOURCE_ID', None)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import advanced_orchestrator as ao
+        import aws_clients
+        from memory_store import InMemoryMemoryBackend
+
+        bedrock = SimulatedBedrock(cases, latency)
+        aws_clients._create = lambda service, stage, resource: bedrock
+        ao.memory_store().backend = SimulatedMemoryBackend(InMemoryMemoryBackend(), latency)
+        summary = run(ao, cases, args)
+        # Let deferred validations finish while their output is still captured
+        ao.get_orchestrator().deferred.queue.executor.shutdown(wait=True)
+        if args.model_cache:
+            summary['model_cache'] = ao.profile_report()['model_cache']
+
+    print(json.dumps(summary, indent=2))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(summary, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(summary, json.load(f), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if found else 0)
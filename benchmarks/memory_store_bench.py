@@ -0,0 +1,121 @@
+"""Offline read/write counts and lost updates for session memory.
+
+    python benchmarks/memory_store_bench.py --turns 200 --containers 4
+
+Compares the previous pattern (get, get again, put the whole item) with
+MemoryStore on the in-memory and SQLite backends. Several "containers"
+(stores with their own L1 cache) write turns to the same sessions
+concurrently; a lost update is a turn missing from the final history.
+"""
+import argparse
+import copy
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+from cache import LRUCache
+from memory_store import InMemoryMemoryBackend, MemoryStore, SQLiteMemoryBackend
+
+LATENCY = 0.002  # simulated round trip per backend call
+
+
+class SlowBackend:
+    """Adds a round-trip delay so concurrent turns actually interleave"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get(self, session_id):
+        time.sleep(LATENCY)
+        return self.backend.get(session_id)
+
+    def version(self, session_id):
+        time.sleep(LATENCY)
+        return self.backend.version(session_id)
+
+    def write(self, session_id, expected_version, change):
+        time.sleep(LATENCY)
+        return self.backend.write(session_id, expected_version, change)
+
+
+class LegacyMemory:
+    """The old ConversationMemory access pattern against a plain dict"""
+
+    def __init__(self):
+        self.items = {}
+        self.lock = threading.Lock()
+        self.reads = 0
+        self.writes = 0
+
+    def get(self, session_id):
+        time.sleep(LATENCY)
+        with self.lock:
+            self.reads += 1
+            return copy.deepcopy(self.items.get(session_id, {'entities': {}, 'history': []}))
+
+    def turn(self, session_id, entities, query, response):
+        self.get(session_id)                        # context stage
+        context = self.get(session_id)              # update_context re-read
+        context['entities'].update(entities)
+        context['history'] = (context['history'] + [{'query': query, 'response': response}])[-10:]
+        time.sleep(LATENCY)
+        with self.lock:
+            self.writes += 1
+            self.items[session_id] = context
+
+
+def run(turn, turns, containers, sessions):
+    jobs = [(f"s{i % sessions}", i) for i in range(turns)]
+    random.Random(0).shuffle(jobs)
+    with ThreadPoolExecutor(max_workers=containers * 2) as pool:
+        list(pool.map(lambda job: turn(job[1] % containers, job[0], job[1]), jobs))
+    return jobs
+
+
+def lost(history_of, jobs, sessions):
+    # Only the last 10 turns are kept; count turns that should be there but aren't
+    missing = 0
+    for s in range(sessions):
+        session = f"s{s}"
+        expected = sum(1 for sid, _ in jobs if sid == session)
+        missing += min(expected, 10) - len(history_of(session))
+    return missing
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--turns', type=int, default=200)
+    parser.add_argument('--containers', type=int, default=4)
+    parser.add_argument('--sessions', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'backend':<10}{'reads/turn':>12}{'version reads/turn':>20}{'writes/turn':>13}{'conflicts':>11}{'lost turns':>12}")
+
+    legacy = LegacyMemory()
+    jobs = run(lambda c, sid, i: legacy.turn(sid, {'turn': i}, f"q{i}", "r"), args.turns, args.containers, args.sessions)
+    missing = lost(lambda sid: legacy.items[sid]['history'], jobs, args.sessions)
+    print(f"{'legacy':<10}{legacy.reads / args.turns:>12.2f}{'-':>20}{legacy.writes / args.turns:>13.2f}{'-':>11}{missing:>12}")
+
+    with tempfile.TemporaryDirectory() as root:
+        for name, backend in (('memory', InMemoryMemoryBackend()),
+                              ('sqlite', SQLiteMemoryBackend(os.path.join(root, 'memory.db')))):
+            slow = SlowBackend(backend)
+            stores = [MemoryStore(slow, l1=LRUCache(max_entries=256, ttl_seconds=300), max_retries=20)
+                      for _ in range(args.containers)]
+
+            def turn(c, sid, i):
+                store = stores[c]
+                store.record_turn(store.load(sid), {'turn': i}, f"q{i}", "r")
+
+            jobs = run(turn, args.turns, args.containers, args.sessions)
+            conflicts = sum(s.stats()['conflicts'] for s in stores)
+            reads, writes = backend.reads, backend.writes
+            missing = lost(lambda sid: backend.get(sid)['history'], jobs, args.sessions)
+            version_reads = backend.version_reads
+            print(f"{name:<10}{reads / args.turns:>12.2f}{version_reads / args.turns:>20.2f}{writes / args.turns:>13.2f}"
+                  f"{conflicts:>11}{missing:>12}")
@@ -0,0 +1,96 @@
+"""Split vs fused query analysis: model round trips, tokens and latency.
+
+    python benchmarks/query_analysis_bench.py --latency-scale 0.2
+    python benchmarks/query_analysis_bench.py --local-entities
+
+Runs each VALIDATION_USE_CASES.md query and its follow-ups through entity
+extraction + query rewriting twice, as two Haiku calls (split) and as one
+structured call (fused), against the load test's simulated Bedrock. By
+default the local entity pass is off so every query takes the model path;
+--local-entities measures the mix a deployment with rules enabled sees.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'lambda'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from load_test import FOLLOW_UPS, LATENCY, Latency, SimulatedBedrock, load_use_cases, percentiles
+
+
+def conversations(cases, turns):
+    for case in cases:
+        yield [case['query']] + [f"{f} ({case['query'][:40]})" for f in FOLLOW_UPS][:turns - 1]
+
+
+def measure(tracing, cases, turns, analyze):
+    latencies, calls, tokens = [], 0, {'input': 0, 'output': 0}
+    for queries in conversations(cases, turns):
+        entities, history = {}, []
+        for query in queries:
+            with tracing.tracing() as trace:
+                started = time.perf_counter()
+                entities, _ = analyze(query, entities, history)
+                latencies.append((time.perf_counter() - started) * 1000)
+            summary = trace.summary()
+            calls += len(summary['calls'])
+            tokens['input'] += summary['tokens']['input']
+            tokens['output'] += summary['tokens']['output']
+            history.append({'query': query})
+    count = len(latencies)
+    return {
+        'queries': count,
+        'model_calls_per_query': round(calls / count, 2),
+        'tokens_per_query': {k: round(v / count, 1) for k, v in tokens.items()},
+        'latency_ms': percentiles(latencies)
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--turns', type=int, default=3, help='Queries per conversation (1-5)')
+    parser.add_argument('--latency-scale', type=float, default=0.2, help='Multiply every simulated latency')
+    parser.add_argument('--local-entities', action='store_true', help='Keep the rule-based entity pass on')
+    parser.add_argument('--use-cases', default=os.path.join(ROOT, 'VALIDATION_USE_CASES.md'))
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    os.environ.update(AWS_REGION='us-east-1', METRICS_EMF='false',
+                      LOCAL_ENTITY_EXTRACTION='true' if args.local_entities else 'false')
+    cases = load_use_cases(args.use_cases)
+    with contextlib.redirect_stdout(io.StringIO()):
+        import advanced_orchestrator as ao
+        import aws_clients
+        import tracing
+
+        bedrock = SimulatedBedrock(cases, Latency(LATENCY, args.latency_scale, args.seed))
+        aws_clients._create = lambda service, stage, resource: bedrock
+        extractor = ao.EntityExtractorAgent(rules=ao.build_entity_rules())
+        enhancer = ao.QueryEnhancerAgent()
+        analyzer = ao.QueryAnalyzerAgent(extractor, enhancer)
+
+        def split(query, entities, history):
+            entities = extractor.extract(query, entities)
+            return entities, enhancer.enhance(query, entities, history)
+
+        def fused(query, entities, history):
+            result = analyzer.analyze(query, entities, history)
+            return result['entities'], result['enhanced_query']
+
+        report = {'split': measure(tracing, cases, args.turns, split),
+                  'fused': measure(tracing, cases, args.turns, fused)}
+
+    report['fused']['fallbacks'] = analyzer.stats()['fallback']
+    report['saved_per_query'] = {
+        'model_round_trips': round(report['split']['model_calls_per_query'] - report['fused']['model_calls_per_query'], 2),
+        'input_tokens': round(report['split']['tokens_per_query']['input'] - report['fused']['tokens_per_query']['input'], 1),
+        'output_tokens': round(report['split']['tokens_per_query']['output'] - report['fused']['tokens_per_query']['output'], 1),
+        'p50_ms': round(report['split']['latency_ms']['p50'] - report['fused']['latency_ms']['p50'], 1)
+    }
+    print(json.dumps(report, indent=2))
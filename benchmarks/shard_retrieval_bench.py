@@ -0,0 +1,111 @@
+"""Sharded retrieval against stub knowledge bases: routing, fan-out and merge quality.
+
+    python benchmarks/shard_retrieval_bench.py --latency-scale 0.2
+
+Builds one stub retriever per policy type plus one holding the whole
+corpus. Each returns BM25 matches over its documents, with raw scores on
+a shard-specific scale so that merging has to normalize, and sleeps a
+latency that grows with the number of chunks it searches. Queries whose
+policy type is known go through ShardRouter's routed path; the same
+queries without a policy type go to the whole-corpus retriever, as the
+orchestrator's default, or take the parallel fan-out when there is no
+default. The report
+compares latency and hit@k for the expected document against the single
+knowledge base.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'lambda'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from lexical_index import BM25Index
+from load_test import percentiles
+from shard_router import ShardRouter
+
+TOPICS = {
+    'vacation': ['vacation days', 'paid time off', 'annual leave accrual', 'carry over unused vacation'],
+    'retirement': ['pension eligibility', 'retirement age', 'service credit', 'pension benefit formula'],
+    'benefits': ['health insurance', 'dental coverage', 'vision plan', 'insurance premiums'],
+}
+DEPARTMENTS = ['police', 'fire', 'parks', 'library', 'public works', 'sanitation']
+STATES = ['California', 'Texas', 'Oregon', 'Nevada']
+
+
+def corpus(per_topic, seed):
+    rng = random.Random(seed)
+    records = []
+    for policy_type, phrases in TOPICS.items():
+        for i in range(per_topic):
+            department, state, phrase = rng.choice(DEPARTMENTS), rng.choice(STATES), rng.choice(phrases)
+            years = rng.randint(1, 30)
+            records.append({
+                'content': f"{state} {department} {policy_type} policy: {phrase} for employees with {years} years of service. "
+                           f"Section {i} of the {department} handbook.",
+                'source': f"s3://policies/{policy_type}/{department}-{i}.txt",
+                'metadata': {'policy_type': policy_type, 'department': department, 'state': state, 'years': years}
+            })
+    return records
+
+
+def stub_retriever(records, scale, latency_per_chunk_ms, base_ms):
+    index = BM25Index(records)
+
+    def retrieve(query, number_of_results, filters):
+        time.sleep((base_ms + latency_per_chunk_ms * len(records)) / 1000)
+        return [{'content': records[row]['content'], 'source': records[row]['source'], 'score': score * scale}
+                for row, score in index.search(query, number_of_results)]
+    return retrieve
+
+
+def measure(search, queries, k):
+    latencies, hits = [], 0
+    for q in queries:
+        started = time.perf_counter()
+        results = search(q)
+        latencies.append((time.perf_counter() - started) * 1000)
+        hits += any(d['source'] == q['expected'] for d in results[:k])
+    return {'latency_ms': percentiles(latencies), f'hit_at_{k}': round(hits / len(queries), 3)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--per-topic', type=int, default=400, help='Chunks per policy type')
+    parser.add_argument('--queries', type=int, default=60)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--latency-scale', type=float, default=0.2, help='Multiply the simulated search latency')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    records = corpus(args.per_topic, args.seed)
+    base_ms, per_chunk_ms = 80 * args.latency_scale, 0.2 * args.latency_scale
+    # Raw scores on different scales per shard, as separately built indexes report them
+    scales = {'vacation': 1.0, 'retirement': 3.5, 'benefits': 0.4}
+    retrievers = {p: stub_retriever([r for r in records if r['metadata']['policy_type'] == p], scale, per_chunk_ms, base_ms)
+                  for p, scale in scales.items()}
+    router = ShardRouter(retrievers, {p: p for p in TOPICS})
+    single = stub_retriever(records, 1.0, per_chunk_ms, base_ms)
+    with_default = ShardRouter({**retrievers, 'main': single}, {p: p for p in TOPICS}, default='main')
+
+    rng = random.Random(args.seed + 1)
+    queries = []
+    for r in rng.sample(records, args.queries):
+        m = r['metadata']
+        phrase = r['content'].split(': ')[1].split(' for ')[0]
+        queries.append({'text': f"{phrase} for {m['department']} in {m['state']} with {m['years']} years",
+                        'policy_type': m['policy_type'], 'expected': r['source']})
+
+    report = {
+        'chunks': len(records),
+        'single_kb': measure(lambda q: single(q['text'], args.k, None), queries, args.k),
+        'routed': measure(lambda q: router.retrieve(q['text'], args.k, None, q['policy_type']), queries, args.k),
+        'unrouted': measure(lambda q: with_default.retrieve(q['text'], args.k, None, None), queries, args.k),
+        'fanout': measure(lambda q: router.retrieve(q['text'], args.k, None, None), queries, args.k),
+        'router': router.stats()
+    }
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,69 @@
+"""Offline recall/latency comparison of the local vector index modes.
+
+    python benchmarks/vector_index_bench.py --count 50000 --dim 1536
+
+Uses synthetic clustered embeddings; no AWS access is needed.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+from vector_index import VectorIndex, build_index, synthetic_corpus
+
+
+def index_bytes(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path) if name.endswith('.npy'))
+
+
+def run(index, queries, k, nprobe):
+    latencies, results = [], []
+    for query in queries:
+        begin = time.perf_counter()
+        hits = index.search(query, k, nprobe)
+        latencies.append((time.perf_counter() - begin) * 1000)
+        results.append([row for row, _ in hits])
+    return results, np.percentile(latencies, 50), np.percentile(latencies, 95)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=20000)
+    parser.add_argument('--dim', type=int, default=1536)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--nlist', type=int, default=64)
+    parser.add_argument('--nprobe', type=int, default=8)
+    args = parser.parse_args()
+
+    embeddings, records = synthetic_corpus(args.count, args.dim)
+    rng = np.random.default_rng(1)
+    queries = embeddings[rng.choice(args.count, args.queries, replace=False)]
+    queries = queries + 0.3 * rng.standard_normal(queries.shape).astype(np.float32)
+
+    configs = [
+        ('exact f32', False, 0, None),
+        ('exact int8', True, 0, None),
+        (f'ivf f32 nprobe={args.nprobe}', False, args.nlist, args.nprobe),
+        (f'ivf int8 nprobe={args.nprobe}', True, args.nlist, args.nprobe),
+    ]
+    truth = None
+    with tempfile.TemporaryDirectory() as root:
+        print(f"{'mode':<24}{'build s':>9}{'MB':>9}{'p50 ms':>9}{'p95 ms':>9}{'recall@k':>10}")
+        for name, quantize, nlist, nprobe in configs:
+            path = os.path.join(root, name.replace(' ', '_').replace('=', ''))
+            begin = time.perf_counter()
+            build_index(path, embeddings, records, quantize=quantize, nlist=nlist)
+            build_seconds = time.perf_counter() - begin
+            index = VectorIndex(path)
+            results, p50, p95 = run(index, queries, args.k, nprobe)
+            # IVF stores rows list-by-list; compare by record identity, not row
+            ids = [[index.records[row]['source'] for row in rows] for rows in results]
+            if truth is None:
+                truth = ids
+            recall = np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(ids, truth)])
+            print(f"{name:<24}{build_seconds:>9.2f}{index_bytes(path) / 1e6:>9.1f}{p50:>9.2f}{p95:>9.2f}{recall:>10.3f}")
@@ -1,54 +1,510 @@
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio
+import contextvars
 import json
-import boto3
 import os
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List
-
-# AWS_REGION is automatically available in Lambda
-AWS_REGION = os.environ.get('AWS_REGION', 'us-east-1')
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 
-bedrock_runtime = boto3.client('bedrock-runtime', region_name=AWS_REGION)
-bedrock_agent_runtime = boto3.client('bedrock-agent-runtime', region_name=AWS_REGION)
-dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION)
+import aws_clients
+import tracing
+from answer_cache import KEY_ENTITIES, AnswerCache, DynamoDBSharedTier, normalize_query
+from cache import LRUCache, SharedCalls
+from context_packer import ContextPacker, entity_terms, estimate_tokens, log_usage, numbers_in
+from conversation_summary import ConversationSummarizer, summary_section
+from grounding import GroundingChecker
+from entity_rules import COUNTIES, RuleBasedEntityExtractor, load_counties
+from ingestion_watch import IngestionGeneration, latest_ingestion_job
+from lexical_index import BM25Index, load_records, reciprocal_rank_fusion
+from model_cache import ModelCallCache
+from memory_store import (DynamoDBMemoryBackend, InMemoryMemoryBackend, MemoryStore,
+                          SQLiteMemoryBackend)
+from pipeline import FROM_SPECULATION, AsyncPipelineScheduler, PipelineScheduler, Stage
+from shard_router import ShardRouter, load_shard_map
+from validation_queue import (PENDING, DeferredValidation, DynamoDBValidationStore, InMemoryValidationStore,
+                              LocalValidationQueue, SQSValidationQueue, sqs_jobs, validation_id)
 
-KB_ID = os.environ['KNOWLEDGE_BASE_ID']
+KB_ID = os.environ.get('KNOWLEDGE_BASE_ID')
+DATA_SOURCE_ID = os.environ.get('DATA_SOURCE_ID')
 MEMORY_TABLE = os.environ.get('MEMORY_TABLE', 'rag-conversation-memory')
+MEMORY_BACKEND = os.environ.get('MEMORY_BACKEND', 'dynamodb').lower()
+MEMORY_SQLITE_PATH = os.environ.get('MEMORY_SQLITE_PATH', '/tmp/conversation-memory.db')
+MEMORY_L1_MAX_SESSIONS = int(os.environ.get('MEMORY_L1_MAX_SESSIONS', '256'))
+MEMORY_L1_TTL = int(os.environ.get('MEMORY_L1_TTL', '300'))
+# window: last MEMORY_MAX_TURNS turns verbatim; summary: a running summary plus a short verbatim window
+MEMORY_COMPACTION = os.environ.get('MEMORY_COMPACTION', 'window').lower()
+MEMORY_MAX_TURNS = int(os.environ.get('MEMORY_MAX_TURNS', '10'))
+MEMORY_WINDOW_TURNS = int(os.environ.get('MEMORY_WINDOW_TURNS', '4'))
+MEMORY_SUMMARY_TOKENS = int(os.environ.get('MEMORY_SUMMARY_TOKENS', '150'))
+SPECULATIVE_EXECUTION = os.environ.get('SPECULATIVE_EXECUTION', 'true').lower() == 'true'
+PIPELINE_MAX_WORKERS = int(os.environ.get('PIPELINE_MAX_WORKERS', '6'))
+ORCHESTRATOR_MODE = os.environ.get('ORCHESTRATOR_MODE', 'sync').lower()
+INGESTION_CHECK_SECONDS = int(os.environ.get('INGESTION_CHECK_SECONDS', '60'))
+ANSWER_CACHE_ENABLED = os.environ.get('ANSWER_CACHE', 'true').lower() == 'true'
+ANSWER_CACHE_TABLE = os.environ.get('ANSWER_CACHE_TABLE')
+ANSWER_CACHE_TTL = int(os.environ.get('ANSWER_CACHE_TTL', '3600'))
+ANSWER_CACHE_SEMANTIC = os.environ.get('ANSWER_CACHE_SEMANTIC', 'false').lower() == 'true'
+ANSWER_CACHE_SIMILARITY = float(os.environ.get('ANSWER_CACHE_SIMILARITY', '0.95'))
+RETRIEVAL_CACHE_ENABLED = os.environ.get('RETRIEVAL_CACHE', 'true').lower() == 'true'
+RETRIEVAL_CACHE_MAX_ENTRIES = int(os.environ.get('RETRIEVAL_CACHE_MAX_ENTRIES', '1024'))
+RETRIEVAL_CACHE_MAX_BYTES = int(os.environ.get('RETRIEVAL_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+RETRIEVAL_CACHE_TTL = int(os.environ.get('RETRIEVAL_CACHE_TTL', '900'))
+LOCAL_ENTITY_EXTRACTION = os.environ.get('LOCAL_ENTITY_EXTRACTION', 'true').lower() == 'true'
+LOCAL_EXTRACTION_THRESHOLD = float(os.environ.get('LOCAL_EXTRACTION_THRESHOLD', '0.8'))
+QUERY_ANALYSIS = os.environ.get('QUERY_ANALYSIS', 'split').lower()
+COUNTY_GAZETTEER = os.environ.get('COUNTY_GAZETTEER')
+LOCAL_VALIDATION = os.environ.get('LOCAL_VALIDATION', 'true').lower() == 'true'
+LOCAL_VALIDATION_MIN_SCORE = float(os.environ.get('LOCAL_VALIDATION_MIN_SCORE', '0.5'))
+VALIDATION_MODE = os.environ.get('VALIDATION_MODE', 'inline').lower()
+VALIDATION_QUEUE_URL = os.environ.get('VALIDATION_QUEUE_URL')
+VALIDATION_TABLE = os.environ.get('VALIDATION_TABLE')
+VALIDATION_TTL = int(os.environ.get('VALIDATION_TTL', '3600'))
+VALIDATION_WORKERS = int(os.environ.get('VALIDATION_WORKERS', '2'))
+RETRIEVAL_BACKEND = os.environ.get('RETRIEVAL_BACKEND', 'knowledge_base').lower()
+VECTOR_INDEX_PATH = os.environ.get('VECTOR_INDEX_PATH', 'vector_index')
+VECTOR_INDEX_NPROBE = int(os.environ.get('VECTOR_INDEX_NPROBE', '8'))
+# Policy type -> knowledge base (or, with the local backend, index directory) shard; JSON or a JSON file
+KB_SHARDS = os.environ.get('KB_SHARDS')
+HYBRID_RETRIEVAL = os.environ.get('HYBRID_RETRIEVAL', 'false').lower() == 'true'
+LEXICAL_INDEX_PATH = os.environ.get('LEXICAL_INDEX_PATH', os.path.join(VECTOR_INDEX_PATH, 'records.jsonl'))
+HYBRID_RRF_K = int(os.environ.get('HYBRID_RRF_K', '60'))
+RERANK_ENABLED = os.environ.get('RERANK', 'true').lower() == 'true'
+RERANK_DUPLICATE_THRESHOLD = float(os.environ.get('RERANK_DUPLICATE_THRESHOLD', '0.8'))
+RERANK_MMR_LAMBDA = float(os.environ.get('RERANK_MMR_LAMBDA', '0.7'))
+CONTEXT_TOKENS = int(os.environ.get('CONTEXT_TOKENS', '1800'))
+CONTEXT_TOKEN_BUDGETS = json.loads(os.environ.get('CONTEXT_TOKEN_BUDGETS', '{}'))
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', '100'))
+BATCH_MAX_CONCURRENCY = int(os.environ.get('BATCH_MAX_CONCURRENCY', '8'))
+MODEL_CACHE_ENABLED = os.environ.get('MODEL_CACHE', 'true').lower() == 'true'
+# Agents whose calls are cached: the 0.1-temperature ones by default. Enhancement (0.3) and the generator (0.7)
+# sample, and embeddings have their own store (EMBEDDING_CACHE)
+MODEL_CACHE_STAGES = [s.strip() for s in os.environ.get(
+    'MODEL_CACHE_STAGES', 'extraction,analysis,validation').split(',') if s.strip()]
+MODEL_CACHE_MAX_ENTRIES = int(os.environ.get('MODEL_CACHE_MAX_ENTRIES', '2048'))
+MODEL_CACHE_TTL = int(os.environ.get('MODEL_CACHE_TTL', '3600'))
+MODEL_CACHE_TABLE = os.environ.get('MODEL_CACHE_TABLE')
+EMBEDDING_CACHE_ENABLED = os.environ.get('EMBEDDING_CACHE', 'true').lower() == 'true'
+EMBEDDING_CACHE_PATH = os.environ.get('EMBEDDING_CACHE_PATH', '/tmp/embedding_cache')
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get('EMBEDDING_CACHE_MAX_ENTRIES', '10000'))
+EAGER_INIT = os.environ.get('EAGER_INIT', 'false').lower() == 'true'
+EMBEDDING_MODEL_ID = "amazon.titan-embed-text-v1"
+
+# Milliseconds spent building each lazily created component, for warmup reports
+INIT_PROFILE = {}
+
+@contextmanager
+def profiled(name: str):
+    started = time.perf_counter()
+    yield
+    INIT_PROFILE[name] = round((time.perf_counter() - started) * 1000, 1)
+
+def aws_client(service: str, stage: str = 'default'):
+    """Shared, tuned client from aws_clients (resource for dynamodb); the first build is profiled"""
+    name = f"client:{service}"
+    if name in INIT_PROFILE:
+        return aws_clients.get_resource(service, stage) if service == 'dynamodb' else aws_clients.get_client(service, stage)
+    with profiled(name):
+        return aws_clients.get_resource(service, stage) if service == 'dynamodb' else aws_clients.get_client(service, stage)
+
+_model_cache = None
+_model_cache_lock = threading.Lock()
+
+def model_cache() -> Optional[ModelCallCache]:
+    """Container-wide memo of deterministic model calls, built on first use"""
+    global _model_cache
+    if _model_cache is None and MODEL_CACHE_ENABLED:
+        with _model_cache_lock:
+            if _model_cache is None:
+                shared = DynamoDBSharedTier(aws_client('dynamodb', 'memory').Table(MODEL_CACHE_TABLE)) if MODEL_CACHE_TABLE else None
+                # One cache layer per call: with the embedding store on, embeddings are counted there only
+                stages = [s for s in MODEL_CACHE_STAGES if not (s == 'embedding' and EMBEDDING_CACHE_ENABLED)]
+                _model_cache = ModelCallCache(stages, shared=shared, max_entries=MODEL_CACHE_MAX_ENTRIES,
+                                              ttl_seconds=MODEL_CACHE_TTL)
+    return _model_cache
+
+_embedding_store = None
+
+def embedding_store():
+    """Persistent text-hash -> vector store under EMBEDDING_CACHE_PATH, opened on first use"""
+    global _embedding_store
+    if _embedding_store is None and EMBEDDING_CACHE_ENABLED:
+        with _model_cache_lock:
+            if _embedding_store is None:
+                try:
+                    from embedding_store import EmbeddingStore
+                    with profiled('embedding_store'):
+                        # Containers are frozen and reclaimed without notice, so every
+                        # new vector is indexed at once; that costs far less than the call
+                        _embedding_store = EmbeddingStore(EMBEDDING_CACHE_PATH, EMBEDDING_MODEL_ID,
+                                                          max_entries=EMBEDDING_CACHE_MAX_ENTRIES, flush_every=1)
+                except Exception as e:
+                    print(f"Embedding store error: {e}")
+                    return None
+    return _embedding_store
+
+def claude_request(prompt: str, max_tokens: int, temperature: float) -> Dict:
+    return {
+        "anthropic_version": "bedrock-2023-05-31",
+        "max_tokens": max_tokens,
+        "messages": [{"role": "user", "content": prompt}],
+        "temperature": temperature
+    }
+
+def claude_body(prompt: str, max_tokens: int, temperature: float) -> str:
+    return json.dumps(claude_request(prompt, max_tokens, temperature))
+
+def call_model(model_id: str, request: Dict, stage: str = 'default') -> Dict:
+    """The one invoke_model path for every agent: parsed response, traced, memoized per stage"""
+    cache = model_cache()
+    key = cache.key(model_id, request) if cache is not None and cache.enabled(stage) else None
+    if key is not None:
+        cached = cache.get(key, stage)
+        tracing.record_event(f"model_cache:{stage}", 'miss' if cached is None else 'hit')
+        if cached is not None:
+            return cached
+    aws_client('bedrock-runtime', stage)
+    started = time.perf_counter()
+    response = aws_clients.invoke_model(model_id, json.dumps(request), stage)
+    result = json.loads(response['body'].read())
+    usage = result.get('usage', {'input_tokens': result.get('inputTextTokenCount', 0)})
+    tracing.record_call(stage, model_id, started, usage, tracing.retries_of(response))
+    if key is not None:
+        cache.put(key, result, (time.perf_counter() - started) * 1000)
+    return result
+
+def invoke_claude(model_id: str, prompt: str, max_tokens: int, temperature: float, stage: str = 'default') -> str:
+    return call_model(model_id, claude_request(prompt, max_tokens, temperature), stage)['content'][0]['text']
+
+def iter_stream_text(events: Iterable[Dict], usage: Dict = None) -> Iterator[str]:
+    """Yield text deltas from an invoke_model_with_response_stream event stream.
+
+    Token counts from the message_start/message_delta events are copied into `usage`.
+    """
+    for event in events:
+        chunk = event.get('chunk')
+        if not chunk:
+            continue
+        payload = json.loads(chunk['bytes'])
+        if usage is not None:
+            if payload.get('type') == 'message_start':
+                usage.update(payload.get('message', {}).get('usage', {}))
+            elif payload.get('type') == 'message_delta':
+                usage.update(payload.get('usage', {}))
+        if payload.get('type') == 'content_block_delta':
+            text = payload.get('delta', {}).get('text')
+            if text:
+                yield text
+
+def stream_claude(model_id: str, prompt: str, max_tokens: int, temperature: float,
+                  stage: str = 'generation') -> Iterator[str]:
+    aws_client('bedrock-runtime', stage)
+    started = time.perf_counter()
+    response = aws_clients.invoke_model_with_response_stream(model_id, claude_body(prompt, max_tokens, temperature), stage)
+    usage = {}
+    
+    def tokens():
+        yield from iter_stream_text(response['body'], usage)
+        tracing.record_call(stage, model_id, started, usage, tracing.retries_of(response))
+    return tokens()
+
+async def ainvoke_claude(model_id: str, prompt: str, max_tokens: int, temperature: float, stage: str = 'default') -> str:
+    # boto3 has no async transport; the blocking call runs on the loop's
+    # executor so independent waits overlap within one invocation
+    return await asyncio.to_thread(invoke_claude, model_id, prompt, max_tokens, temperature, stage)
+
+def embed_text(text: str) -> List[float]:
+    store = embedding_store()
+    if store is not None:
+        try:
+            vector = store.get(text, 'query')
+            tracing.record_event('embedding_cache', 'miss' if vector is None else 'hit')
+            if vector is not None:
+                return vector.tolist()
+        except Exception as e:
+            print(f"Embedding store read error: {e}")
+    vector = call_model(EMBEDDING_MODEL_ID, {"inputText": text}, 'embedding')['embedding']
+    if store is not None:
+        try:
+            store.put(text, vector)
+        except Exception as e:
+            print(f"Embedding store write error: {e}")
+    return vector
+
+def ingestion_sources() -> List[Tuple[str, str]]:
+    """(knowledge base, data source) of the main knowledge base and of each shard that names its data source"""
+    sources = [(KB_ID, DATA_SOURCE_ID)] if DATA_SOURCE_ID else []
+    if KB_SHARDS:
+        try:
+            shards = load_shard_map(KB_SHARDS).values()
+            sources += sorted({(s['knowledge_base_id'], s['data_source_id']) for s in shards
+                               if s.get('knowledge_base_id') and s.get('data_source_id')})
+        except Exception as e:
+            print(f"Shard map load error, watching {KB_ID} ingestion only: {e}")
+    return sources
+
+def _latest_ingestion_jobs() -> List[Optional[Dict]]:
+    # A shard's re-sync changes what it returns just as the main knowledge base's does
+    client = aws_client('bedrock-agent', 'admin')
+    return [latest_ingestion_job(client, kb_id, ds_id) for kb_id, ds_id in ingestion_sources()]
+
+ingestion_generation = IngestionGeneration(_latest_ingestion_jobs, refresh_seconds=INGESTION_CHECK_SECONDS)
+
+def build_answer_cache():
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    shared = DynamoDBSharedTier(aws_client('dynamodb', 'memory').Table(ANSWER_CACHE_TABLE)) if ANSWER_CACHE_TABLE else None
+    cache = AnswerCache(
+        ingestion_generation.current,
+        shared=shared,
+        ttl_seconds=ANSWER_CACHE_TTL,
+        embed=embed_text if ANSWER_CACHE_SEMANTIC else None,
+        similarity_threshold=ANSWER_CACHE_SIMILARITY
+    )
+    ingestion_generation.on_change(cache.invalidate)
+    return cache
+
+def documents_size(documents: List[Dict]) -> int:
+    """Approximate bytes held by a list of retrieval records"""
+    return sum(len(d['content'].encode()) + len(d['source']) + 64 for d in documents)
+
+def build_retrieval_cache() -> Optional[LRUCache]:
+    if not RETRIEVAL_CACHE_ENABLED:
+        return None
+    return LRUCache(
+        max_entries=RETRIEVAL_CACHE_MAX_ENTRIES,
+        ttl_seconds=RETRIEVAL_CACHE_TTL,
+        max_bytes=RETRIEVAL_CACHE_MAX_BYTES,
+        sizeof=documents_size
+    )
+
+def build_vector_index():
+    if RETRIEVAL_BACKEND != 'local':
+        return None
+    try:
+        # numpy is only imported when the local backend is selected
+        with profiled('vector_index'):
+            from vector_index import VectorIndex
+            return VectorIndex(VECTOR_INDEX_PATH, nprobe=VECTOR_INDEX_NPROBE)
+    except Exception as e:
+        print(f"Vector index load error, using knowledge base: {e}")
+        return None
+
+def build_lexical_index(vector_index=None) -> Optional[BM25Index]:
+    if not HYBRID_RETRIEVAL:
+        return None
+    try:
+        with profiled('lexical_index'):
+            records = vector_index.records if vector_index is not None else load_records(LEXICAL_INDEX_PATH)
+            return BM25Index(records)
+    except Exception as e:
+        print(f"Lexical index load error, using vector search only: {e}")
+        return None
+
+def build_shard_router(index=None) -> Optional[ShardRouter]:
+    """Router over the KB_SHARDS shards; policy types without a shard search the main knowledge base (or `index`)"""
+    if not KB_SHARDS:
+        return None
+    try:
+        shard_map = load_shard_map(KB_SHARDS)
+        routes = {policy_type: shard['target'] for policy_type, shard in shard_map.items()}
+        if RETRIEVAL_BACKEND == 'local':
+            with profiled('shard_indexes'):
+                from vector_index import VectorIndex
+                retrievers = {path: VectorIndex(path, nprobe=VECTOR_INDEX_NPROBE).retrieve for path in set(routes.values())}
+            # Without a main index, unrouted searches fan out over the shards
+            default = None
+            if index is not None:
+                default = VECTOR_INDEX_PATH
+                retrievers[default] = index.retrieve
+        else:
+            retrievers = {kb_id: (lambda query, n, filters, kb_id=kb_id: knowledge_base_search(query, kb_id, n, filters))
+                          for kb_id in set(routes.values()) | {KB_ID}}
+            default = KB_ID
+        return ShardRouter(retrievers, routes, default=default)
+    except Exception as e:
+        print(f"Shard map load error, searching {KB_ID} only: {e}")
+        return None
+
+def build_retrieval_agent(cls):
+    index = build_vector_index()
+    return cls(cache=build_retrieval_cache(), generation=ingestion_generation.current,
+               index=index, lexical=build_lexical_index(index), shards=build_shard_router(index))
+
+def knowledge_base_search(query: str, kb_id: str, number_of_results: int = 5, filters: Dict = None) -> List[Dict]:
+    vector_config = {'numberOfResults': number_of_results}
+    if filters:
+        vector_config['filter'] = filters
+    started = time.perf_counter()
+    response = aws_client('bedrock-agent-runtime', 'retrieval').retrieve(
+        knowledgeBaseId=kb_id,
+        retrievalQuery={'text': query},
+        retrievalConfiguration={'vectorSearchConfiguration': vector_config}
+    )
+    tracing.record_call('retrieval', kb_id, started, retries=tracing.retries_of(response))
+    return [{
+        'content': r['content']['text'],
+        'source': r.get('location', {}).get('s3Location', {}).get('uri', 'Unknown'),
+        'score': r.get('score', 0)
+    } for r in response['retrievalResults']]
+
+def build_reranker():
+    if not RERANK_ENABLED:
+        return None
+    try:
+        with profiled('reranker'):
+            from rerank import Reranker
+            return Reranker(duplicate_threshold=RERANK_DUPLICATE_THRESHOLD, mmr_lambda=RERANK_MMR_LAMBDA)
+    except Exception as e:
+        print(f"Reranker load error: {e}")
+        return None
+
+_memory_store = None
+
+def memory_store() -> MemoryStore:
+    """Container-wide store, so the L1 session cache survives warm invocations"""
+    global _memory_store
+    if _memory_store is None:
+        if MEMORY_BACKEND == 'memory':
+            backend = InMemoryMemoryBackend()
+        elif MEMORY_BACKEND == 'sqlite':
+            backend = SQLiteMemoryBackend(MEMORY_SQLITE_PATH)
+        else:
+            backend = DynamoDBMemoryBackend(aws_client('dynamodb', 'memory').Table(MEMORY_TABLE))
+        l1 = LRUCache(max_entries=MEMORY_L1_MAX_SESSIONS, ttl_seconds=MEMORY_L1_TTL) if MEMORY_L1_MAX_SESSIONS else None
+        if MEMORY_COMPACTION == 'summary':
+            _memory_store = MemoryStore(backend, l1=l1, max_turns=MEMORY_WINDOW_TURNS,
+                                        summarizer=build_summarizer())
+        else:
+            _memory_store = MemoryStore(backend, l1=l1, max_turns=MEMORY_MAX_TURNS)
+    return _memory_store
+
+def build_summarizer() -> ConversationSummarizer:
+    # Room for the word limit the prompt asks for; bound() enforces the token cap
+    summarize = lambda prompt: invoke_claude("anthropic.claude-3-haiku-20240307-v1:0", prompt,
+                                             MEMORY_SUMMARY_TOKENS * 2, 0.1, 'summary')
+    return ConversationSummarizer(summarize, max_tokens=MEMORY_SUMMARY_TOKENS)
+
+def context_budget(model_id: str) -> int:
+    """Prompt token budget for a model; CONTEXT_TOKEN_BUDGETS maps model ids to overrides"""
+    return int(CONTEXT_TOKEN_BUDGETS.get(model_id, CONTEXT_TOKENS))
+
+def build_entity_rules() -> Optional[RuleBasedEntityExtractor]:
+    if not LOCAL_ENTITY_EXTRACTION:
+        return None
+    counties = {state: list(names) for state, names in COUNTIES.items()}
+    if COUNTY_GAZETTEER:
+        try:
+            load_counties(COUNTY_GAZETTEER, counties)
+        except Exception as e:
+            print(f"County gazetteer load error: {e}")
+    with profiled('entity_rules'):
+        return RuleBasedEntityExtractor(counties)
+
+def build_grounding() -> Optional[GroundingChecker]:
+    return GroundingChecker(min_score=LOCAL_VALIDATION_MIN_SCORE) if LOCAL_VALIDATION else None
+
+_validation_store = None
+
+def validation_store():
+    """Container-wide store of deferred validation results"""
+    global _validation_store
+    if _validation_store is None:
+        if VALIDATION_TABLE:
+            _validation_store = DynamoDBValidationStore(aws_client('dynamodb', 'memory').Table(VALIDATION_TABLE),
+                                                        ttl_seconds=VALIDATION_TTL)
+        else:
+            _validation_store = InMemoryValidationStore(ttl_seconds=VALIDATION_TTL)
+    return _validation_store
+
+def build_deferred_validation(worker: Callable[[Dict], None]) -> DeferredValidation:
+    if VALIDATION_QUEUE_URL:
+        queue = SQSValidationQueue(aws_client('sqs', 'memory'), VALIDATION_QUEUE_URL)
+    else:
+        queue = LocalValidationQueue(worker, max_workers=VALIDATION_WORKERS)
+    return DeferredValidation(validation_store(), queue)
+
+def extract_json(content: str):
+    start = content.find('{')
+    end = content.rfind('}') + 1
+    if start >= 0 and end > start:
+        return json.loads(content[start:end])
+    return None
 
 class ConversationMemory:
-    def __init__(self, session_id: str):
+    """Per-request view of a session: read once, then one delta write"""
+    
+    def __init__(self, session_id: str, store: MemoryStore = None):
         self.session_id = session_id
-        self.table = dynamodb.Table(MEMORY_TABLE)
+        self.store = store or memory_store()
+        self.context = None
     
-    def get_context(self) -> Dict:
+    def empty_context(self) -> Dict:
+        return self.store.empty(self.session_id)
+    
+    def load(self) -> Dict:
+        if self.context is None:
+            try:
+                self.context = self.store.load(self.session_id)
+            except Exception as e:
+                print(f"Memory read error: {e}")
+                self.context = self.empty_context()
+        return self.context
+    
+    def record(self, entities: Dict, query: str, response: str) -> Dict:
         try:
-            response = self.table.get_item(Key={'session_id': self.session_id})
-            return response.get('Item', {
-                'session_id': self.session_id,
-                'entities': {},
-                'history': []
-            })
-        except:
-            return {'session_id': self.session_id, 'entities': {}, 'history': []}
+            return self.store.record_turn(self.load(), entities, query, response)
+        except Exception as e:
+            print(f"Memory write error: {e}")
+            return self.load()
+    
+    def get_context(self) -> Dict:
+        return self.load()
     
     def update_context(self, entities: Dict, query: str, response: str):
-        context = self.get_context()
-        context['entities'].update(entities)
-        context['history'].append({
-            'query': query,
-            'response': response[:500],
-            'timestamp': datetime.utcnow().isoformat()
-        })
-        context['history'] = context['history'][-10:]
-        context['updated_at'] = datetime.utcnow().isoformat()
-        self.table.put_item(Item=context)
-        return context
+        return self.record(entities, query, response)
 
 class EntityExtractorAgent:
-    def __init__(self):
+    """Haiku-based extraction behind an optional deterministic local pass.
+
+    When the rule-based extractor is confident enough its result is used and
+    the model call is skipped; per-request outcomes are logged and totals
+    kept for stats().
+    """
+    
+    def __init__(self, rules: RuleBasedEntityExtractor = None, threshold: float = LOCAL_EXTRACTION_THRESHOLD):
         self.model_id = "anthropic.claude-3-haiku-20240307-v1:0"
+        self.rules = rules
+        self.threshold = threshold
+        self.counts = {'local': 0, 'llm': 0}
+        self._lock = threading.Lock()
     
-    def extract(self, query: str, existing_entities: Dict) -> Dict:
-        prompt = f"""Extract structured information from the query. Return ONLY valid JSON.
+    def local_pass(self, query: str, existing_entities: Dict) -> Optional[Dict]:
+        if self.rules is None:
+            return None
+        result = self.rules.extract(query, existing_entities)
+        source = 'local' if result['confidence'] >= self.threshold else 'llm'
+        with self._lock:
+            self.counts[source] += 1
+        tracing.record_event('entity_extraction', source)
+        print(json.dumps({'entity_extraction': source, 'confidence': result['confidence'], 'signals': result['signals']}))
+        if source == 'local':
+            return {**existing_entities, **result['entities']}
+        return None
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self.counts)
+        total = counts['local'] + counts['llm']
+        counts['llm_skip_rate'] = round(counts['local'] / total, 4) if total else 0.0
+        return counts
+    
+    def build_prompt(self, query: str, existing_entities: Dict) -> str:
+        return f"""Extract structured information from the query. Return ONLY valid JSON.
 
 Current entities: {json.dumps(existing_entities)}
 Query: "{query}"
@@ -58,25 +514,23 @@ Rules: Only extract explicitly mentioned entities, preserve existing unless upda
 
 Example: {{"department": "police", "years_of_service": 15, "state": "California"}}
 JSON:"""
-
+    
+    def parse(self, content: str, existing_entities: Dict) -> Dict:
+        extracted = extract_json(content.strip())
+        if extracted is not None:
+            return {**existing_entities, **extracted}
+        return existing_entities
+    
+    def extract(self, query: str, existing_entities: Dict) -> Dict:
+        local = self.local_pass(query, existing_entities)
+        if local is not None:
+            return local
+        return self.llm_extract(query, existing_entities)
+    
+    def llm_extract(self, query: str, existing_entities: Dict) -> Dict:
         try:
-            response = bedrock_runtime.invoke_model(
-                modelId=self.model_id,
-                body=json.dumps({
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "max_tokens": 300,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.1
-                })
-            )
-            
-            result = json.loads(response['body'].read())
-            content = result['content'][0]['text'].strip()
-            start = content.find('{')
-            end = content.rfind('}') + 1
-            if start >= 0 and end > start:
-                extracted = json.loads(content[start:end])
-                return {**existing_entities, **extracted}
+            content = invoke_claude(self.model_id, self.build_prompt(query, existing_entities), 300, 0.1, 'extraction')
+            return self.parse(content, existing_entities)
         except Exception as e:
             print(f"Entity extraction error: {e}")
         return existing_entities
@@ -85,71 +539,207 @@ class QueryEnhancerAgent:
     def __init__(self):
         self.model_id = "anthropic.claude-3-haiku-20240307-v1:0"
     
-    def enhance(self, query: str, entities: Dict, history: List) -> str:
+    def build_prompt(self, query: str, entities: Dict, history: List, summary: str = '') -> str:
         entity_str = ", ".join([f"{k}: {v}" for k, v in entities.items() if v])
         history_str = ""
         if history:
             recent = history[-2:]
             history_str = "\n".join([f"Q: {h['query']}" for h in recent])
         
-        prompt = f"""Rewrite the query to be specific and context-aware for document search.
+        return f"""Rewrite the query to be specific and context-aware for document search.
 
 User context: {entity_str}
-Recent questions: {history_str}
+{summary_section(summary)}Recent questions: {history_str}
 Current query: "{query}"
 
 Rewrite to include relevant context. Return ONLY the enhanced query.
 Enhanced query:"""
-
+    
+    def enhance(self, query: str, entities: Dict, history: List, summary: str = '') -> str:
         try:
-            response = bedrock_runtime.invoke_model(
-                modelId=self.model_id,
-                body=json.dumps({
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "max_tokens": 150,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.3
-                })
-            )
-            result = json.loads(response['body'].read())
-            return result['content'][0]['text'].strip()
+            return invoke_claude(self.model_id, self.build_prompt(query, entities, history, summary), 150, 0.3, 'enhancement').strip()
         except:
             return query
 
+class QueryAnalyzerAgent:
+    """Entity extraction and query rewriting fused into one Haiku call.
+
+    A confident local entity pass still comes first, leaving only the
+    rewrite for the model. The fused reply must match the schema exactly;
+    anything else falls back to the separate extractor and enhancer calls.
+    """
+    
+    def __init__(self, entity_extractor: EntityExtractorAgent, query_enhancer: QueryEnhancerAgent):
+        self.model_id = "anthropic.claude-3-haiku-20240307-v1:0"
+        self.entity_extractor = entity_extractor
+        self.query_enhancer = query_enhancer
+        self.counts = {'fused': 0, 'fallback': 0}
+        self._lock = threading.Lock()
+    
+    def count(self, outcome: str):
+        with self._lock:
+            self.counts[outcome] += 1
+        tracing.record_event('query_analysis', outcome)
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self.counts)
+        total = counts['fused'] + counts['fallback']
+        counts['fallback_rate'] = round(counts['fallback'] / total, 4) if total else 0.0
+        return counts
+    
+    def build_prompt(self, query: str, existing_entities: Dict, history: List, summary: str = '') -> str:
+        history_str = "\n".join([f"Q: {h['query']}" for h in history[-2:]])
+        return f"""Analyze the query for policy document search. Return ONLY valid JSON.
+
+Current entities: {json.dumps(existing_entities)}
+{summary_section(summary)}Recent questions: {history_str}
+Query: "{query}"
+
+entities: department, years_of_service (number), state, county, policy_type
+Rules: Only extract explicitly mentioned entities, preserve existing unless updated
+enhanced_query: the query rewritten to be specific and context-aware for document search, using the entities and recent questions
+
+Example: {{"entities": {{"department": "police", "years_of_service": 15, "state": "California"}}, "enhanced_query": "vacation days for police officers with 15 years of service in California"}}
+JSON:"""
+    
+    def parse(self, content: str, existing_entities: Dict) -> Optional[Dict]:
+        """Merged entities and enhanced query, or None unless the reply matches the schema exactly"""
+        try:
+            data = extract_json(content.strip())
+        except ValueError:
+            return None
+        if not isinstance(data, dict) or set(data) != {'entities', 'enhanced_query'}:
+            return None
+        entities, enhanced_query = data['entities'], data['enhanced_query']
+        if not isinstance(entities, dict) or not set(entities) <= set(KEY_ENTITIES):
+            return None
+        if not isinstance(enhanced_query, str) or not enhanced_query.strip():
+            return None
+        updates = {}
+        for name, value in entities.items():
+            if value is None:
+                continue
+            if name == 'years_of_service':
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    return None
+            elif not isinstance(value, str):
+                return None
+            updates[name] = value
+        return {'entities': {**existing_entities, **updates}, 'enhanced_query': enhanced_query.strip()}
+    
+    def analyze(self, query: str, existing_entities: Dict, history: List, summary: str = '') -> Dict:
+        local = self.entity_extractor.local_pass(query, existing_entities)
+        if local is not None:
+            return {'entities': local, 'enhanced_query': self.query_enhancer.enhance(query, local, history, summary)}
+        try:
+            content = invoke_claude(self.model_id, self.build_prompt(query, existing_entities, history, summary), 400, 0.1, 'analysis')
+            result = self.parse(content, existing_entities)
+        except Exception as e:
+            print(f"Query analysis error: {e}")
+            result = None
+        if result is not None:
+            self.count('fused')
+            return result
+        self.count('fallback')
+        entities = self.entity_extractor.llm_extract(query, existing_entities)
+        return {'entities': entities, 'enhanced_query': self.query_enhancer.enhance(query, entities, history, summary)}
+
 class RetrievalAgent:
-    def retrieve(self, query: str, kb_id: str) -> List[Dict]:
+    """Knowledge base search with an optional result cache.
+
+    Cached results are keyed by (kb_id, normalized query, numberOfResults,
+    filters) and flushed whenever the ingestion generation changes, so a
+    re-index never serves chunks from the previous index. With a local
+    `index`, the query is embedded and searched in-process instead. With a
+    `lexical` BM25 index, both searches run side by side and are merged by
+    reciprocal rank fusion. With `shards`, the vector search goes to the
+    shard of the request's policy type, or to the main knowledge base when
+    no shard holds it.
+    """
+    
+    def __init__(self, cache: LRUCache = None, generation: Callable[[], str] = None, index=None,
+                 lexical: BM25Index = None, shards: ShardRouter = None):
+        self.cache = cache
+        self.generation = generation
+        self._generation = None
+        self.index = index
+        self.lexical = lexical
+        self.shards = shards
+        self.executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix='retrieval') if lexical else None
+    
+    def search(self, query: str, kb_id: str, number_of_results: int = 5, filters: Dict = None,
+               policy_type: str = None) -> List[Dict]:
+        if self.lexical is None:
+            return self.vector_search(query, kb_id, number_of_results, filters, policy_type)
+        # Wider candidate lists give fusion room to promote exact-term matches
+        candidates = number_of_results * 2
+        vector = self.executor.submit(contextvars.copy_context().run, self.vector_search, query, kb_id, candidates,
+                                      filters, policy_type)
+        lexical = self.lexical.retrieve(query, candidates, filters)
+        return reciprocal_rank_fusion([vector.result(), lexical], HYBRID_RRF_K, number_of_results)
+    
+    def vector_search(self, query: str, kb_id: str, number_of_results: int = 5, filters: Dict = None,
+                      policy_type: str = None) -> List[Dict]:
+        if self.shards is not None:
+            # Local shards share one query embedding
+            shard_query = embed_text(query) if RETRIEVAL_BACKEND == 'local' else query
+            return self.shards.retrieve(shard_query, number_of_results, filters, policy_type)
+        if self.index is not None:
+            return self.index.retrieve(embed_text(query), number_of_results, filters)
+        return knowledge_base_search(query, kb_id, number_of_results, filters)
+    
+    def shard_of(self, policy_type: str = None) -> Optional[str]:
+        return self.shards.route(policy_type) if self.shards is not None else None
+    
+    def cached_search(self, query: str, kb_id: str, number_of_results: int = 5, filters: Dict = None,
+                      policy_type: str = None) -> List[Dict]:
+        if self.cache is None:
+            return self.search(query, kb_id, number_of_results, filters, policy_type)
+        if self.generation is not None:
+            generation = self.generation()
+            if generation != self._generation:
+                self.cache.clear()
+                self._generation = generation
+        key = (kb_id, self.shard_of(policy_type), normalize_query(query), number_of_results,
+               json.dumps(filters, sort_keys=True, default=str))
+        documents = self.cache.get(key)
+        tracing.record_event('retrieval_cache', 'miss' if documents is None else 'hit')
+        if documents is None:
+            documents = self.search(query, kb_id, number_of_results, filters, policy_type)
+            self.cache.put(key, documents)
+        return [dict(d) for d in documents]
+    
+    def stats(self) -> Dict:
+        if self.cache is None:
+            return {}
+        return {**self.cache.stats(), 'generation': self._generation}
+    
+    def retrieve(self, query: str, kb_id: str, number_of_results: int = 5, filters: Dict = None,
+                 policy_type: str = None) -> List[Dict]:
         try:
-            response = bedrock_agent_runtime.retrieve(
-                knowledgeBaseId=kb_id,
-                retrievalQuery={'text': query},
-                retrievalConfiguration={'vectorSearchConfiguration': {'numberOfResults': 5}}
-            )
-            return [{
-                'content': r['content']['text'],
-                'source': r.get('location', {}).get('s3Location', {}).get('uri', 'Unknown'),
-                'score': r.get('score', 0)
-            } for r in response['retrievalResults']]
+            return self.cached_search(query, kb_id, number_of_results, filters, policy_type)
         except Exception as e:
             print(f"Retrieval error: {e}")
             return []
 
 class ResponseGeneratorAgent:
-    def __init__(self):
+    def __init__(self, packer: ContextPacker = None):
         self.model_id = "anthropic.claude-3-sonnet-20240229-v1:0"
+        self.packer = packer or ContextPacker(context_budget(self.model_id))
     
-    def generate(self, query: str, entities: Dict, documents: List[Dict], history: List) -> str:
-        docs_text = "\n\n".join([
-            f"Document {i+1} (relevance: {d['score']:.2f}):\n{d['content'][:800]}"
-            for i, d in enumerate(documents[:3])
-        ])
-        
+    def build_prompt(self, query: str, entities: Dict, documents: List[Dict], history: List, summary: str = '') -> str:
         entity_context = json.dumps(entities, indent=2)
-        history_text = ""
-        if history:
-            recent = history[-2:]
-            history_text = "\n".join([f"User: {h['query']}\nAssistant: {h['response'][:200]}" for h in recent])
-        
-        prompt = f"""You are a helpful policy assistant. Answer using the documents and user context.
+        sections, usage = self.packer.pack(
+            documents, history, focus=entity_terms(entities),
+            header=lambda i, d: f"Document {i+1} (relevance: {d['score']:.2f}):",
+            reserved=self.render(query, entity_context, "", ""), summary=summary_section(summary)
+        )
+        log_usage('response_generator', usage)
+        return self.render(query, entity_context, sections['history'], sections['documents'])
+    
+    def render(self, query: str, entity_context: str, history_text: str, docs_text: str) -> str:
+        return f"""You are a helpful policy assistant. Answer using the documents and user context.
 
 User Profile:
 {entity_context}
@@ -170,37 +760,66 @@ Instructions:
 5. Cite sources
 
 Response:"""
-
+    
+    def generate(self, query: str, entities: Dict, documents: List[Dict], history: List, summary: str = '') -> str:
         try:
-            response = bedrock_runtime.invoke_model(
-                modelId=self.model_id,
-                body=json.dumps({
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "max_tokens": 1000,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.7
-                })
-            )
-            result = json.loads(response['body'].read())
-            return result['content'][0]['text']
+            return invoke_claude(self.model_id, self.build_prompt(query, entities, documents, history, summary), 1000, 0.7, 'generation')
         except Exception as e:
             return f"Error generating response: {e}"
+    
+    def generate_stream(self, query: str, entities: Dict, documents: List[Dict], history: List, summary: str = '') -> Iterator[str]:
+        try:
+            yield from stream_claude(self.model_id, self.build_prompt(query, entities, documents, history, summary), 1000, 0.7, 'generation')
+        except Exception as e:
+            yield f"Error generating response: {e}"
 
 class ValidationAgent:
-    """Validates RAG response against source documents for accuracy"""
+    """Validates RAG response against source documents for accuracy.
+
+    A local grounding check runs first; when every figure and name in the
+    answer is found in one matching document sentence (and retrieval
+    scored well) its verdict is used and the Sonnet call is skipped.
+    """
     
-    def __init__(self):
+    def __init__(self, packer: ContextPacker = None, grounding: GroundingChecker = None):
         self.model_id = "anthropic.claude-3-sonnet-20240229-v1:0"
+        self.packer = packer or ContextPacker(context_budget(self.model_id))
+        self.grounding = grounding
+        self.counts = {'local': 0, 'llm': 0}
+        self._lock = threading.Lock()
     
-    def validate(self, query: str, response: str, documents: List[Dict]) -> Dict:
-        """Verify response accuracy against source documents"""
-        
-        docs_text = "\n\n".join([
-            f"Document {i+1}:\n{d['content'][:1000]}"
-            for i, d in enumerate(documents[:3])
-        ])
-        
-        prompt = f"""You are a fact-checking validator. Verify if the response is accurate based on the source documents.
+    def local_pass(self, query: str, response: str, documents: List[Dict]) -> Optional[Dict]:
+        if self.grounding is None:
+            return None
+        try:
+            result = self.grounding.verdict(query, response, documents)
+        except Exception as e:
+            print(f"Grounding check error: {e}")
+            result = None
+        source = 'local' if result is not None else 'llm'
+        with self._lock:
+            self.counts[source] += 1
+        tracing.record_event('validation', source)
+        return result
+    
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self.counts)
+        total = counts['local'] + counts['llm']
+        counts['llm_skip_rate'] = round(counts['local'] / total, 4) if total else 0.0
+        return counts
+    
+    def build_prompt(self, query: str, response: str, documents: List[Dict]) -> str:
+        # Sentences carrying the figures the response states are packed first
+        sections, usage = self.packer.pack(
+            documents, focus=numbers_in(response),
+            reserved=self.render(query, response, "")
+        )
+        log_usage('validation', usage)
+        return self.render(query, response, sections['documents'])
+    
+    def render(self, query: str, response: str, docs_text: str) -> str:
+        return f"""You are a fact-checking validator. Verify if the response is accurate based on the source documents.
 
 Source Documents:
 {docs_text}
@@ -225,31 +844,25 @@ Return JSON only:
 }}
 
 JSON:"""
-
+    
+    def validate(self, query: str, response: str, documents: List[Dict]) -> Dict:
+        """Verify response accuracy against source documents"""
+        local = self.local_pass(query, response, documents)
+        if local is not None:
+            return local
+        return self.llm_validate(query, response, documents)
+    
+    def llm_validate(self, query: str, response: str, documents: List[Dict]) -> Dict:
         try:
-            validation_response = bedrock_runtime.invoke_model(
-                modelId=self.model_id,
-                body=json.dumps({
-                    "anthropic_version": "bedrock-2023-05-31",
-                    "max_tokens": 500,
-                    "messages": [{"role": "user", "content": prompt}],
-                    "temperature": 0.1
-                })
-            )
-            
-            result = json.loads(validation_response['body'].read())
-            content = result['content'][0]['text'].strip()
-            
-            # Extract JSON
-            start = content.find('{')
-            end = content.rfind('}') + 1
-            if start >= 0 and end > start:
-                validation_result = json.loads(content[start:end])
+            content = invoke_claude(self.model_id, self.build_prompt(query, response, documents), 500, 0.1, 'validation')
+            validation_result = extract_json(content.strip())
+            if validation_result is not None:
                 return validation_result
-            
         except Exception as e:
             print(f"Validation error: {e}")
-        
+        return self.fallback()
+    
+    def fallback(self) -> Dict:
         # Default: assume valid if validation fails
         return {
             "is_valid": True,
@@ -259,35 +872,394 @@ JSON:"""
             "unsupported_claims": []
         }
 
+class AsyncConversationMemory(ConversationMemory):
+    async def get_context(self) -> Dict:
+        return await asyncio.to_thread(self.load)
+    
+    async def update_context(self, entities: Dict, query: str, response: str):
+        return await asyncio.to_thread(self.record, entities, query, response)
+
+class AsyncEntityExtractorAgent(EntityExtractorAgent):
+    async def extract(self, query: str, existing_entities: Dict) -> Dict:
+        local = self.local_pass(query, existing_entities)
+        if local is not None:
+            return local
+        return await self.llm_extract(query, existing_entities)
+    
+    async def llm_extract(self, query: str, existing_entities: Dict) -> Dict:
+        try:
+            content = await ainvoke_claude(self.model_id, self.build_prompt(query, existing_entities), 300, 0.1, 'extraction')
+            return self.parse(content, existing_entities)
+        except Exception as e:
+            print(f"Entity extraction error: {e}")
+        return existing_entities
+
+class AsyncQueryEnhancerAgent(QueryEnhancerAgent):
+    async def enhance(self, query: str, entities: Dict, history: List, summary: str = '') -> str:
+        try:
+            content = await ainvoke_claude(self.model_id, self.build_prompt(query, entities, history, summary), 150, 0.3, 'enhancement')
+            return content.strip()
+        except:
+            return query
+
+class AsyncQueryAnalyzerAgent(QueryAnalyzerAgent):
+    async def analyze(self, query: str, existing_entities: Dict, history: List, summary: str = '') -> Dict:
+        local = self.entity_extractor.local_pass(query, existing_entities)
+        if local is not None:
+            return {'entities': local, 'enhanced_query': await self.query_enhancer.enhance(query, local, history, summary)}
+        try:
+            content = await ainvoke_claude(self.model_id, self.build_prompt(query, existing_entities, history, summary), 400, 0.1, 'analysis')
+            result = self.parse(content, existing_entities)
+        except Exception as e:
+            print(f"Query analysis error: {e}")
+            result = None
+        if result is not None:
+            self.count('fused')
+            return result
+        self.count('fallback')
+        entities = await self.entity_extractor.llm_extract(query, existing_entities)
+        return {'entities': entities, 'enhanced_query': await self.query_enhancer.enhance(query, entities, history, summary)}
+
+class AsyncRetrievalAgent(RetrievalAgent):
+    async def retrieve(self, query: str, kb_id: str, number_of_results: int = 5, filters: Dict = None,
+                       policy_type: str = None) -> List[Dict]:
+        try:
+            return await asyncio.to_thread(self.cached_search, query, kb_id, number_of_results, filters, policy_type)
+        except Exception as e:
+            print(f"Retrieval error: {e}")
+            return []
+
+class AsyncResponseGeneratorAgent(ResponseGeneratorAgent):
+    async def generate(self, query: str, entities: Dict, documents: List[Dict], history: List, summary: str = '') -> str:
+        try:
+            return await ainvoke_claude(self.model_id, self.build_prompt(query, entities, documents, history, summary), 1000, 0.7, 'generation')
+        except Exception as e:
+            return f"Error generating response: {e}"
+    
+    async def generate_stream(self, query: str, entities: Dict, documents: List[Dict], history: List, summary: str = '') -> AsyncIterator[str]:
+        try:
+            prompt = self.build_prompt(query, entities, documents, history, summary)
+            tokens = await asyncio.to_thread(stream_claude, self.model_id, prompt, 1000, 0.7)
+            while True:
+                text = await asyncio.to_thread(next, tokens, None)
+                if text is None:
+                    break
+                yield text
+        except Exception as e:
+            yield f"Error generating response: {e}"
+
+class AsyncValidationAgent(ValidationAgent):
+    async def validate(self, query: str, response: str, documents: List[Dict]) -> Dict:
+        local = self.local_pass(query, response, documents)
+        if local is not None:
+            return local
+        return await self.llm_validate(query, response, documents)
+    
+    async def llm_validate(self, query: str, response: str, documents: List[Dict]) -> Dict:
+        try:
+            content = await ainvoke_claude(self.model_id, self.build_prompt(query, response, documents), 500, 0.1, 'validation')
+            validation_result = extract_json(content.strip())
+            if validation_result is not None:
+                return validation_result
+        except Exception as e:
+            print(f"Validation error: {e}")
+        return self.fallback()
+
+POST_ANSWER_STAGES = ('validation', 'memory', 'store')
+
+def _split_stages(stages: List[Stage]):
+    """Stages before the answer (retrieval side) and after it"""
+    before = [s for s in stages if s.name != 'answer' and s.name not in POST_ANSWER_STAGES]
+    return before, [s for s in stages if s.name in POST_ANSWER_STAGES]
+
+def _stream_context(results: Dict) -> Dict:
+    return {
+        'enhanced_query': results['enhanced_query'],
+        'entities': results['entities'],
+        'sources': [{'source': d['source'], 'relevance': round(d['score'], 2)} for d in results['documents'][:3]],
+        'rerank': _rerank_stats(results)
+    }
+
+def _rerank_stats(results: Dict) -> Dict:
+    return {k: v for k, v in results['rerank'].items() if k != 'documents'}
+
+def _merge_reports(reports: List[Dict]) -> Dict:
+    """Combine the scheduler reports of a request that ran in several parts (streaming)"""
+    merged = {'stages': {}, 'speculation': {}, 'total_ms': 0.0}
+    for report in reports:
+        merged['stages'].update(report.get('stages', {}))
+        merged['speculation'].update(report.get('speculation', {}))
+        merged['total_ms'] += report.get('total_ms', 0.0)
+    return merged
+
+def sse(event: str, data: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def _same_query(guess: str, actual: str) -> bool:
+    return " ".join(guess.lower().split()) == " ".join(actual.lower().split())
+
 class OrchestratorAgent:
-    def __init__(self):
-        self.entity_extractor = EntityExtractorAgent()
+    mode = 'sync'
+    
+    def __init__(self, scheduler: PipelineScheduler = None, answer_cache: AnswerCache = None):
+        self.entity_extractor = EntityExtractorAgent(rules=build_entity_rules())
         self.query_enhancer = QueryEnhancerAgent()
-        self.retrieval_agent = RetrievalAgent()
+        self.query_analyzer = QueryAnalyzerAgent(self.entity_extractor, self.query_enhancer) if QUERY_ANALYSIS == 'fused' else None
+        self.retrieval_agent = build_retrieval_agent(RetrievalAgent)
+        self.reranker = build_reranker()
         self.response_generator = ResponseGeneratorAgent()
-        self.validation_agent = ValidationAgent()
+        self.validation_agent = ValidationAgent(grounding=build_grounding())
+        self.scheduler = scheduler or PipelineScheduler(
+            max_workers=PIPELINE_MAX_WORKERS,
+            speculative=SPECULATIVE_EXECUTION
+        )
+        self.answer_cache = answer_cache
+        self.deferred = build_deferred_validation(self.complete_validation)
     
-    def process(self, query: str, session_id: str) -> Dict:
-        memory = ConversationMemory(session_id)
-        context = memory.get_context()
-        
-        # Step 1: Extract entities
-        entities = self.entity_extractor.extract(query, context.get('entities', {}))
-        
-        # Step 2: Enhance query
-        enhanced_query = self.query_enhancer.enhance(query, entities, context.get('history', []))
-        
-        # Step 3: Retrieve documents
-        documents = self.retrieval_agent.retrieve(enhanced_query, KB_ID)
-        
-        # Step 4: Generate response
-        response = self.response_generator.generate(query, entities, documents, context.get('history', []))
-        
-        # Step 5: Validate response
-        validation = self.validation_agent.validate(query, response, documents)
+    def lookup_answer(self, enhanced_query: str, entities: Dict):
+        if self.answer_cache is None:
+            return None
+        cached = self.answer_cache.get(enhanced_query, entities)
+        tracing.record_event('answer_cache', 'miss' if cached is None else 'hit')
+        return cached
+    
+    def store_answer(self, r: Dict):
+        if self.answer_cache is None or r['cached'] is not None:
+            return False
+        if r['answer'].startswith("Error generating response") or not r['validation'].get('is_valid', True):
+            return False
+        if r['validation'].get('status') == PENDING:
+            # Cached once the deferred verdict comes back valid
+            return False
+        self.answer_cache.put(r['enhanced_query'], r['entities'], {
+            'answer': r['answer'],
+            'validation': r['validation'],
+            'documents': r['documents']
+        })
+        return True
+    
+    def validate_answer(self, r: Dict, session_id: str, deferred: bool = False):
+        """Verdict for the answer, or with `deferred` a pending marker when only the model can decide.
+
+        Returns a coroutine for the async agents; the scheduler awaits it.
+        """
+        if r['cached']:
+            return r['cached']['validation']
+        if not deferred:
+            return self.validation_agent.validate(r['query'], r['answer'], r['documents'])
+        local = self.validation_agent.local_pass(r['query'], r['answer'], r['documents'])
+        if local is not None:
+            return local
+        job = {
+            'validation_id': validation_id(session_id),
+            'query': r['query'],
+            'answer': r['answer'],
+            'documents': r['documents'],
+            'enhanced_query': r['enhanced_query'],
+            'entities': r['entities']
+        }
+        try:
+            pending = self.deferred.defer(job)
+        except Exception as e:
+            print(f"Validation enqueue error, validating inline: {e}")
+            return self.validation_agent.llm_validate(r['query'], r['answer'], r['documents'])
+        tracing.record_event('validation', 'deferred')
+        return pending
+    
+    def complete_validation(self, job: Dict) -> Dict:
+        """Worker side of a deferred validation; a valid answer then enters the answer cache"""
+        def validate(job: Dict) -> Dict:
+            result = self.validation_agent.llm_validate(job['query'], job['answer'], job['documents'])
+            return run_async(result) if asyncio.iscoroutine(result) else result
         
-        # Step 6: Update memory
-        memory.update_context(entities, query, response)
+        record = self.deferred.complete(job, validate)
+        try:
+            self.store_answer({**job, 'cached': None, 'validation': record['validation']})
+        except Exception as e:
+            print(f"Answer cache write error: {e}")
+        return record
+    
+    def rerank(self, r: Dict) -> Dict:
+        """Drop near-duplicate chunks and diversify; cached documents are already reranked"""
+        if r['cached'] or self.reranker is None:
+            return {'documents': r['retrieved'], 'duplicates_removed': 0, 'tokens_saved': 0}
+        try:
+            return self.reranker.rerank(r['retrieved'])
+        except Exception as e:
+            print(f"Rerank error: {e}")
+            return {'documents': r['retrieved'], 'duplicates_removed': 0, 'tokens_saved': 0}
+    
+    def share(self, shared: Optional[SharedCalls], key, fn: Callable[[], Any]):
+        return fn() if shared is None else shared.call(key, fn)
+    
+    def retrieve_documents(self, enhanced_query: str, shared: SharedCalls = None, policy_type: str = None) -> List[Dict]:
+        shard = self.retrieval_agent.shard_of(policy_type)
+        return self.share(shared, ('retrieve', normalize_query(enhanced_query), shard),
+                          lambda: self.retrieval_agent.retrieve(enhanced_query, KB_ID, policy_type=policy_type))
+    
+    def guess_entities(self, r: Dict) -> Dict:
+        """Entities before extraction finishes: memory plus the rule-based pass on the raw query"""
+        entities = dict(r['context'].get('entities', {}))
+        if self.entity_extractor.rules is not None:
+            entities.update(self.entity_extractor.rules.extract(r['query'], entities)['entities'])
+        return entities
+    
+    def same_shard(self, guess: Dict, actual: Dict) -> bool:
+        return self.retrieval_agent.shard_of(guess.get('policy_type')) == self.retrieval_agent.shard_of(actual.get('policy_type'))
+    
+    def generate_answer(self, r: Dict, shared: SharedCalls = None) -> str:
+        history, summary = r['context'].get('history', []), r['context'].get('summary', '')
+        # Same enhanced query, profile and history in one batch means the same prompt inputs
+        key = ('answer', normalize_query(r['enhanced_query']), json.dumps(r['entities'], sort_keys=True, default=str),
+               json.dumps(history, sort_keys=True, default=str), summary)
+        return self.share(shared, key,
+                          lambda: self.response_generator.generate(r['query'], r['entities'], r['documents'], history, summary))
+    
+    def retrieval_stage(self, shared: SharedCalls = None) -> Stage:
+        deps = ['enhanced_query', 'cached']
+        # Retrieval chains onto the speculative enhancement (memory entities), so it
+        # holds whenever that enhancement does and is discarded with it otherwise
+        speculate = {'enhanced_query': FROM_SPECULATION, 'cached': lambda r: None}
+        matches = {'enhanced_query': _same_query}
+        if self.retrieval_agent.shards is not None:
+            # Routing needs the policy type; a speculative search keeps its result when the guess lands on the same shard
+            deps += ['entities', 'context']
+            speculate['entities'] = self.guess_entities
+            matches['entities'] = self.same_shard
+        return Stage('retrieved',
+                     lambda r: r['cached']['documents'] if r['cached'] else self.retrieve_documents(
+                         r['enhanced_query'], shared, r.get('entities', {}).get('policy_type')),
+                     deps=deps, speculate=speculate, matches=matches)
+    
+    def stages(self, memory: ConversationMemory, shared: SharedCalls = None, deferred: bool = False) -> List[Stage]:
+        """Pipeline dependency graph.
+
+        Enhancement speculatively starts on the entities already in memory
+        while extraction is still running, and retrieval on that speculative
+        enhanced query; the scheduler keeps those results only if the real
+        inputs match. An
+        answer-cache hit short-circuits retrieval, generation and validation.
+        Within a batch, `shared` lets items with the same enhanced query reuse
+        one retrieval and one generation. With `deferred`, validation the
+        local check cannot settle is queued and the result carries its id.
+        With a fused query analyzer one 'analysis' call yields both the
+        entities and the enhanced query.
+        """
+        if self.query_analyzer is not None:
+            understanding = [
+                Stage('analysis',
+                      lambda r: self.query_analyzer.analyze(r['query'], r['context'].get('entities', {}),
+                                                            r['context'].get('history', []),
+                                                            r['context'].get('summary', '')),
+                      deps=['context']),
+                Stage('entities', lambda r: r['analysis']['entities'], deps=['analysis']),
+                Stage('enhanced_query', lambda r: r['analysis']['enhanced_query'], deps=['analysis']),
+            ]
+        else:
+            understanding = [
+                Stage('entities',
+                      lambda r: self.entity_extractor.extract(r['query'], r['context'].get('entities', {})),
+                      deps=['context']),
+                Stage('enhanced_query',
+                      lambda r: self.query_enhancer.enhance(r['query'], r['entities'], r['context'].get('history', []),
+                                                            r['context'].get('summary', '')),
+                      deps=['entities', 'context'],
+                      speculate={'entities': lambda r: r['context'].get('entities', {})}),
+            ]
+        return [Stage('context', lambda r: memory.get_context())] + understanding + [
+            Stage('cached',
+                  lambda r: self.lookup_answer(r['enhanced_query'], r['entities']),
+                  deps=['entities', 'enhanced_query']),
+            self.retrieval_stage(shared),
+            Stage('rerank', self.rerank, deps=['retrieved', 'cached']),
+            Stage('documents', lambda r: r['rerank']['documents'], deps=['rerank']),
+            Stage('answer',
+                  lambda r: r['cached']['answer'] if r['cached'] else self.generate_answer(r, shared),
+                  deps=['entities', 'enhanced_query', 'documents', 'context', 'cached']),
+            Stage('validation',
+                  lambda r: self.validate_answer(r, memory.session_id, deferred),
+                  deps=['answer', 'documents', 'cached', 'context', 'enhanced_query', 'entities']),
+            Stage('memory',
+                  lambda r: memory.update_context(r['entities'], r['query'], r['answer']),
+                  deps=['entities', 'answer']),
+            Stage('store', self.store_answer,
+                  deps=['cached', 'answer', 'validation', 'documents', 'entities', 'enhanced_query']),
+        ]
+    
+    def process(self, query: str, session_id: str, shared: SharedCalls = None,
+                scheduler: PipelineScheduler = None, debug: bool = False, deferred: bool = False) -> Dict:
+        memory = ConversationMemory(session_id)
+        with tracing.tracing() as trace:
+            results = (scheduler or self.scheduler).run(self.stages(memory, shared, deferred), {'query': query})
+        return self.traced(self.build_result(query, session_id, results), trace, [results['_report']], debug)
+    
+    def traced(self, result: Dict, trace: tracing.Trace, reports: List[Dict], debug: bool) -> Dict:
+        """Emit the request's metrics; with `debug` also attach them to the response"""
+        summary = trace.summary(_merge_reports(reports))
+        tracing.emit(summary, self.mode)
+        if debug:
+            result['debug'] = summary
+        return result
+    
+    def process_batch(self, items: List[Dict], concurrency: int, debug: bool = False) -> Dict:
+        """Run batch items on `concurrency` workers; results keep the input order"""
+        shared = SharedCalls()
+        # Up to three stages of one query run at once (extraction plus two speculative stages)
+        scheduler = PipelineScheduler(max_workers=concurrency * 3, speculative=SPECULATIVE_EXECUTION)
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch') as pool:
+                results = list(pool.map(lambda item: batch_item(item, lambda q, s: self.process(q, s, shared, scheduler, debug)),
+                                        items))
+        finally:
+            scheduler.executor.shutdown(wait=False)
+        return batch_report(results, concurrency, shared, started)
+    
+    def process_stream(self, query: str, session_id: str, debug: bool = False, deferred: bool = False) -> Iterator[Dict]:
+        """Yield 'context', then one 'token' per text delta, then 'done' with the full result.
+
+        The reassembled answer feeds validation and the memory write exactly
+        as in process().
+        """
+        memory = ConversationMemory(session_id)
+        before, after = _split_stages(self.stages(memory, deferred=deferred))
+        with tracing.tracing() as trace:
+            results = self.scheduler.run(before, {'query': query})
+            reports = [results.pop('_report')]
+            yield {'event': 'context', 'data': _stream_context(results)}
+            
+            pieces = []
+            if results['cached']:
+                tokens = [results['cached']['answer']]
+            else:
+                tokens = self.response_generator.generate_stream(
+                    query, results['entities'], results['documents'], results['context'].get('history', []),
+                    results['context'].get('summary', ''))
+            for text in tokens:
+                pieces.append(text)
+                yield {'event': 'token', 'data': {'text': text}}
+            
+            results = self.scheduler.run(after, {**results, 'answer': ''.join(pieces)})
+            reports.append(results['_report'])
+        yield {'event': 'done', 'data': self.traced(self.build_result(query, session_id, results), trace, reports, debug)}
+    
+    def build_result(self, query: str, session_id: str, results: Dict) -> Dict:
+        entities = results['entities']
+        enhanced_query = results['enhanced_query']
+        documents = results['documents']
+        response = results['answer']
+        validation = results['validation']
+        if validation.get('status') == PENDING:
+            # Fetched later with the get_validation action
+            validation_summary = dict(validation)
+        else:
+            validation_summary = {
+                'is_valid': validation.get('is_valid', True),
+                'confidence': validation.get('confidence', 1.0),
+                'issues': validation.get('issues', []),
+                'supported_claims': validation.get('supported_claims', []),
+                'unsupported_claims': validation.get('unsupported_claims', [])
+            }
         
         return {
             'success': True,
@@ -295,28 +1267,369 @@ class OrchestratorAgent:
             'enhanced_query': enhanced_query,
             'entities': entities,
             'answer': response,
-            'validation': {
-                'is_valid': validation.get('is_valid', True),
-                'confidence': validation.get('confidence', 1.0),
-                'issues': validation.get('issues', []),
-                'supported_claims': validation.get('supported_claims', []),
-                'unsupported_claims': validation.get('unsupported_claims', [])
-            },
-            'sources': [{'source': d['source'], 'relevance': round(d['score'], 2)} for d in documents[:3]],
+            'validation': validation_summary,
+            'sources': [{'source': d['source'], 'relevance': round(d['score'], 2),
+                         **({'shard': d['shard']} if 'shard' in d else {})} for d in documents[:3]],
+            'rerank': _rerank_stats(results),
+            'memory': _memory_stats(results['context']),
             'session_id': session_id,
             'timestamp': datetime.utcnow().isoformat()
         }
 
-orchestrator = OrchestratorAgent()
+class AsyncOrchestratorAgent(OrchestratorAgent):
+    """Same stage graph and result shape, driven by asyncio.
+
+    Memory and model I/O of independent stages overlap on one event loop,
+    e.g. validation runs alongside the memory write.
+    """
+    
+    mode = 'async'
+    
+    def __init__(self, scheduler: AsyncPipelineScheduler = None, answer_cache: AnswerCache = None):
+        self.entity_extractor = AsyncEntityExtractorAgent(rules=build_entity_rules())
+        self.query_enhancer = AsyncQueryEnhancerAgent()
+        self.query_analyzer = (AsyncQueryAnalyzerAgent(self.entity_extractor, self.query_enhancer)
+                               if QUERY_ANALYSIS == 'fused' else None)
+        self.retrieval_agent = build_retrieval_agent(AsyncRetrievalAgent)
+        self.reranker = build_reranker()
+        self.response_generator = AsyncResponseGeneratorAgent()
+        self.validation_agent = AsyncValidationAgent(grounding=build_grounding())
+        self.scheduler = scheduler or AsyncPipelineScheduler(speculative=SPECULATIVE_EXECUTION)
+        self.answer_cache = answer_cache
+        self.deferred = build_deferred_validation(self.complete_validation)
+    
+    def share(self, shared: Optional[SharedCalls], key, fn: Callable[[], Any]):
+        return fn() if shared is None else shared.acall(key, fn)
+    
+    async def process(self, query: str, session_id: str, shared: SharedCalls = None, debug: bool = False,
+                      deferred: bool = False) -> Dict:
+        memory = AsyncConversationMemory(session_id)
+        with tracing.tracing() as trace:
+            results = await self.scheduler.run(self.stages(memory, shared, deferred), {'query': query})
+        return self.traced(self.build_result(query, session_id, results), trace, [results['_report']], debug)
+    
+    async def process_batch(self, items: List[Dict], concurrency: int, debug: bool = False) -> Dict:
+        shared = SharedCalls()
+        slots = asyncio.Semaphore(concurrency)
+        started = time.perf_counter()
+        
+        async def run(item: Dict) -> Dict:
+            async with slots:
+                return await abatch_item(item, lambda q, s: self.process(q, s, shared, debug))
+        
+        results = await asyncio.gather(*(run(item) for item in items))
+        return batch_report(list(results), concurrency, shared, started)
+    
+    async def process_stream(self, query: str, session_id: str, debug: bool = False,
+                             deferred: bool = False) -> AsyncIterator[Dict]:
+        memory = AsyncConversationMemory(session_id)
+        before, after = _split_stages(self.stages(memory, deferred=deferred))
+        with tracing.tracing() as trace:
+            results = await self.scheduler.run(before, {'query': query})
+            reports = [results.pop('_report')]
+            yield {'event': 'context', 'data': _stream_context(results)}
+            
+            pieces = []
+            if results['cached']:
+                pieces.append(results['cached']['answer'])
+                yield {'event': 'token', 'data': {'text': results['cached']['answer']}}
+            else:
+                async for text in self.response_generator.generate_stream(
+                        query, results['entities'], results['documents'], results['context'].get('history', []),
+                        results['context'].get('summary', '')):
+                    pieces.append(text)
+                    yield {'event': 'token', 'data': {'text': text}}
+            
+            results = await self.scheduler.run(after, {**results, 'answer': ''.join(pieces)})
+            reports.append(results['_report'])
+        yield {'event': 'done', 'data': self.traced(self.build_result(query, session_id, results), trace, reports, debug)}
+
+def _memory_stats(context: Dict) -> Dict:
+    """Size of the conversation context this turn's prompts were built from"""
+    history = context.get('history', [])
+    summary = context.get('summary', '')
+    return {
+        'turn': context.get('version', 0) + 1,
+        'verbatim_turns': len(history),
+        'summary_tokens': estimate_tokens(summary),
+        'history_tokens': sum(estimate_tokens(f"{h['query']} {h['response']}") for h in history)
+    }
+
+def batch_concurrency(value) -> Optional[int]:
+    """A request's `concurrency` capped at BATCH_MAX_CONCURRENCY; None unless a positive integer"""
+    if isinstance(value, bool) or isinstance(value, float) and not value.is_integer():
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return min(value, BATCH_MAX_CONCURRENCY) if value >= 1 else None
+
+def _batch_session(item: Dict) -> str:
+    return item.get('session_id') or f"batch-{int(datetime.utcnow().timestamp())}-{item['index']}"
+
+def _batch_error(item: Dict, error: str, started: float) -> Dict:
+    return {'success': False, 'index': item['index'], 'query': item.get('query'), 'session_id': item.get('session_id'),
+            'error': error, 'latency_ms': round((time.perf_counter() - started) * 1000, 1)}
+
+def batch_item(item: Dict, process: Callable[[str, str], Dict]) -> Dict:
+    """One batch entry with timing; failures become per-item errors"""
+    started = time.perf_counter()
+    if not item.get('query'):
+        return _batch_error(item, 'query is required', started)
+    try:
+        result = process(item['query'], _batch_session(item))
+    except Exception as e:
+        print(f"Batch item error: {e}")
+        return _batch_error(item, str(e), started)
+    return {**result, 'index': item['index'], 'latency_ms': round((time.perf_counter() - started) * 1000, 1)}
+
+async def abatch_item(item: Dict, process: Callable[[str, str], Any]) -> Dict:
+    started = time.perf_counter()
+    if not item.get('query'):
+        return _batch_error(item, 'query is required', started)
+    try:
+        result = await process(item['query'], _batch_session(item))
+    except Exception as e:
+        print(f"Batch item error: {e}")
+        return _batch_error(item, str(e), started)
+    return {**result, 'index': item['index'], 'latency_ms': round((time.perf_counter() - started) * 1000, 1)}
+
+def batch_report(results: List[Dict], concurrency: int, shared: SharedCalls, started: float) -> Dict:
+    total_ms = (time.perf_counter() - started) * 1000
+    return {
+        'success': True,
+        'results': results,
+        'stats': {
+            'items': len(results),
+            'failed': sum(1 for r in results if not r.get('success')),
+            'concurrency': concurrency,
+            'total_ms': round(total_ms, 1),
+            'queries_per_second': round(len(results) / (total_ms / 1000), 2) if total_ms else None,
+            **shared.stats()
+        }
+    }
+
+_loops = threading.local()
+
+def run_async(coro):
+    """Run a coroutine on a loop kept alive across warm invocations.
+
+    Lambda calls the handler from one thread; the loop is per thread so
+    in-process drivers (e.g. the load test) can call it concurrently.
+    """
+    loop = getattr(_loops, 'loop', None)
+    if loop is None or loop.is_closed():
+        loop = _loops.loop = asyncio.new_event_loop()
+        # Blocking AWS calls run on this executor; size it for a full batch as well
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=max(PIPELINE_MAX_WORKERS, BATCH_MAX_CONCURRENCY * 3)))
+    return loop.run_until_complete(coro)
+
+orchestrator = None
+_orchestrator_lock = threading.Lock()
+
+def get_orchestrator() -> OrchestratorAgent:
+    """Agents, indexes and caches are built on the first request that needs them"""
+    global orchestrator
+    if orchestrator is None:
+        with _orchestrator_lock:
+            if orchestrator is None:
+                with profiled('orchestrator'):
+                    if ORCHESTRATOR_MODE == 'async':
+                        orchestrator = AsyncOrchestratorAgent(answer_cache=build_answer_cache())
+                    else:
+                        orchestrator = OrchestratorAgent(answer_cache=build_answer_cache())
+                print(json.dumps({'cold_start': 'init', 'init_ms': dict(INIT_PROFILE)}))
+    return orchestrator
+
+def process_query(query: str, session_id: str, debug: bool = False, deferred: bool = False) -> Dict:
+    orchestrator = get_orchestrator()
+    if isinstance(orchestrator, AsyncOrchestratorAgent):
+        return run_async(orchestrator.process(query, session_id, debug=debug, deferred=deferred))
+    return orchestrator.process(query, session_id, debug=debug, deferred=deferred)
+
+def process_batch(items: List[Dict], concurrency: int, debug: bool = False) -> Dict:
+    orchestrator = get_orchestrator()
+    items = [{**item, 'index': i} if isinstance(item, dict) else {'index': i} for i, item in enumerate(items)]
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY, len(items) or 1))
+    if isinstance(orchestrator, AsyncOrchestratorAgent):
+        return run_async(orchestrator.process_batch(items, concurrency, debug))
+    return orchestrator.process_batch(items, concurrency, debug)
+
+_END = object()
+
+def iter_async(items: AsyncIterator) -> Iterator:
+    """Items of an async iterator as they are produced, driven on the warm loop.
+
+    One task consumes `items` for its whole life, so context variables it
+    sets (the request trace) hold across items; each step runs the loop
+    only until the next item is queued.
+    """
+    async def start():
+        queue = asyncio.Queue()
+        
+        async def pump():
+            try:
+                async for item in items:
+                    await queue.put((item, None))
+                await queue.put((_END, None))
+            except Exception as e:
+                await queue.put((_END, e))
+        return queue, asyncio.ensure_future(pump())
+    
+    queue, task = run_async(start())
+    try:
+        while True:
+            item, error = run_async(queue.get())
+            if error is not None:
+                raise error
+            if item is _END:
+                return
+            yield item
+    finally:
+        if not task.done():
+            task.cancel()
+            run_async(asyncio.gather(task, return_exceptions=True))
+
+def stream_query(query: str, session_id: str, debug: bool = False, deferred: bool = False) -> Iterator[str]:
+    """SSE-formatted chunks for a streaming query, each yielded as soon as it is produced"""
+    orchestrator = get_orchestrator()
+    if isinstance(orchestrator, AsyncOrchestratorAgent):
+        events = iter_async(orchestrator.process_stream(query, session_id, debug, deferred))
+    else:
+        events = orchestrator.process_stream(query, session_id, debug, deferred)
+    for event in events:
+        yield sse(event['event'], event['data'])
+
+def run_validation_jobs(jobs: List[Dict]) -> Dict:
+    """SQS worker: complete each queued validation; failed messages are retried by SQS"""
+    orchestrator = get_orchestrator()
+    failures = []
+    for entry in jobs:
+        try:
+            orchestrator.complete_validation(entry['job'])
+        except Exception as e:
+            print(f"Validation job error: {e}")
+            failures.append({'itemIdentifier': entry['message_id']})
+    return {'batchItemFailures': failures}
+
+def get_validation(body: Dict) -> Optional[Dict]:
+    vid = body.get('validation_id')
+    return validation_store().get(vid) if vid else None
+
+def profile_report() -> Dict:
+    report = {'import_ms': IMPORT_MS, 'init_ms': dict(INIT_PROFILE), 'clients': aws_clients.client_metrics()}
+    if orchestrator is not None:
+        report['llm_skips'] = {
+            'entity_extraction': orchestrator.entity_extractor.stats(),
+            'validation': orchestrator.validation_agent.stats()
+        }
+        if orchestrator.query_analyzer is not None:
+            report['query_analysis'] = orchestrator.query_analyzer.stats()
+    if _model_cache is not None:
+        report['model_cache'] = _model_cache.stats()
+    if _embedding_store is not None:
+        report['embedding_cache'] = _embedding_store.stats()
+    if _memory_store is not None:
+        report['memory'] = _memory_store.stats()
+    if orchestrator is not None and orchestrator.retrieval_agent.shards is not None:
+        report['retrieval_shards'] = orchestrator.retrieval_agent.shards.stats()
+    return report
+
+def warmup() -> Dict:
+    """Build agents, clients and indexes and open connections without invoking any model"""
+    started = time.perf_counter()
+    get_orchestrator()
+    for stage in ('extraction', 'generation', 'validation', 'embedding'):
+        aws_client('bedrock-runtime', stage)
+    aws_client('bedrock-agent-runtime', 'retrieval')
+    if MEMORY_BACKEND == 'dynamodb':
+        with profiled('connect:dynamodb'):
+            try:
+                memory_store().backend.get('__warmup__')
+            except Exception as e:
+                print(f"Warmup DynamoDB error: {e}")
+    if DATA_SOURCE_ID:
+        with profiled('connect:bedrock-agent'):
+            ingestion_generation.current()
+    return {
+        'success': True,
+        'warmup_ms': round((time.perf_counter() - started) * 1000, 1),
+        'profile': profile_report()
+    }
 
 def lambda_handler(event, context):
+    jobs = sqs_jobs(event)
+    if jobs is not None:
+        return run_validation_jobs(jobs)
     try:
-        body = json.loads(event.get('body', '{}'))
+        # API Gateway wraps the request in 'body'; scheduled warmers invoke directly
+        body = json.loads(event['body']) if event.get('body') else event
         action = body.get('action')
         
-        if action == 'query':
+        if action == 'warmup':
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps(warmup())
+            }
+        
+        if action == 'get_validation':
+            record = get_validation(body)
+            if record is None:
+                return {
+                    'statusCode': 404,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'success': False, 'error': 'Unknown or expired validation_id'})
+                }
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'success': True, **record}, default=str)
+            }
+        
+        if action in ('query', 'batch_query'):
+            if not KB_ID:
+                return {
+                    'statusCode': 500,
+                    'headers': {'Content-Type': 'application/json'},
+                    'body': json.dumps({'success': False, 'error': 'KNOWLEDGE_BASE_ID is not configured'})
+                }
+            if action == 'batch_query':
+                items = body.get('items')
+                if not isinstance(items, list) or not items or len(items) > BATCH_MAX_ITEMS:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json'},
+                        'body': json.dumps({'success': False, 'error': f'items must be a list of 1-{BATCH_MAX_ITEMS} objects'})
+                    }
+                concurrency = batch_concurrency(body.get('concurrency', BATCH_MAX_CONCURRENCY))
+                if concurrency is None:
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json'},
+                        'body': json.dumps({'success': False, 'error': 'concurrency must be a positive integer'})
+                    }
+                result = process_batch(items, concurrency, bool(body.get('debug')))
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps(result)
+                }
+            
             session_id = body.get('session_id', f"session-{int(datetime.utcnow().timestamp())}")
-            result = orchestrator.process(body['query'], session_id)
+            deferred = bool(body.get('async_validation', VALIDATION_MODE == 'deferred'))
+            
+            if body.get('stream'):
+                # API Gateway buffers the whole response, so this path only returns the
+                # events at once; stream_server.py behind a function URL sends each as produced
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'text/event-stream', 'Cache-Control': 'no-cache', 'Access-Control-Allow-Origin': '*'},
+                    'body': ''.join(stream_query(body['query'], session_id, bool(body.get('debug')), deferred))
+                }
+            
+            result = process_query(body['query'], session_id, bool(body.get('debug')), deferred)
             
             return {
                 'statusCode': 200,
@@ -327,7 +1640,7 @@ def lambda_handler(event, context):
             return {
                 'statusCode': 400,
                 'headers': {'Content-Type': 'application/json'},
-                'body': json.dumps({'success': False, 'error': 'Invalid action. Use: query'})
+                'body': json.dumps({'success': False, 'error': 'Invalid action. Use: query, batch_query, get_validation, warmup'})
             }
     except Exception as e:
         return {
@@ -335,3 +1648,9 @@ def lambda_handler(event, context):
             'headers': {'Content-Type': 'application/json'},
             'body': json.dumps({'success': False, 'error': str(e)})
         }
+
+IMPORT_MS = round((time.perf_counter() - _IMPORT_STARTED) * 1000, 1)
+print(json.dumps({'cold_start': 'import', 'import_ms': IMPORT_MS}))
+
+if EAGER_INIT:
+    warmup()
@@ -0,0 +1,185 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from cache import LRUCache
+
+# Entities that change the answer; anything else extracted is ignored for keying
+KEY_ENTITIES = ('department', 'years_of_service', 'state', 'county', 'policy_type')
+
+
+def normalize_query(query: str) -> str:
+    query = re.sub(r"[^\w\s%$.]", " ", query.lower())
+    query = re.sub(r"(?<!\d)\.|\.(?!\d)", " ", query)
+    return " ".join(query.split())
+
+
+def entity_profile(entities: Dict) -> Tuple:
+    profile = []
+    for name in KEY_ENTITIES:
+        value = entities.get(name)
+        if value in (None, ''):
+            continue
+        if isinstance(value, str):
+            value = " ".join(value.lower().split())
+        else:
+            value = str(value)
+        profile.append((name, value))
+    return tuple(profile)
+
+
+def _unit(vector: List[float]):
+    """float32 unit vector, so a cosine is one dot product; numpy loads with the semantic tier"""
+    import numpy as np
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+class InMemorySharedTier:
+    """Local stand-in for the DynamoDB shared tier"""
+
+    def __init__(self):
+        self.items = {}
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self.lock:
+            item = self.items.get(key)
+        if item is None or item[1] <= time.time():
+            return None
+        return json.loads(item[0])
+
+    def put(self, key: str, value: Dict, ttl_seconds: int):
+        with self.lock:
+            self.items[key] = (json.dumps(value, default=str), time.time() + ttl_seconds)
+
+
+class DynamoDBSharedTier:
+    """Answers shared across containers; expiry is enforced by the table TTL attribute"""
+
+    def __init__(self, table):
+        self.table = table
+
+    def get(self, key: str) -> Optional[Dict]:
+        item = self.table.get_item(Key={'cache_key': key}).get('Item')
+        if item is None or int(item['expires_at']) <= time.time():
+            return None
+        return json.loads(item['value'])
+
+    def put(self, key: str, value: Dict, ttl_seconds: int):
+        self.table.put_item(Item={
+            'cache_key': key,
+            'value': json.dumps(value, default=str),
+            'expires_at': int(time.time() + ttl_seconds)
+        })
+
+
+class AnswerCache:
+    """Two-tier cache of generated + validated answers.
+
+    Keys combine the ingestion generation, the normalized enhanced query and
+    the entity profile, so a completed re-index makes every older entry
+    unreachable. With an `embed` function, a miss falls back to the most
+    similar cached query with the same generation and profile.
+    """
+
+    def __init__(self, generation: Callable[[], str], shared=None,
+                 max_entries: int = 512, ttl_seconds: int = 3600,
+                 embed: Optional[Callable[[str], List[float]]] = None,
+                 similarity_threshold: float = 0.95, max_semantic_entries: int = 256):
+        self.generation = generation
+        self.shared = shared
+        self.ttl_seconds = ttl_seconds
+        self.local = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.embed = embed
+        self.similarity_threshold = similarity_threshold
+        self.semantic = LRUCache(max_entries=max_semantic_entries, ttl_seconds=ttl_seconds)
+        self.counters = {'local_hits': 0, 'shared_hits': 0, 'semantic_hits': 0, 'misses': 0, 'stores': 0}
+        self._lock = threading.Lock()
+
+    def key(self, enhanced_query: str, entities: Dict, generation: str = None) -> str:
+        raw = json.dumps([generation or self.generation(), normalize_query(enhanced_query),
+                          entity_profile(entities)])
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def get(self, enhanced_query: str, entities: Dict) -> Optional[Dict]:
+        generation = self.generation()
+        key = self.key(enhanced_query, entities, generation)
+
+        entry = self.local.get(key)
+        if entry is not None:
+            self._count('local_hits')
+            return entry
+
+        if self.shared is not None:
+            try:
+                entry = self.shared.get(key)
+            except Exception as e:
+                print(f"Answer cache read error: {e}")
+            if entry is not None:
+                self.local.put(key, entry)
+                self._count('shared_hits')
+                return entry
+
+        if self.embed is not None:
+            entry = self._similar(enhanced_query, entities, generation)
+            if entry is not None:
+                self._count('semantic_hits')
+                return entry
+
+        self._count('misses')
+        return None
+
+    def put(self, enhanced_query: str, entities: Dict, entry: Dict):
+        generation = self.generation()
+        key = self.key(enhanced_query, entities, generation)
+        self.local.put(key, entry)
+        if self.shared is not None:
+            try:
+                self.shared.put(key, entry, self.ttl_seconds)
+            except Exception as e:
+                print(f"Answer cache write error: {e}")
+        if self.embed is not None:
+            try:
+                scope = (generation, entity_profile(entities))
+                self.semantic.put(key, (scope, _unit(self.embed(enhanced_query)), entry))
+            except Exception as e:
+                print(f"Answer cache embedding error: {e}")
+        self._count('stores')
+
+    def _similar(self, enhanced_query: str, entities: Dict, generation: str) -> Optional[Dict]:
+        scope = (generation, entity_profile(entities))
+        candidates = [v for v in self.semantic.values() if v[0] == scope]
+        if not candidates:
+            return None
+        try:
+            vector = _unit(self.embed(enhanced_query))
+        except Exception as e:
+            print(f"Answer cache embedding error: {e}")
+            return None
+        import numpy as np
+        # One matrix-vector product over the profile's entries
+        scores = np.stack([c[1] for c in candidates]) @ vector
+        best = int(np.argmax(scores))
+        return candidates[best][2] if scores[best] >= self.similarity_threshold else None
+
+    def invalidate(self, *_):
+        self.local.clear()
+        self.semantic.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self.counters)
+        lookups = counters['local_hits'] + counters['shared_hits'] + counters['semantic_hits'] + counters['misses']
+        hits = lookups - counters['misses']
+        counters['hit_rate'] = round(hits / lookups, 4) if lookups else 0.0
+        counters['local_entries'] = len(self.local)
+        return counters
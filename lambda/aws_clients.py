@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import unquote
+
+import boto3
+from botocore.config import Config
+
+MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '50'))
+TCP_KEEPALIVE = os.environ.get('AWS_TCP_KEEPALIVE', 'true').lower() == 'true'
+RETRY_MODE = os.environ.get('AWS_RETRY_MODE', 'adaptive')
+MAX_ATTEMPTS = int(os.environ.get('AWS_MAX_ATTEMPTS', '4'))
+# Per-stage (connect, read) timeouts in seconds; AWS_STAGE_TIMEOUTS JSON overrides entries
+STAGE_TIMEOUTS = {
+    'default': (3, 60),
+    'extraction': (2, 15),
+    'enhancement': (2, 15),
+    'embedding': (2, 10),
+    'retrieval': (2, 15),
+    'generation': (2, 120),
+    'validation': (2, 60),
+    'memory': (1, 5),
+    'admin': (5, 60),
+}
+STAGE_TIMEOUTS.update({k: tuple(v) for k, v in json.loads(os.environ.get('AWS_STAGE_TIMEOUTS', '{}')).items()})
+# Requests per second allowed per model id ("*" applies to every other model); unset means unlimited
+MODEL_RATE_LIMITS = json.loads(os.environ.get('MODEL_RATE_LIMITS', '{}'))
+MODEL_BURST = float(os.environ.get('MODEL_BURST', '5'))
+THROTTLE_CODES = ('ThrottlingException', 'TooManyRequestsException', 'ProvisionedThroughputExceededException',
+                  'RequestLimitExceeded', 'SlowDown')
+
+
+class TokenBucket:
+    """Blocking token bucket shared by every thread calling one model"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.capacity = max(burst, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until one is available; returns seconds waited"""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class ClientMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.models = {}
+        self.throttles = {}
+
+    def record_wait(self, model_id: str, seconds: float):
+        with self.lock:
+            m = self.models.setdefault(model_id, {'requests': 0, 'queue_wait_ms': 0.0, 'max_queue_wait_ms': 0.0,
+                                                  'throttled': 0})
+            m['requests'] += 1
+            m['queue_wait_ms'] += seconds * 1000
+            m['max_queue_wait_ms'] = max(m['max_queue_wait_ms'], seconds * 1000)
+
+    def record_throttle(self, service: str, model_id: Optional[str]):
+        with self.lock:
+            self.throttles[service] = self.throttles.get(service, 0) + 1
+            if model_id in self.models:
+                self.models[model_id]['throttled'] += 1
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            models = {k: {**v, 'queue_wait_ms': round(v['queue_wait_ms'], 1),
+                          'max_queue_wait_ms': round(v['max_queue_wait_ms'], 1)} for k, v in self.models.items()}
+            return {'models': models, 'throttles': dict(self.throttles)}
+
+
+metrics = ClientMetrics()
+_session = None
+_clients = {}
+_buckets = {}
+_lock = threading.Lock()
+
+
+def client_config(stage: str = 'default') -> Config:
+    connect_timeout, read_timeout = STAGE_TIMEOUTS.get(stage, STAGE_TIMEOUTS['default'])
+    return Config(
+        connect_timeout=connect_timeout,
+        read_timeout=read_timeout,
+        max_pool_connections=MAX_POOL_CONNECTIONS,
+        tcp_keepalive=TCP_KEEPALIVE,
+        retries={'mode': RETRY_MODE, 'max_attempts': MAX_ATTEMPTS}
+    )
+
+
+def _count_throttles(service: str):
+    def on_retry(response=None, **kwargs):
+        if response and isinstance(response[1], dict):
+            if response[1].get('Error', {}).get('Code') in THROTTLE_CODES:
+                path = (kwargs.get('request_dict') or {}).get('url_path') or ''
+                model_id = unquote(path.split('/model/')[1].split('/')[0]) if '/model/' in path else None
+                metrics.record_throttle(service, model_id)
+    return on_retry
+
+
+def _create(service: str, stage: str, resource: bool):
+    global _session
+    if _session is None:
+        _session = boto3.session.Session()
+    region = os.environ.get('AWS_REGION', 'us-east-1')
+    factory = _session.resource if resource else _session.client
+    made = factory(service, region_name=region, config=client_config(stage))
+    events = (made.meta.client if resource else made).meta.events
+    events.register(f"needs-retry.{service}", _count_throttles(service))
+    return made
+
+
+def _get(service: str, stage: str, resource: bool):
+    key = (service, STAGE_TIMEOUTS.get(stage, STAGE_TIMEOUTS['default']), resource)
+    made = _clients.get(key)
+    if made is None:
+        with _lock:
+            made = _clients.get(key)
+            if made is None:
+                made = _clients[key] = _create(service, stage, resource)
+    return made
+
+
+def get_client(service: str, stage: str = 'default'):
+    """Shared boto3 client for a service; stages with the same timeouts share one client"""
+    return _get(service, stage, resource=False)
+
+
+def get_resource(service: str, stage: str = 'default'):
+    return _get(service, stage, resource=True)
+
+
+def _bucket(model_id: str) -> Optional[TokenBucket]:
+    rate = MODEL_RATE_LIMITS.get(model_id, MODEL_RATE_LIMITS.get('*'))
+    if not rate:
+        return None
+    bucket = _buckets.get(model_id)
+    if bucket is None:
+        with _lock:
+            bucket = _buckets.setdefault(model_id, TokenBucket(float(rate), MODEL_BURST))
+    return bucket
+
+
+def acquire(model_id: str) -> float:
+    """Wait for the model's rate limiter; returns seconds spent queued"""
+    bucket = _bucket(model_id)
+    waited = bucket.acquire() if bucket is not None else 0.0
+    metrics.record_wait(model_id, waited)
+    return waited
+
+
+def invoke_model(model_id: str, body: str, stage: str = 'default') -> Dict:
+    acquire(model_id)
+    return get_client('bedrock-runtime', stage).invoke_model(modelId=model_id, body=body)
+
+
+def invoke_model_with_response_stream(model_id: str, body: str, stage: str = 'default') -> Dict:
+    acquire(model_id)
+    return get_client('bedrock-runtime', stage).invoke_model_with_response_stream(modelId=model_id, body=body)
+
+
+def client_metrics() -> Dict:
+    return metrics.snapshot()
@@ -0,0 +1,144 @@
+import asyncio
+import copy
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+
+class LRUCache:
+    """Thread-safe LRU cache with optional TTL and byte budget.
+
+    Entries are evicted least-recently-used first once either `max_entries`
+    or `max_bytes` (measured with `sizeof`) is exceeded. Expired entries are
+    dropped lazily on access.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = None,
+                 max_bytes: Optional[int] = None, sizeof: Optional[Callable[[Any], int]] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: 0)
+        self._data = OrderedDict()  # key -> (value, expires_at, size)
+        self._lock = threading.Lock()
+        self.bytes_held = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at, _ = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value, ttl_seconds: Optional[float] = None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        expires_at = time.monotonic() + ttl if ttl else None
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires_at, size)
+            self.bytes_held += size
+            while self._data and (len(self._data) > self.max_entries or
+                                  (self.max_bytes is not None and self.bytes_held > self.max_bytes)):
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                return default
+            value = self._data[key][0]
+            self._remove(key)
+            return value
+
+    def values(self):
+        """Snapshot of unexpired values without touching recency or counters"""
+        now = time.monotonic()
+        with self._lock:
+            return [v for v, expires_at, _ in self._data.values() if expires_at is None or expires_at > now]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.bytes_held = 0
+
+    def _remove(self, key):
+        _, _, size = self._data.pop(key)
+        self.bytes_held -= size
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._data),
+            'bytes_held': self.bytes_held,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'evictions': self.evictions,
+            'expirations': self.expirations
+        }
+
+
+class SharedCalls:
+    """Runs each keyed call once for the lifetime of the object.
+
+    The first caller for a key runs the function; concurrent and later
+    callers wait for it and receive their own copy of its result. Used to share
+    work between items of one batch.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _claim(self, key, make):
+        with self._lock:
+            entry = self._calls.get(key)
+            if entry is not None:
+                self.hits += 1
+                return entry, False
+            self.misses += 1
+            entry = self._calls[key] = make()
+            return entry, True
+
+    def call(self, key, fn: Callable[[], Any]):
+        future, owner = self._claim(key, Future)
+        if not owner:
+            return copy.deepcopy(future.result())
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        future.set_result(copy.deepcopy(result))
+        return result
+
+    async def acall(self, key, fn: Callable[[], Any]):
+        """`call` for coroutine functions; callers must share one event loop"""
+        task, _ = self._claim(key, lambda: asyncio.ensure_future(fn()))
+        return copy.deepcopy(await task)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {'shared_hits': self.hits, 'shared_calls': self.misses}
@@ -0,0 +1,134 @@
+import json
+import re
+from typing import Dict, Iterable, List, Tuple
+
+PIECE = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])|\n{2,}|\n(?=\s*(?:[-*•]|\d+[.)])\s)")
+NUMBER = re.compile(r"\d+(?:\.\d+)?%?")
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast local estimate of Claude tokens.
+
+    Words cost about one token per 5 letters, digit runs one per 3 digits
+    and punctuation one each, which tracks the real tokenizer on policy prose
+    closely enough for budgeting.
+    """
+    tokens = 0
+    for piece in PIECE.findall(text):
+        if piece[0].isalpha():
+            tokens += (len(piece) + 4) // 5
+        elif piece[0].isdigit():
+            tokens += (len(piece) + 2) // 3
+        else:
+            tokens += 1
+    return tokens
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in SENTENCE_END.split(text) if s and s.strip()]
+
+
+def entity_terms(entities: Dict) -> List[str]:
+    """Lowercased entity values worth looking for in chunk text"""
+    terms = []
+    for value in entities.values():
+        if value in (None, '', [], {}):
+            continue
+        if isinstance(value, (list, tuple)):
+            terms.extend(str(v).lower() for v in value)
+        else:
+            terms.append(str(value).lower())
+    return terms
+
+
+def numbers_in(text: str) -> List[str]:
+    return NUMBER.findall(text)
+
+
+class ContextPacker:
+    """Fills a prompt's token budget with the most useful context.
+
+    Documents are packed at sentence granularity: sentences are taken in
+    order of their chunk's relevance score, boosted when they mention one
+    of the `focus` terms (the user's entities, or figures being checked),
+    and re-assembled in their original order. History is packed newest
+    first. `usage` reports tokens spent per section.
+    """
+
+    def __init__(self, budget: int, history_share: float = 0.2, focus_boost: float = 0.5):
+        self.budget = budget
+        self.history_share = history_share
+        self.focus_boost = focus_boost
+
+    def pack_history(self, history: List[Dict], budget: int) -> Tuple[str, int]:
+        turns, used = [], 0
+        for turn in reversed(history):
+            text = f"User: {turn['query']}\nAssistant: {turn['response']}"
+            cost = estimate_tokens(text) + 1
+            if used + cost > budget:
+                break
+            turns.append(text)
+            used += cost
+        return "\n".join(reversed(turns)), used
+
+    def pack_documents(self, documents: List[Dict], budget: int, focus: Iterable[str] = (),
+                       header=lambda i, d: f"Document {i+1}:") -> Tuple[str, int]:
+        terms = [re.escape(f) for f in focus if f]
+        pattern = re.compile(r"\b(?:%s)\b" % '|'.join(terms)) if terms else None
+        candidates = []
+        for d, doc in enumerate(documents):
+            for s, sentence in enumerate(split_sentences(doc['content'])):
+                hit = bool(pattern and pattern.search(sentence.lower()))
+                priority = doc.get('rank_score', doc.get('score', 0)) * (1 + self.focus_boost * hit)
+                candidates.append((-priority, d, s, sentence))
+        candidates.sort()
+
+        chosen, used = {}, 0
+        for _, d, s, sentence in candidates:
+            cost = estimate_tokens(sentence) + 1
+            if d not in chosen:
+                cost += estimate_tokens(header(d, documents[d])) + 2
+            if used + cost > budget:
+                continue
+            chosen.setdefault(d, []).append((s, sentence))
+            used += cost
+
+        blocks = []
+        for d in sorted(chosen):
+            parts, last = [], None
+            for s, sentence in sorted(chosen[d]):
+                if last is not None and s != last + 1:
+                    parts.append("...")
+                parts.append(sentence)
+                last = s
+            blocks.append(f"{header(len(blocks), documents[d])}\n{' '.join(parts)}")
+        return "\n\n".join(blocks), used
+
+    def pack(self, documents: List[Dict], history: List[Dict] = None, focus: Iterable[str] = (),
+             header=lambda i, d: f"Document {i+1}:", reserved: str = "", summary: str = "") -> Tuple[Dict, Dict]:
+        """Returns ({'documents', 'history'} text, tokens used per section).
+
+        `reserved` is fixed prompt text (instructions, question, profile)
+        whose tokens come out of the budget first. A conversation `summary`
+        leads the history section and is paid from the history share, so
+        fewer verbatim turns fit beside it.
+        """
+        fixed = estimate_tokens(reserved)
+        available = max(self.budget - fixed, 0)
+        summary_used = estimate_tokens(summary) + 1 if summary else 0
+        history_text, history_used = "", 0
+        if history:
+            history_text, history_used = self.pack_history(
+                history, max(int(available * self.history_share) - summary_used, 0))
+        history_used += summary_used
+        docs_text, docs_used = self.pack_documents(documents, available - history_used, focus, header)
+        usage = {'fixed': fixed, 'history': history_used, 'documents': docs_used,
+                 'total': fixed + history_used + docs_used, 'budget': self.budget}
+        if summary:
+            usage['summary'] = summary_used
+        return {'documents': docs_text, 'history': summary + history_text}, usage
+
+
+def log_usage(agent: str, usage: Dict):
+    print(json.dumps({'context_tokens': agent, **usage}))
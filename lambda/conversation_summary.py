@@ -0,0 +1,77 @@
+import threading
+from typing import Callable, Dict, List
+
+from context_packer import estimate_tokens, split_sentences
+
+
+def summary_section(summary: str) -> str:
+    return f"Conversation summary: {summary}\n" if summary else ""
+
+
+class ConversationSummarizer:
+    """Folds turns that leave the verbatim window into a running session summary.
+
+    `summarize` maps a prompt to model text. The prompt carries only the
+    previous summary and the turns being folded, never the whole
+    conversation, so each refresh costs the same however long the session
+    runs. The result is cut to `max_tokens` locally whatever the model
+    returns; if the call fails the turns' questions are appended instead
+    and the oldest sentences dropped.
+    """
+
+    def __init__(self, summarize: Callable[[str], str], max_tokens: int = 200):
+        self.summarize = summarize
+        self.max_tokens = max_tokens
+        self.counts = {'model': 0, 'local': 0}
+        self._lock = threading.Lock()
+
+    def build_prompt(self, summary: str, turns: List[Dict]) -> str:
+        turns_str = "\n".join(f"User: {t['query']}\nAssistant: {t['response']}" for t in turns)
+        words = self.max_tokens * 3 // 4
+        return f"""Summarize the conversation between a user and a policy assistant.
+
+Previous summary: {summary or 'none'}
+New turns:
+{turns_str}
+
+Merge the new turns into the previous summary. Keep the user's profile details (department, years of service, location, policy type), the questions asked and the key figures and policies in the answers. Drop pleasantries. At most {words} words. Return ONLY the summary.
+Summary:"""
+
+    def bound(self, text: str, keep_newest: bool = False) -> str:
+        """Whole sentences that fit max_tokens, from the start (or the end when `keep_newest`)"""
+        sentences = split_sentences(text)
+        if keep_newest:
+            sentences = sentences[::-1]
+        kept, used = [], 0
+        for sentence in sentences:
+            cost = estimate_tokens(sentence) + 1
+            if used + cost > self.max_tokens:
+                break
+            kept.append(sentence)
+            used += cost
+        return " ".join(kept[::-1] if keep_newest else kept)
+
+    def local(self, summary: str, turns: List[Dict]) -> str:
+        asked = " ".join(f"Asked: {t['query'].strip().rstrip('?.!')}." for t in turns)
+        return self.bound(f"{summary} {asked}".strip(), keep_newest=True)
+
+    def fold(self, summary: str, turns: List[Dict]) -> str:
+        if not turns:
+            return summary
+        try:
+            text = self.bound(self.summarize(self.build_prompt(summary, turns)).strip())
+            if text:
+                self.count('model')
+                return text
+        except Exception as e:
+            print(f"Conversation summary error: {e}")
+        self.count('local')
+        return self.local(summary, turns)
+
+    def count(self, outcome: str):
+        with self._lock:
+            self.counts[outcome] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self.counts)
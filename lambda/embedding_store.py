@@ -0,0 +1,241 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+INDEX_DTYPE = np.dtype([('key', '<u8'), ('row', '<u4'), ('used', '<u4')])
+# Compaction keeps this share of max_entries so the next one is not one insert away
+COMPACT_TO = 0.8
+
+
+def text_key(text: str) -> int:
+    """First 64 bits of the text's SHA-256; collisions stay below 1e-7 at a million entries"""
+    return int.from_bytes(hashlib.sha256(text.encode('utf-8')).digest()[:8], 'big')
+
+
+class EmbeddingStore:
+    """Embeddings keyed by a hash of their text, persisted in `directory`.
+
+    Vectors live in an append-only float32 file read through a memory map;
+    a sorted array of (key, row, last used) records maps a text hash to its
+    row with a binary search, so lookups create no per-entry Python objects.
+    New vectors are appended immediately and merged into the sorted index
+    every `flush_every` puts. Past `max_entries` the least recently used
+    rows are dropped by rewriting both files under a new generation; meta.json
+    names the current generation and is replaced last, so a reader (any
+    number of processes may open the directory with readonly=True) never
+    sees a half-written store. One process writes.
+    """
+
+    def __init__(self, directory: str, model_id: str = '', max_entries: int = 10000,
+                 readonly: bool = False, flush_every: int = 64):
+        self.directory = directory
+        self.model_id = model_id
+        self.max_entries = max_entries
+        self.readonly = readonly
+        self.flush_every = flush_every
+        self.counts = {}
+        self.compactions = 0
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._load()
+        if not readonly and len(self.index) > max_entries:
+            self._compact(int(max_entries * COMPACT_TO))
+
+    def refresh(self):
+        """Reopen the current generation; readers call this to see other processes' writes"""
+        with self._lock:
+            self._flush()
+            self._load()
+
+    def _path(self, name: str, generation: Optional[int] = None) -> str:
+        generation = self.generation if generation is None else generation
+        return os.path.join(self.directory, name.format(generation=generation))
+
+    def _load(self):
+        self.generation, self.dim = 0, None
+        self.index = np.zeros(0, dtype=INDEX_DTYPE)
+        self.vectors = None
+        self.rows = 0
+        meta_path = os.path.join(self.directory, 'meta.json')
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                meta = json.load(f)
+            if meta.get('model_id') == self.model_id:
+                self.generation, self.dim = meta['generation'], meta['dim']
+                index_path = self._path('index-{generation}.npy')
+                if os.path.exists(index_path):
+                    self.index = np.load(index_path, mmap_mode='r' if self.readonly else None)
+                self._map_vectors()
+            elif self.readonly:
+                raise ValueError(f"embedding store {self.directory} holds {meta.get('model_id')}, not {self.model_id}")
+            else:
+                # Vectors of another model are useless; start a fresh generation
+                for name in ('vectors-{generation}.f32', 'index-{generation}.npy'):
+                    if os.path.exists(self._path(name, meta['generation'])):
+                        os.remove(self._path(name, meta['generation']))
+                self.generation = meta['generation'] + 1
+        if not self.readonly:
+            os.makedirs(self.directory, exist_ok=True)
+            self.index = np.array(self.index)
+
+    def _map_vectors(self):
+        path = self._path('vectors-{generation}.f32')
+        if not self.dim or not os.path.exists(path):
+            return
+        row_bytes = self.dim * 4
+        size = os.path.getsize(path)
+        if size % row_bytes and not self.readonly:
+            # A write interrupted mid-row; later appends must start on a row boundary
+            with open(path, 'r+b') as f:
+                f.truncate(size - size % row_bytes)
+        self.rows = size // row_bytes
+        self.vectors = np.memmap(path, dtype=np.float32, mode='r', shape=(self.rows, self.dim)) if self.rows else None
+
+    def _write_meta(self):
+        meta_path = os.path.join(self.directory, 'meta.json')
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump({'model_id': self.model_id, 'dim': self.dim, 'generation': self.generation}, f)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    def _find(self, key: int) -> int:
+        pos = int(np.searchsorted(self.index['key'], key))
+        if pos < len(self.index) and self.index['key'][pos] == key:
+            return pos
+        return -1
+
+    def _count(self, kind: str, outcome: str, nbytes: int = 0):
+        counts = self.counts.setdefault(kind, {'hits': 0, 'misses': 0, 'bytes_saved': 0})
+        counts[outcome] += 1
+        counts['bytes_saved'] += nbytes
+
+    def get(self, text: str, kind: str = 'query') -> Optional[np.ndarray]:
+        key = text_key(text)
+        with self._lock:
+            vector = self._pending.get(key)
+            if vector is None:
+                pos = self._find(key)
+                if pos >= 0:
+                    vector = np.array(self.vectors[self.index['row'][pos]])
+                    if not self.readonly:
+                        self.index['used'][pos] = int(time.time())
+            if vector is None:
+                self._count(kind, 'misses')
+                return None
+            # Text not sent to the model plus the vector not returned by it
+            self._count(kind, 'hits', len(text.encode('utf-8')) + vector.nbytes)
+            return vector
+
+    def put(self, text: str, vector):
+        if self.readonly:
+            return
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        key = text_key(text)
+        with self._lock:
+            if key in self._pending or self._find(key) >= 0:
+                return
+            if self.dim is None:
+                self.dim = len(vector)
+                self._write_meta()
+            elif len(vector) != self.dim:
+                raise ValueError(f"embedding has {len(vector)} dimensions, store holds {self.dim}")
+            with open(self._path('vectors-{generation}.f32'), 'ab') as f:
+                f.write(vector.tobytes())
+            self._pending[key] = vector
+            if len(self._pending) >= self.flush_every:
+                self._flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self.readonly or not self._pending:
+            return
+        first_row = self.rows
+        added = np.zeros(len(self._pending), dtype=INDEX_DTYPE)
+        added['key'] = list(self._pending)
+        added['row'] = np.arange(first_row, first_row + len(added))
+        added['used'] = int(time.time())
+        self.index = np.sort(np.concatenate([self.index, added]), order='key')
+        self._pending = {}
+        self._map_vectors()
+        if len(self.index) > self.max_entries:
+            self._compact(int(self.max_entries * COMPACT_TO))
+        else:
+            self._save_index()
+
+    def _save_index(self):
+        path = self._path('index-{generation}.npy')
+        with open(path + '.tmp', 'wb') as f:
+            np.save(f, self.index)
+        os.replace(path + '.tmp', path)
+
+    def _compact(self, keep: int):
+        kept = np.sort(self.index[np.argsort(self.index['used'], kind='stable')[-keep:]], order='row')
+        old = self.generation
+        self.generation += 1
+        with open(self._path('vectors-{generation}.f32'), 'wb') as f:
+            for start in range(0, len(kept), 4096):
+                f.write(np.ascontiguousarray(self.vectors[kept['row'][start:start + 4096]]).tobytes())
+        kept['row'] = np.arange(len(kept))
+        self.index = np.sort(kept, order='key')
+        self._save_index()
+        self._write_meta()
+        self._map_vectors()
+        for name in ('vectors-{generation}.f32', 'index-{generation}.npy'):
+            if os.path.exists(self._path(name, old)):
+                os.remove(self._path(name, old))
+        self.compactions += 1
+
+    def cached(self, embed: Callable[[str], List[float]], kind: str = 'query') -> Callable[[str], List[float]]:
+        """`embed` behind the store"""
+        def embed_cached(text: str):
+            vector = self.get(text, kind)
+            if vector is None:
+                vector = embed(text)
+                self.put(text, vector)
+            return vector
+        return embed_cached
+
+    def cached_batch(self, embed_batch: Callable[[List[str]], List], kind: str = 'chunk') -> Callable[[List[str]], List]:
+        """`embed_batch` behind the store; only the texts it has not seen reach the model"""
+        def embed_cached(texts: List[str]):
+            vectors = [self.get(t, kind) for t in texts]
+            missing = [t for t, v in zip(texts, vectors) if v is None]
+            computed = iter(embed_batch(missing) if missing else [])
+            result = []
+            for text, vector in zip(texts, vectors):
+                if vector is None:
+                    vector = next(computed)
+                    self.put(text, vector)
+                result.append(vector)
+            return result
+        return embed_cached
+
+    def __len__(self) -> int:
+        return len(self.index) + len(self._pending)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            kinds = {kind: dict(counts) for kind, counts in self.counts.items()}
+            entries = len(self.index) + len(self._pending)
+        for counts in kinds.values():
+            calls = counts['hits'] + counts['misses']
+            counts['hit_rate'] = round(counts['hits'] / calls, 4) if calls else 0.0
+        hits = sum(c['hits'] for c in kinds.values())
+        total = hits + sum(c['misses'] for c in kinds.values())
+        return {
+            'hits': hits,
+            'misses': total - hits,
+            'hit_rate': round(hits / total, 4) if total else 0.0,
+            'bytes_saved': sum(c['bytes_saved'] for c in kinds.values()),
+            'kinds': kinds,
+            'entries': entries,
+            'file_bytes': self.rows * (self.dim or 0) * 4,
+            'compactions': self.compactions
+        }
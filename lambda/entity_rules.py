@@ -0,0 +1,361 @@
+import csv
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+STATES = {
+    'Alabama': 'AL', 'Alaska': 'AK', 'Arizona': 'AZ', 'Arkansas': 'AR', 'California': 'CA',
+    'Colorado': 'CO', 'Connecticut': 'CT', 'Delaware': 'DE', 'Florida': 'FL', 'Georgia': 'GA',
+    'Hawaii': 'HI', 'Idaho': 'ID', 'Illinois': 'IL', 'Indiana': 'IN', 'Iowa': 'IA',
+    'Kansas': 'KS', 'Kentucky': 'KY', 'Louisiana': 'LA', 'Maine': 'ME', 'Maryland': 'MD',
+    'Massachusetts': 'MA', 'Michigan': 'MI', 'Minnesota': 'MN', 'Mississippi': 'MS', 'Missouri': 'MO',
+    'Montana': 'MT', 'Nebraska': 'NE', 'Nevada': 'NV', 'New Hampshire': 'NH', 'New Jersey': 'NJ',
+    'New Mexico': 'NM', 'New York': 'NY', 'North Carolina': 'NC', 'North Dakota': 'ND', 'Ohio': 'OH',
+    'Oklahoma': 'OK', 'Oregon': 'OR', 'Pennsylvania': 'PA', 'Rhode Island': 'RI', 'South Carolina': 'SC',
+    'South Dakota': 'SD', 'Tennessee': 'TN', 'Texas': 'TX', 'Utah': 'UT', 'Vermont': 'VT',
+    'Virginia': 'VA', 'Washington': 'WA', 'West Virginia': 'WV', 'Wisconsin': 'WI', 'Wyoming': 'WY',
+    'District of Columbia': 'DC'
+}
+
+# Built-in county coverage; load_counties() adds the full Census list
+COUNTIES = {
+    'California': [
+        'Alameda', 'Alpine', 'Amador', 'Butte', 'Calaveras', 'Colusa', 'Contra Costa', 'Del Norte',
+        'El Dorado', 'Fresno', 'Glenn', 'Humboldt', 'Imperial', 'Inyo', 'Kern', 'Kings', 'Lake',
+        'Lassen', 'Los Angeles', 'Madera', 'Marin', 'Mariposa', 'Mendocino', 'Merced', 'Modoc',
+        'Mono', 'Monterey', 'Napa', 'Nevada', 'Orange', 'Placer', 'Plumas', 'Riverside',
+        'Sacramento', 'San Benito', 'San Bernardino', 'San Diego', 'San Francisco', 'San Joaquin',
+        'San Luis Obispo', 'San Mateo', 'Santa Barbara', 'Santa Clara', 'Santa Cruz', 'Shasta',
+        'Sierra', 'Siskiyou', 'Solano', 'Sonoma', 'Stanislaus', 'Sutter', 'Tehama', 'Trinity',
+        'Tulare', 'Tuolumne', 'Ventura', 'Yolo', 'Yuba'
+    ],
+    'Arizona': ['Maricopa', 'Pima'],
+    'Florida': ['Miami-Dade', 'Broward', 'Palm Beach', 'Hillsborough', 'Orange'],
+    'Illinois': ['Cook', 'DuPage'],
+    'Michigan': ['Wayne', 'Oakland'],
+    'Nevada': ['Clark', 'Washoe'],
+    'New York': ['Kings', 'Queens', 'New York', 'Bronx', 'Richmond', 'Suffolk', 'Nassau'],
+    'Texas': ['Harris', 'Dallas', 'Tarrant', 'Bexar', 'Travis'],
+    'Washington': ['King', 'Pierce', 'Snohomish'],
+}
+
+COUNTY_ALIASES = {'la county': 'Los Angeles', 'l a county': 'Los Angeles'}
+
+DEPARTMENTS = {
+    'police': ['police', 'police department', 'police officer', 'law enforcement', 'cop', 'cops'],
+    'sheriff': ['sheriff', 'sheriffs', 'sheriff s department', 'sheriff department', 'deputy sheriff'],
+    'fire': ['fire department', 'firefighter', 'firefighters', 'fire fighter', 'fire rescue', 'fire'],
+    'corrections': ['corrections', 'correctional officer', 'department of corrections'],
+    'probation': ['probation', 'probation department', 'probation officer'],
+    'public works': ['public works'],
+    'parks and recreation': ['parks and recreation', 'parks and rec', 'parks department'],
+    'public health': ['public health', 'health department'],
+    'emergency medical services': ['emergency medical services', 'ems', 'paramedic', 'paramedics'],
+    'transportation': ['transportation', 'transit', 'department of transportation'],
+    'education': ['education', 'school district', 'teacher', 'teachers'],
+    'library': ['library', 'public library'],
+    'sanitation': ['sanitation'],
+    'water and power': ['water and power', 'water department', 'utilities'],
+    'social services': ['social services', 'social worker', 'social workers'],
+}
+
+POLICY_TYPES = {
+    'vacation': ['vacation', 'vacation days', 'vacation time', 'vacation benefits', 'pto',
+                 'paid time off', 'annual leave', 'time off'],
+    'sick leave': ['sick leave', 'sick days', 'sick time'],
+    'retirement': ['retirement', 'retire', 'retiring', 'pension', 'retirement benefits', 'pension benefits'],
+    'benefits': ['benefits', 'health insurance', 'medical', 'dental', 'vision', 'insurance'],
+    'holidays': ['holiday', 'holidays'],
+    'overtime': ['overtime', 'comp time', 'compensatory time'],
+    'parental leave': ['parental leave', 'maternity', 'paternity', 'family leave'],
+    'bereavement': ['bereavement', 'bereavement leave'],
+}
+
+UNITS = {
+    'zero': 0, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7,
+    'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12, 'thirteen': 13,
+    'fourteen': 14, 'fifteen': 15, 'sixteen': 16, 'seventeen': 17, 'eighteen': 18, 'nineteen': 19
+}
+TENS = {'twenty': 20, 'thirty': 30, 'forty': 40, 'fifty': 50, 'sixty': 60}
+
+NUMBER_WORDS = re.compile(
+    r"\b(?:(%s)(?:\s+(%s))?|(%s))\b" % ('|'.join(TENS), '|'.join(k for k in UNITS if UNITS[k] < 10 and k != 'zero'), '|'.join(UNITS))
+)
+YEARS_STATED = re.compile(r"\b(\d{1,2})\s*(?:\+\s*)?(?:years?|yrs?)\b")
+YEARS_UPDATE = re.compile(
+    r"\b(?:change|changed|update|updated|make|set|correct)\s+(?:that|it|this|my years(?: of service)?|years(?: of service)?)?\s*to\s+(\d{1,2})\b"
+)
+YEARS_INSTEAD = re.compile(r"\b(?:had|have|with)\s+(\d{1,2})\s+instead\b")
+NOT_SERVICE = re.compile(r"\b(?:in|after|within)\s+$")
+AGE = re.compile(r"^\s*(?:old|of age)\b")
+NEGATION = re.compile(r"\b(?:not|no longer|never|isn t|wasn t|don t|didn t|used to|formerly|anymore)\b")
+GENERIC_COUNTY = re.compile(r"\b([A-Z][a-z]+(?:[ -][A-Z][a-z]+){0,2}) County\b")
+DEPARTMENT_CUES = re.compile(r"\b(?:department|dept|agency|division|work for|work at|works for|employed)\b")
+DIGITS = re.compile(r"\b\d+\b")
+YEAR_LIKE = re.compile(r"^(?:19|20)\d\d$")
+# Two-letter state codes that are also English words or common abbreviations
+AMBIGUOUS_ABBRS = {'AL', 'CO', 'DE', 'HI', 'ID', 'IN', 'LA', 'MA', 'ME', 'OH', 'OK', 'OR', 'PA'}
+# Where a job title or a place sits: "I'm a nurse", "as a librarian", "nurse in ...", "what about Dallas"
+ROLE_SLOT = re.compile(r"\b(?:i m|im|i am|as|work as|working as|job as)\s+(?:a|an)\s+(\w+)|^\s*(?:(?:a|an)\s+)?(\w+)\s+(?:in|at|from|with)\b"
+                       r"|\b(?:a|an)\s+(\w+)\s+(?:in|at|from|with)\b")
+PLACE_SLOT = re.compile(r"\b(?:live in|living in|located in|based in|work in|working in|city of|town of|what about|how about)\s+(\w+)")
+# Words that fill those slots without naming an entity
+FUNCTION_WORDS = {
+    'a', 'an', 'the', 'i', 'me', 'my', 'we', 'our', 'you', 'your', 'it', 'that', 'this', 'there', 'here',
+    'what', 'how', 'when', 'where', 'which', 'who', 'why', 'about', 'if', 'so', 'and', 'or', 'but',
+    'lot', 'bit', 'way', 'year', 'years', 'day', 'days', 'week', 'weeks', 'month', 'months', 'time',
+    'general', 'total', 'addition', 'case', 'person', 'employee', 'worker', 'member', 'staff', 'work',
+    'job', 'position', 'city', 'county', 'state', 'department', 'policy', 'policies', 'question', 'part',
+    'full', 'new', 'same', 'other', 'change', 'raise', 'increase', 'plan', 'option',
+}
+
+
+def normalize(text: str) -> str:
+    """Lowercase and blank out punctuation without changing string length"""
+    return ''.join(c.lower() if c.isalnum() and len(c.lower()) == 1 else (c if c.isalnum() else ' ')
+                   for c in text)
+
+
+def words_to_digits(text: str) -> str:
+    """Rewrite number words as digits, space-padded so offsets stay aligned"""
+    def replace(match):
+        if match.group(3):
+            value = UNITS[match.group(3)]
+        else:
+            value = TENS[match.group(1)] + (UNITS[match.group(2)] if match.group(2) else 0)
+        return str(value).ljust(len(match.group(0)))
+    return NUMBER_WORDS.sub(replace, text)
+
+
+class AhoCorasick:
+    """Multi-pattern matcher: one pass over the text finds every gazetteer phrase"""
+
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.out = [[]]
+        self.built = False
+
+    def add(self, pattern: str, payload):
+        node = 0
+        for ch in pattern:
+            nxt = self.goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+            node = nxt
+        self.out[node].append((len(pattern), payload))
+        self.built = False
+
+    def build(self):
+        queue = deque(self.goto[0].values())
+        for node in queue:
+            self.fail[node] = 0
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+        self.built = True
+
+    def find(self, text: str) -> Iterable[Tuple[int, int, object]]:
+        if not self.built:
+            self.build()
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            for length, payload in self.out[node]:
+                yield i - length + 1, i + 1, payload
+
+
+def _whole_word(text: str, start: int, end: int) -> bool:
+    return (start == 0 or not text[start - 1].isalnum()) and (end == len(text) or not text[end].isalnum())
+
+
+def load_counties(path: str, counties: Dict[str, List[str]] = None) -> Dict[str, List[str]]:
+    """Read a `County Name,State` CSV (e.g. the Census county list) into a gazetteer"""
+    counties = counties if counties is not None else {}
+    with open(path, newline='') as f:
+        for row in csv.reader(f):
+            if len(row) < 2 or not row[0].strip():
+                continue
+            name = re.sub(r"\s+(County|Parish|Borough)$", "", row[0].strip())
+            counties.setdefault(row[1].strip(), []).append(name)
+    return counties
+
+
+class RuleBasedEntityExtractor:
+    """Deterministic extractor for the common profile phrases.
+
+    Returns the entities it found plus a confidence in [0, 1]: the share of
+    the query's entity-bearing spans the rules explained. Gazetteer and
+    years matches count as explained. Spans that look like an entity the
+    rules cannot name count against it: capitalized words mid-sentence,
+    nouns in a job-title or place slot, numbers with no unit (years like
+    2005 included), two-letter codes that are also words ("OR"), and entity
+    cue words with no match. Conflicting values and negation halve the
+    result. A query with nothing entity-like is fully explained.
+    """
+
+    def __init__(self, counties: Dict[str, List[str]] = None):
+        self.matcher = AhoCorasick()
+        for state, abbr in STATES.items():
+            self.matcher.add(normalize(state), ('state', state))
+            self.matcher.add(f"state of {normalize(state)}", ('state', state))
+            self.matcher.add(abbr.lower(), ('state_abbr', state))
+        for state, names in (counties or COUNTIES).items():
+            for name in names:
+                self.matcher.add(f"{normalize(name)} county", ('county', (name, state)))
+                self.matcher.add(f"county of {normalize(name)}", ('county', (name, state)))
+        for alias, name in COUNTY_ALIASES.items():
+            self.matcher.add(alias, ('county', (name, 'California')))
+        for department, phrases in DEPARTMENTS.items():
+            for phrase in phrases:
+                self.matcher.add(phrase, ('department', department))
+                if 'department' not in phrase:
+                    self.matcher.add(f"{phrase} department", ('department', department))
+        for policy_type, phrases in POLICY_TYPES.items():
+            for phrase in phrases:
+                self.matcher.add(phrase, ('policy_type', policy_type))
+        self.matcher.build()
+
+    def _matches(self, query: str, text: str) -> List[Tuple[int, int, Tuple]]:
+        found = []
+        for start, end, (kind, value) in self.matcher.find(text):
+            if not _whole_word(text, start, end):
+                continue
+            if kind == 'state_abbr':
+                # Two-letter codes collide with words ("in", "or", "me"); require caps
+                if query[start:end] != query[start:end].upper():
+                    continue
+                kind = 'state'
+            found.append((start, end, (kind, value)))
+        # Leftmost-longest, non-overlapping
+        found.sort(key=lambda m: (m[0], -(m[1] - m[0])))
+        chosen, last_end = [], -1
+        for m in found:
+            if m[0] >= last_end:
+                chosen.append(m)
+                last_end = m[1]
+        return chosen
+
+    def extract(self, query: str, existing_entities: Dict = None) -> Dict:
+        existing_entities = existing_entities or {}
+        text = words_to_digits(normalize(query))
+        signals = []
+        values = {}
+        covered = [False] * len(text)
+
+        def claim(start, end):
+            for i in range(start, end):
+                covered[i] = True
+
+        explained, unexplained = 0.0, 0.0
+        for start, end, (kind, value) in self._matches(query, text):
+            claim(start, end)
+            if kind == 'state' and query[start:end] in AMBIGUOUS_ABBRS:
+                signals.append(f"ambiguous abbreviation {query[start:end]}")
+                unexplained += 1
+            else:
+                explained += 1
+            values.setdefault(kind, []).append(value)
+
+        entities = {}
+        for kind in ('department', 'state', 'policy_type'):
+            distinct = list(dict.fromkeys(values.get(kind, [])))
+            if kind == 'policy_type' and len(distinct) > 1 and 'benefits' in distinct:
+                distinct.remove('benefits')
+            if len(distinct) > 1:
+                signals.append(f"conflicting {kind}")
+            if distinct:
+                entities[kind] = distinct[0]
+
+        counties = list(dict.fromkeys(values.get('county', [])))
+        if counties:
+            names = list(dict.fromkeys(name for name, _ in counties))
+            if len(names) > 1:
+                signals.append("conflicting county")
+            entities['county'] = names[0]
+            if 'state' in entities and all(state != entities['state'] for _, state in counties):
+                signals.append("county outside stated state")
+        else:
+            generic = GENERIC_COUNTY.search(query)
+            if generic:
+                entities['county'] = generic.group(1)
+                claim(generic.start(), generic.end())
+                signals.append("county not in gazetteer")
+                # The name is plausible but unchecked: half explained
+                explained += 0.5
+                unexplained += 0.5
+
+        years = self._years(text, existing_entities, claim, signals)
+        if years is not None:
+            entities['years_of_service'] = years
+            explained += 1
+
+        if 'department' not in entities and DEPARTMENT_CUES.search(text):
+            signals.append("unresolved department cue")
+            unexplained += 1
+        if re.search(r"\bcounty\b", text) and 'county' not in entities:
+            signals.append("unresolved county cue")
+            unexplained += 1
+        for m in DIGITS.finditer(text):
+            if not any(covered[m.start():m.end()]):
+                kind = 'year without unit' if YEAR_LIKE.match(m.group()) else 'unexplained number'
+                signals.append(f"{kind} {m.group()}")
+                unexplained += 1
+        for start, word in self._unknown_slots(query, text, covered):
+            signals.append(f"unknown name {word}")
+            unexplained += 1
+
+        confidence = explained / (explained + unexplained) if explained + unexplained else 1.0
+        if any(signal.startswith('conflicting') for signal in signals):
+            confidence *= 0.5
+        if entities and NEGATION.search(text):
+            signals.append("negation")
+            confidence *= 0.5
+        return {'entities': entities, 'confidence': round(confidence, 2), 'signals': signals}
+
+    def _unknown_slots(self, query: str, text: str, covered: List[bool]) -> List[Tuple[int, str]]:
+        """Uncovered words that look like a name, a job title or a place"""
+        found = {}
+        for m in re.finditer(r"[A-Za-z]+", query):
+            word = m.group()
+            sentence_start = not query[:m.start()].strip() or query[:m.start()].rstrip()[-1] in '.?!'
+            if (word[0].isupper() and not sentence_start and not word.isupper()
+                    and text[m.start():m.end()] not in FUNCTION_WORDS):
+                found.setdefault(m.start(), word)
+        for pattern in (ROLE_SLOT, PLACE_SLOT):
+            for m in pattern.finditer(text):
+                group = next(g for g in range(1, (m.lastindex or 0) + 1) if m.group(g))
+                if text[m.start(group):m.end(group)] not in FUNCTION_WORDS and not text[m.start(group)].isdigit():
+                    found.setdefault(m.start(group), query[m.start(group):m.end(group)])
+        return sorted((start, word) for start, word in found.items()
+                      if not any(covered[start:start + len(word)]))
+
+    def _years(self, text: str, existing_entities: Dict, claim, signals: List[str]) -> Optional[int]:
+        found = []
+        for pattern in (YEARS_STATED, YEARS_UPDATE, YEARS_INSTEAD):
+            for m in pattern.finditer(text):
+                if pattern is YEARS_STATED:
+                    if NOT_SERVICE.search(text[:m.start()]) or AGE.search(text[m.end():]):
+                        signals.append("years not describing service")
+                        continue
+                elif 'years_of_service' not in existing_entities and 'year' not in text:
+                    signals.append("relative update without years context")
+                    continue
+                found.append(int(m.group(1)))
+                claim(m.start(), m.end())
+        distinct = list(dict.fromkeys(found))
+        if len(distinct) > 1:
+            signals.append("conflicting years_of_service")
+        return distinct[0] if distinct else None
@@ -0,0 +1,187 @@
+import re
+from typing import Dict, List, Optional, Set, Tuple
+
+from context_packer import split_sentences
+from lexical_index import STOPWORDS
+
+MONTHS = {
+    'january': 1, 'february': 2, 'march': 3, 'april': 4, 'may': 5, 'june': 6, 'july': 7,
+    'august': 8, 'september': 9, 'october': 10, 'november': 11, 'december': 12,
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'jun': 6, 'jul': 7, 'aug': 8, 'sep': 9, 'sept': 9,
+    'oct': 10, 'nov': 11, 'dec': 12
+}
+WORD_NUMBERS = {
+    'one': '1', 'two': '2', 'three': '3', 'four': '4', 'five': '5', 'six': '6', 'seven': '7',
+    'eight': '8', 'nine': '9', 'ten': '10', 'eleven': '11', 'twelve': '12', 'fifteen': '15',
+    'twenty': '20', 'thirty': '30', 'forty': '40', 'fifty': '50', 'sixty': '60', 'hundred': '100'
+}
+# Capitalized words that start sentences or address the reader rather than name anything
+GENERIC = frozenset(
+    'a an and as at based by for from however i if in it no note of on or please so the this '
+    'these those to under with yes you your according additionally also'.split()
+)
+
+_MONTH = '|'.join(sorted(MONTHS, key=len, reverse=True))
+DATE = re.compile(
+    r"\b(?P<month>%s)\.?\s+(?:(?P<day>\d{1,2})(?:st|nd|rd|th)?,?\s+)?(?P<year>\d{4})\b"
+    r"|\b(?P<iso>\d{4}-\d{2}-\d{2})\b"
+    r"|\b(?P<m>\d{1,2})/(?P<d>\d{1,2})/(?P<y>\d{4})\b" % _MONTH,
+    re.I
+)
+NUMBER = re.compile(r"\$?\d[\d,]*(?:\.\d+)?(?:\s*(?:%|percent\b))?", re.I)
+WORD_NUMBER = re.compile(r"\b(%s)\b" % '|'.join(WORD_NUMBERS), re.I)
+PHRASE = re.compile(r"\b[A-Z][\w'-]*(?:\s+(?:of\s+|de\s+)?[A-Z][\w'-]*)*")
+CITATION = re.compile(r"\(?\b(?:Document|Source)\s+\d+\)?")
+
+
+def normalize_text(text: str) -> str:
+    text = WORD_NUMBER.sub(lambda m: WORD_NUMBERS[m.group(1).lower()], text.lower())
+    text = re.sub(r"'s\b", "", text)
+    return " ".join(re.sub(r"[^\w%.$-]+", " ", text).split())
+
+
+def normalize_number(raw: str) -> str:
+    value = raw.replace('$', '').replace(',', '').lower()
+    percent = '%' in value or 'percent' in value
+    value = re.sub(r"\s*(%|percent)", "", value)
+    if '.' in value:
+        value = value.rstrip('0').rstrip('.')
+    return value + ('%' if percent else '')
+
+
+def normalize_date(match: re.Match) -> str:
+    if match.group('iso'):
+        return match.group('iso')
+    if match.group('y'):
+        return f"{match.group('y')}-{int(match.group('m')):02d}-{int(match.group('d')):02d}"
+    month = MONTHS[match.group('month').lower()]
+    if match.group('day'):
+        return f"{match.group('year')}-{month:02d}-{int(match.group('day')):02d}"
+    return f"{match.group('year')}-{month:02d}"
+
+
+def facts(text: str) -> Tuple[Set[str], Set[str], Set[str]]:
+    """Dates, numbers and proper-noun phrases stated in `text`, normalized"""
+    text = CITATION.sub(' ', text)
+    dates = {normalize_date(m) for m in DATE.finditer(text)}
+    rest = DATE.sub(' ', text)
+    numbers = {normalize_number(m.group(0)) for m in NUMBER.finditer(WORD_NUMBER.sub(
+        lambda m: WORD_NUMBERS[m.group(1).lower()], rest))}
+    phrases = set()
+    for sentence in split_sentences(rest):
+        for m in PHRASE.finditer(sentence):
+            words = [w for w in m.group(0).split() if w.lower() not in GENERIC]
+            if words and not (len(words) == 1 and m.start() == 0):
+                phrases.add(normalize_text(" ".join(words)))
+    return dates, numbers, phrases
+
+
+def words(text: str) -> Set[str]:
+    """Content words, lightly stemmed, for sentence overlap"""
+    found = set()
+    for w in re.findall(r"[a-z]+", normalize_text(text)):
+        if len(w) < 3 or w in GENERIC or w in STOPWORDS:
+            continue
+        if w.endswith('ies'):
+            w = w[:-3] + 'y'
+        elif w.endswith('s') and not w.endswith('ss'):
+            w = w[:-1]
+        found.add(w)
+    return found
+
+
+def source_sentences(documents: List[Dict]) -> List[Tuple[Set[str], Set[str], Set[str]]]:
+    """(words, dates, numbers) for every sentence or line of the documents"""
+    sentences = []
+    for doc in documents:
+        for line in doc.get('content', '').splitlines():
+            for sentence in split_sentences(line):
+                dates, numbers, _ = facts(sentence)
+                sentences.append((words(sentence), dates, numbers))
+    return sentences
+
+
+class GroundingChecker:
+    """Checks an answer's concrete facts against the retrieved documents.
+
+    Each answer sentence that states a number, date, percentage or proper
+    noun phrase is a claim. A claim is supported when its proper nouns
+    appear in the documents (or the question), and one document sentence
+    holds all its numbers and dates and shares at least `min_overlap` of
+    its content words. A document sentence that is as close a match but
+    states different figures (an older policy version, another
+    department's table row) makes the claim unsupported, since only the
+    model can tell which applies. Sentences with no such facts are not
+    claims. The result has the validator's JSON shape; `conclusive` is set
+    only when there is at least one claim, every claim is supported and
+    the best document scored at least `min_score`.
+    """
+
+    def __init__(self, min_score: float = 0.5, min_overlap: float = 0.5):
+        self.min_score = min_score
+        self.min_overlap = min_overlap
+
+    def missing(self, sentence: str, query_facts, source_text: str, sentences) -> List[str]:
+        """Facts of one claim the documents do not back; empty when supported"""
+        dates, numbers, phrases = facts(sentence)
+        query_dates, query_numbers = query_facts
+        missing = [p for p in phrases if f" {p} " not in source_text]
+        # Figures the user stated (e.g. their years of service) need no source
+        dates = {d for d in dates if d not in query_dates}
+        numbers = {n for n in numbers if n not in query_numbers}
+        if not dates and not numbers:
+            return missing
+        claim_words = words(sentence)
+
+        def overlap(sentence_words):
+            return len(claim_words & sentence_words) / len(claim_words) if claim_words else 1.0
+
+        def holds(s_dates, s_numbers):
+            return numbers <= s_numbers and all(any(x.startswith(d) for x in s_dates) for d in dates)
+
+        best = max((overlap(w) for w, d, n in sentences if holds(d, n)), default=0.0)
+        if best < self.min_overlap:
+            return missing + sorted(numbers | dates)
+        if any(overlap(w) >= best and not holds(d, n) and (d or n) for w, d, n in sentences):
+            return missing + [f"conflicting figures in documents for {', '.join(sorted(numbers | dates))}"]
+        return missing
+
+    def check(self, query: str, response: str, documents: List[Dict]) -> Dict:
+        query_dates, query_numbers, _ = facts(query)
+        source = "\n".join(d.get('content', '') for d in documents) + "\n" + query
+        source_text = f" {normalize_text(source)} "
+        sentences = source_sentences(documents)
+        supported, unsupported, issues = [], [], []
+        checked = found = 0
+        for sentence in split_sentences(response):
+            dates, numbers, phrases = facts(sentence)
+            total = len(dates) + len(numbers) + len(phrases)
+            if not total:
+                continue
+            missing = self.missing(sentence, (query_dates, query_numbers), source_text, sentences)
+            checked += total
+            found += max(0, total - len(missing))
+            if missing:
+                unsupported.append(sentence)
+                issues.append(f"Not supported by source documents: {', '.join(missing)}")
+            else:
+                supported.append(sentence)
+        top_score = max((d.get('score', 0) for d in documents), default=0.0)
+        ratio = found / checked if checked else 0.0
+        return {
+            'is_valid': not unsupported,
+            'confidence': round(0.9 * ratio + 0.1 * min(top_score, 1.0), 2),
+            'issues': issues,
+            'supported_claims': supported,
+            'unsupported_claims': unsupported,
+            'conclusive': bool(supported) and not unsupported and top_score >= self.min_score
+        }
+
+    def verdict(self, query: str, response: str, documents: List[Dict]) -> Optional[Dict]:
+        """The local result when it can stand in for the model, otherwise None"""
+        if not documents or response.startswith("Error generating response"):
+            return None
+        result = self.check(query, response, documents)
+        if not result.pop('conclusive'):
+            return None
+        return result
@@ -0,0 +1,534 @@
+import codecs
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+MANIFEST_VERSION = 1
+BLOCK_SIZE = 1 << 16
+# Ingestion job states after which the job's manifest is settled
+JOB_COMPLETE = 'COMPLETE'
+JOB_ENDED = ('COMPLETE', 'FAILED', 'STOPPED')
+TEXT_EXTENSIONS = ('.txt', '.md', '.csv', '.json', '.html', '.htm')
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class LocalObjectStore:
+    """Directory stand-in for the documents bucket; ETags are content MD5s like single-part S3 uploads"""
+
+    def __init__(self, root: str, prefix: str = ''):
+        self.root = root
+        self.prefix = prefix
+
+    def list_objects(self) -> Iterator[Dict]:
+        for directory, _, files in os.walk(self.root):
+            for name in sorted(files):
+                path = os.path.join(directory, name)
+                key = os.path.relpath(path, self.root).replace(os.sep, '/')
+                if not key.startswith(self.prefix):
+                    continue
+                digest = hashlib.md5()
+                for block in self.stream(key):
+                    digest.update(block)
+                yield {'key': key, 'etag': digest.hexdigest(), 'size': os.path.getsize(path)}
+
+    def get(self, key: str) -> bytes:
+        with open(os.path.join(self.root, key), 'rb') as f:
+            return f.read()
+
+    def stream(self, key: str, block_size: int = BLOCK_SIZE) -> Iterator[bytes]:
+        with open(os.path.join(self.root, key), 'rb') as f:
+            while True:
+                block = f.read(block_size)
+                if not block:
+                    return
+                yield block
+
+    def uri(self, key: str) -> str:
+        return f"file://{os.path.abspath(os.path.join(self.root, key))}"
+
+
+class S3ObjectStore:
+    def __init__(self, client, bucket: str, prefix: str = ''):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def list_objects(self) -> Iterator[Dict]:
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get('Contents', []):
+                if not obj['Key'].endswith('/'):
+                    yield {'key': obj['Key'], 'etag': obj['ETag'].strip('"'), 'size': obj['Size']}
+
+    def get(self, key: str) -> bytes:
+        return self.client.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+
+    def stream(self, key: str, block_size: int = BLOCK_SIZE) -> Iterator[bytes]:
+        yield from self.client.get_object(Bucket=self.bucket, Key=key)['Body'].iter_chunks(block_size)
+
+    def uri(self, key: str) -> str:
+        return f"s3://{self.bucket}/{key}"
+
+
+def supported(key: str) -> bool:
+    return key.lower().endswith(TEXT_EXTENSIONS + ('.pdf',))
+
+
+def decode_blocks(blocks: Iterable[bytes]) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    for block in blocks:
+        text = decoder.decode(block)
+        if text:
+            yield text
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def pdf_pages(reader_class, store, key: str, block_size: int = BLOCK_SIZE) -> Iterator[str]:
+    """Text of a PDF one page at a time.
+
+    The object is streamed to a temporary file, since the reader needs
+    random access, and pages are parsed only as they are consumed.
+    """
+    with tempfile.TemporaryFile() as f:
+        for block in store.stream(key, block_size):
+            f.write(block)
+        f.seek(0)
+        for page in reader_class(f).pages:
+            yield page.extract_text() or ''
+
+
+def text_stream(store, key: str, block_size: int = BLOCK_SIZE) -> Optional[Iterator[str]]:
+    """Text of a document as it is read, or None for formats that cannot be read here.
+
+    Text formats are decoded block by block; PDFs are spooled to disk and
+    yield one page at a time.
+    """
+    lower = key.lower()
+    if lower.endswith('.pdf'):
+        try:
+            # pypdf is only needed when the corpus has PDFs
+            from pypdf import PdfReader
+        except ImportError:
+            print(f"Skipping {key}: install pypdf to ingest PDFs")
+            return None
+        return pdf_pages(PdfReader, store, key, block_size)
+    if lower.endswith(TEXT_EXTENSIONS):
+        return decode_blocks(store.stream(key, block_size))
+    return None
+
+
+def iter_words(pieces: Iterable[str]) -> Iterator[str]:
+    """Words of streamed text; a word split across two pieces is rejoined"""
+    partial = ''
+    for piece in pieces:
+        text = partial + piece
+        words = text.split()
+        partial = words.pop() if words and not text[-1].isspace() else ''
+        yield from words
+    if partial:
+        yield partial
+
+
+def iter_chunks(pieces: Iterable[str], size: int = 300, overlap: int = 50) -> Iterator[str]:
+    """Windows of `size` words, each sharing `overlap` words with the previous one.
+
+    At most `size` words are held at a time, whatever the document length.
+    """
+    if not 0 <= overlap < size:
+        raise ValueError("overlap must be at least 0 and smaller than size")
+    window = deque()
+    emitted = False
+    for word in iter_words(pieces):
+        window.append(word)
+        if len(window) == size:
+            yield " ".join(window)
+            emitted = True
+            for _ in range(size - overlap):
+                window.popleft()
+    if window and (not emitted or len(window) > overlap):
+        yield " ".join(window)
+
+
+def chunk_text(text: str, size: int = 300, overlap: int = 50) -> List[str]:
+    return list(iter_chunks([text], size, overlap))
+
+
+class Manifest:
+    """Object key -> ETag and chunk hashes from the last ingestion run"""
+
+    def __init__(self, documents: Optional[Dict] = None, settings: Optional[Dict] = None):
+        self.documents = documents or {}
+        self.settings = settings or {}
+
+    @classmethod
+    def from_json(cls, text: Optional[str]) -> 'Manifest':
+        if not text:
+            return cls()
+        data = json.loads(text)
+        return cls(data.get('documents', {}), data.get('settings', {}))
+
+    @classmethod
+    def load(cls, path: str) -> 'Manifest':
+        if not os.path.exists(path):
+            return cls()
+        with open(path) as f:
+            return cls.from_json(f.read())
+
+    def to_json(self) -> str:
+        return json.dumps({'version': MANIFEST_VERSION, 'settings': self.settings, 'documents': self.documents},
+                          indent=1, sort_keys=True)
+
+    def save(self, path: str):
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(self.to_json())
+        os.replace(tmp, path)
+
+    def diff(self, objects: List[Dict]) -> Dict[str, List]:
+        """Listed objects split into new / changed / unchanged, plus keys no longer listed"""
+        listed = {o['key'] for o in objects}
+        result = {'new': [], 'changed': [], 'unchanged': [], 'removed': sorted(set(self.documents) - listed)}
+        for obj in objects:
+            previous = self.documents.get(obj['key'])
+            if previous is None:
+                result['new'].append(obj)
+            elif previous['etag'] != obj['etag']:
+                result['changed'].append(obj)
+            else:
+                result['unchanged'].append(obj)
+        return result
+
+
+def summarize(diff: Dict[str, List]) -> Dict[str, int]:
+    return {name: len(entries) for name, entries in diff.items()}
+
+
+def has_changes(diff: Dict[str, List]) -> bool:
+    return bool(diff['new'] or diff['changed'] or diff['removed'])
+
+
+def etag_manifest(objects: List[Dict]) -> Manifest:
+    """Manifest for a Knowledge Base data source, which chunks and embeds on its own"""
+    return Manifest({o['key']: {'etag': o['etag'], 'chunks': []} for o in objects})
+
+
+def pending_manifest_name(name: str, job_id: str) -> str:
+    """Path or key where a run's manifest waits until its ingestion job completes.
+
+    Only a completed job's manifest replaces `name`; until then the last
+    completed run stays the baseline, so documents of a failed job are
+    picked up again by the next incremental run.
+    """
+    return f"{name}.pending.{job_id}"
+
+
+def s3_manifest(client, bucket: str, key: str) -> Manifest:
+    try:
+        return Manifest.from_json(client.get_object(Bucket=bucket, Key=key)['Body'].read().decode())
+    except client.exceptions.NoSuchKey:
+        return Manifest()
+
+
+class StageCounter:
+    def __init__(self):
+        self.items = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, items: int = 1, nbytes: int = 0, seconds: float = 0.0):
+        with self._lock:
+            self.items += items
+            self.bytes += nbytes
+            self.seconds += seconds
+
+    def snapshot(self, elapsed: float) -> Dict:
+        with self._lock:
+            return {'items': self.items, 'bytes': self.bytes, 'busy_ms': round(self.seconds * 1000, 1),
+                    'items_per_second': round(self.items / elapsed, 1) if elapsed else 0.0}
+
+
+class IngestionPipeline:
+    """Documents -> text -> chunks -> embedding batches -> sink, as chained generators.
+
+    Text is read in blocks and chunked as a sliding word window, so memory
+    does not grow with document size. Chunks are grouped into batches for
+    an embedding pool of `workers` threads; once `max_in_flight` batches
+    are queued the generators stop pulling text until the oldest batch is
+    done (backpressure), and results reach the sink in document order.
+    `known(hash)` may return a stored vector so a chunk skips embedding.
+    Each stage counts items, bytes and busy time.
+    """
+
+    STAGES = ('read', 'chunk', 'embed', 'skip', 'wait', 'write')
+
+    def __init__(self, store, embed_batch: Callable[[List[str]], List[List[float]]],
+                 chunk_size: int = 300, overlap: int = 50, batch_size: int = 16, workers: int = 4,
+                 max_in_flight: Optional[int] = None, block_size: int = BLOCK_SIZE,
+                 known: Optional[Callable[[str], Optional[object]]] = None):
+        self.store = store
+        self.embed_batch = embed_batch
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_in_flight = max_in_flight or workers * 2
+        self.block_size = block_size
+        self.known = known or (lambda digest: None)
+        self.counters = {name: StageCounter() for name in self.STAGES}
+        self.failed = []
+
+    def read(self, key: str) -> Optional[Iterator[str]]:
+        pieces = text_stream(self.store, key, self.block_size)
+        if pieces is None:
+            return None
+
+        def counted():
+            for piece in pieces:
+                self.counters['read'].add(nbytes=len(piece))
+                yield piece
+        return counted()
+
+    def records(self, objects: Iterable[Dict]) -> Iterator[Dict]:
+        for obj in objects:
+            try:
+                pieces = self.read(obj['key'])
+                if pieces is None:
+                    self.failed.append(obj['key'])
+                    continue
+                for n, chunk in enumerate(iter_chunks(pieces, self.chunk_size, self.overlap)):
+                    self.counters['chunk'].add(nbytes=len(chunk))
+                    yield {'hash': content_hash(chunk), 'content': chunk, 'source': self.store.uri(obj['key']),
+                           'metadata': {'key': obj['key'], 'chunk': n}}
+            except Exception as e:
+                print(f"Document read error for {obj['key']}: {e}")
+                self.failed.append(obj['key'])
+
+    def batches(self, records: Iterable[Dict]) -> Iterator[List[Dict]]:
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _embed(self, texts: List[str]):
+        started = time.perf_counter()
+        vectors = self.embed_batch(texts)
+        if len(vectors) != len(texts):
+            raise ValueError(f"embedding returned {len(vectors)} vectors for {len(texts)} texts")
+        self.counters['embed'].add(len(texts), sum(len(t) for t in texts), time.perf_counter() - started)
+        return vectors
+
+    def embedded(self, records: Iterable[Dict]) -> Iterator[Tuple[Dict, object]]:
+        pending = deque()
+
+        def resolve(entry):
+            batch, vectors, future = entry
+            if future is not None:
+                started = time.perf_counter()
+                computed = iter(future.result())
+                self.counters['wait'].add(0, seconds=time.perf_counter() - started)
+                vectors = [v if v is not None else next(computed) for v in vectors]
+            return zip(batch, vectors)
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='embed') as pool:
+            for batch in self.batches(records):
+                vectors = [self.known(r['hash']) for r in batch]
+                missing = [r['content'] for r, v in zip(batch, vectors) if v is None]
+                self.counters['skip'].add(len(batch) - len(missing))
+                pending.append((batch, vectors, pool.submit(self._embed, missing) if missing else None))
+                while pending and (len(pending) >= self.max_in_flight or pending[0][2] is None or pending[0][2].done()):
+                    yield from resolve(pending.popleft())
+            while pending:
+                yield from resolve(pending.popleft())
+
+    def run(self, objects: Iterable[Dict], sink: Callable[[Dict, object], None]) -> Dict:
+        started = time.perf_counter()
+        for record, vector in self.embedded(self.records(objects)):
+            write_started = time.perf_counter()
+            sink(record, vector)
+            self.counters['write'].add(seconds=time.perf_counter() - write_started)
+        return self.stats(time.perf_counter() - started)
+
+    def stats(self, elapsed: float) -> Dict:
+        return {name: counter.snapshot(elapsed) for name, counter in self.counters.items()}
+
+
+class ChunkWriter:
+    """Appends chunk records (JSONL) and float32 vectors to temporary files in `directory`.
+
+    finish() converts the raw vectors to .npy in blocks and swaps both
+    files into place, so a write of any size holds one block in memory.
+    """
+
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.records = open(os.path.join(directory, 'chunks.jsonl.tmp'), 'w')
+        self.vectors = open(os.path.join(directory, 'vectors.f32.raw'), 'wb')
+        self.count = 0
+        self.dim = None
+        self.hashes = set()
+
+    def add(self, record: Dict, vector):
+        import numpy as np
+        vector = np.asarray(vector, dtype=np.float32).ravel()
+        if self.dim is None:
+            self.dim = len(vector)
+        elif len(vector) != self.dim:
+            raise ValueError(f"vector for {record['source']} has {len(vector)} dimensions, expected {self.dim}")
+        self.records.write(json.dumps(record) + "\n")
+        self.vectors.write(vector.tobytes())
+        self.hashes.add(record['hash'])
+        self.count += 1
+
+    def finish(self):
+        import numpy as np
+        self.records.close()
+        self.vectors.close()
+        raw = os.path.join(self.directory, 'vectors.f32.raw')
+        target = os.path.join(self.directory, 'vectors.f32.tmp.npy')
+        out = np.lib.format.open_memmap(target, mode='w+', dtype=np.float32, shape=(self.count, self.dim or 0))
+        if self.count:
+            source = np.memmap(raw, dtype=np.float32, mode='r', shape=(self.count, self.dim))
+            for start in range(0, self.count, 65536):
+                out[start:start + 65536] = source[start:start + 65536]
+            del source
+        out.flush()
+        del out
+        os.remove(raw)
+        os.replace(os.path.join(self.directory, 'chunks.jsonl.tmp'), os.path.join(self.directory, 'chunks.jsonl'))
+        os.replace(target, os.path.join(self.directory, 'vectors.f32.npy'))
+
+    def abort(self):
+        self.records.close()
+        self.vectors.close()
+        os.remove(os.path.join(self.directory, 'chunks.jsonl.tmp'))
+        os.remove(os.path.join(self.directory, 'vectors.f32.raw'))
+
+
+class IncrementalIngestor:
+    """Re-chunks and re-embeds only new or changed documents of an object store.
+
+    State lives in `state_dir`: the manifest plus every current chunk
+    (chunks.jsonl) and its embedding (vectors.f32.npy), in the same order.
+    Chunks of unchanged documents, and chunks of changed documents whose
+    text hash is already in the state, keep their stored vectors; chunks
+    of removed documents are dropped. Changing the chunk size or overlap
+    re-chunks everything. New text goes through IngestionPipeline and the
+    state then rebuilds the local vector index.
+    """
+
+    def __init__(self, store, embed: Callable[[str], List[float]], state_dir: str,
+                 chunk_size: int = 300, overlap: int = 50, batch_size: int = 16, workers: int = 4,
+                 max_in_flight: Optional[int] = None,
+                 embed_batch: Optional[Callable[[List[str]], List[List[float]]]] = None):
+        self.store = store
+        self.embed_batch = embed_batch or (lambda texts: [embed(t) for t in texts])
+        self.state_dir = state_dir
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.batch_size = batch_size
+        self.workers = workers
+        self.max_in_flight = max_in_flight
+
+    @property
+    def manifest_path(self) -> str:
+        return os.path.join(self.state_dir, 'manifest.json')
+
+    def load_state(self):
+        import numpy as np
+        chunks_path = os.path.join(self.state_dir, 'chunks.jsonl')
+        if not os.path.exists(chunks_path):
+            return [], None
+        with open(chunks_path) as f:
+            records = [json.loads(line) for line in f]
+        return records, np.load(os.path.join(self.state_dir, 'vectors.f32.npy'), mmap_mode='r')
+
+    def build_index(self, index_path: str, quantize: bool, nlist: int):
+        import numpy as np
+        from vector_index import build_index
+        with open(os.path.join(self.state_dir, 'chunks.jsonl')) as f:
+            records = [{k: v for k, v in json.loads(line).items() if k != 'hash'} for line in f]
+        vectors = np.load(os.path.join(self.state_dir, 'vectors.f32.npy'), mmap_mode='r')
+        build_index(index_path, vectors, records, quantize=quantize, nlist=nlist)
+
+    def run(self, index_path: Optional[str] = None, quantize: bool = False, nlist: int = 0) -> Dict:
+        started = time.perf_counter()
+        settings = {'chunk_size': self.chunk_size, 'overlap': self.overlap}
+        manifest = Manifest.load(self.manifest_path)
+        records, vectors = self.load_state()
+        if manifest.settings and manifest.settings != settings:
+            manifest = Manifest()
+        diff = manifest.diff([o for o in self.store.list_objects() if supported(o['key'])])
+
+        row_of = {r['hash']: i for i, r in enumerate(records)}
+        by_document = {}
+        for i, record in enumerate(records):
+            by_document.setdefault(record['metadata']['key'], []).append(i)
+
+        writer = ChunkWriter(self.state_dir)
+        documents = {}
+        reused = 0
+        for obj in diff['unchanged']:
+            for i in by_document.get(obj['key'], []):
+                writer.add(records[i], vectors[i])
+                reused += 1
+            documents[obj['key']] = manifest.documents[obj['key']]
+
+        pipeline = IngestionPipeline(
+            self.store, self.embed_batch, chunk_size=self.chunk_size, overlap=self.overlap,
+            batch_size=self.batch_size, workers=self.workers, max_in_flight=self.max_in_flight,
+            known=lambda digest: vectors[row_of[digest]] if digest in row_of else None
+        )
+        hashes = {}
+
+        def sink(record: Dict, vector):
+            writer.add(record, vector)
+            hashes.setdefault(record['metadata']['key'], []).append(record['hash'])
+
+        processed = diff['new'] + diff['changed']
+        stages = pipeline.run(processed, sink)
+        failed = set(pipeline.failed)
+        for obj in processed:
+            if obj['key'] not in failed:
+                documents[obj['key']] = {'etag': obj['etag'], 'chunks': hashes.get(obj['key'], [])}
+
+        deleted = sum(1 for r in records if r['hash'] not in writer.hashes)
+        # Unreadable documents stay out of the manifest and are retried next run
+        changed = documents != manifest.documents
+        total = writer.count
+        if changed or not os.path.exists(self.manifest_path):
+            writer.finish()
+            Manifest(documents, settings).save(self.manifest_path)
+            if index_path and total:
+                self.build_index(index_path, quantize, nlist)
+        else:
+            writer.abort()
+
+        elapsed = time.perf_counter() - started
+        return {
+            'documents': {'new': len(diff['new']), 'changed': len(diff['changed']),
+                          'unchanged': len(diff['unchanged']), 'removed': len(diff['removed']),
+                          'failed': len(failed)},
+            'chunks': {'total': total, 'embedded': stages['embed']['items'],
+                       'skipped': reused + stages['skip']['items'], 'deleted': deleted},
+            'stages': stages,
+            'index_rebuilt': bool(changed and index_path and total),
+            'seconds': round(elapsed, 3),
+            'documents_per_second': round(len(processed) / elapsed, 2) if elapsed and processed else 0.0
+        }
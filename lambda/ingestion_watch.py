@@ -0,0 +1,66 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Union
+
+
+def latest_ingestion_job(client, kb_id: str, ds_id: str) -> Optional[Dict]:
+    """Most recently started ingestion job for a data source, or None"""
+    response = client.list_ingestion_jobs(
+        knowledgeBaseId=kb_id,
+        dataSourceId=ds_id,
+        sortBy={'attribute': 'STARTED_AT', 'order': 'DESCENDING'},
+        maxResults=1
+    )
+    jobs = response['ingestionJobSummaries']
+    return jobs[0] if jobs else None
+
+
+def generation_of(jobs: Union[Optional[Dict], List[Optional[Dict]]]) -> str:
+    """Job id and status of the latest job of each data source; 'none' for a source without jobs"""
+    if not isinstance(jobs, list):
+        jobs = [jobs]
+    return "|".join(f"{job['ingestionJobId']}:{job['status']}" if job else 'none' for job in jobs) or 'none'
+
+
+class IngestionGeneration:
+    """Cache generation derived from the latest ingestion jobs.
+
+    `fetch` returns the latest job of one data source, or a list with one
+    entry per data source (a sharded corpus syncs several). The generation
+    string combines each job id and status, so it changes when any of them
+    starts a new job and again when that job completes. Caches include
+    it in their keys (or flush on change) so no cached result outlives the
+    documents it was built from. The job list is polled at most once every
+    `refresh_seconds`; on errors the last known generation is kept.
+    """
+
+    def __init__(self, fetch: Callable[[], Union[Optional[Dict], List[Optional[Dict]]]], refresh_seconds: float = 60):
+        self.fetch = fetch
+        self.refresh_seconds = refresh_seconds
+        self._value = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def on_change(self, callback: Callable[[str, str], None]):
+        """Register callback(old, new) fired when the generation changes"""
+        self._listeners.append(callback)
+
+    def current(self) -> str:
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.refresh_seconds:
+                return self._value
+            self._checked_at = now
+            old = self._value
+            try:
+                self._value = generation_of(self.fetch())
+            except Exception as e:
+                print(f"Ingestion generation check error: {e}")
+                if self._value is None:
+                    self._value = 'unknown'
+            new = self._value
+        if old is not None and old != new:
+            for callback in self._listeners:
+                callback(old, new)
+        return new
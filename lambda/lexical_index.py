@@ -0,0 +1,107 @@
+import heapq
+import json
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from metadata_filter import matches_filter
+
+TOKEN = re.compile(r"[a-z0-9]+(?:[-.][a-z0-9]+)*")
+STOPWORDS = frozenset(
+    'a an and are as at be by can do does for from how i if in is it my of on or '
+    'the this to was what when where which who will with'.split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens; hyphenated codes like "px-123" stay one token"""
+    return [t for t in TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def load_records(path: str) -> List[Dict]:
+    """records.jsonl as written by vector_index.build_index"""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class BM25Index:
+    """In-memory inverted index with Okapi BM25 scoring.
+
+    Exact terms (county names, plan codes, "tier 2") are matched literally,
+    which is what embedding search tends to blur.
+    """
+
+    def __init__(self, records: List[Dict], k1: float = 1.5, b: float = 0.75):
+        self.records = records
+        self.postings = defaultdict(list)  # term -> [(row, BM25 term weight)]
+        counts = [Counter(tokenize(record['content'])) for record in records]
+        lengths = [sum(terms.values()) for terms in counts]
+        # Records with no tokens at all would otherwise divide by zero below
+        avg_length = (sum(lengths) / len(lengths) if lengths else 0.0) or 1.0
+        # Length normalization is fixed per chunk, so weights are computed once here
+        for row, terms in enumerate(counts):
+            norm = k1 * (1 - b + b * lengths[row] / avg_length)
+            for term, tf in terms.items():
+                self.postings[term].append((row, tf * (k1 + 1) / (tf + norm)))
+        count = len(records)
+        self.idf = {term: math.log(1 + (count - len(p) + 0.5) / (len(p) + 0.5))
+                    for term, p in self.postings.items()}
+
+    def __len__(self):
+        return len(self.records)
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[int, float]]:
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for row, weight in self.postings[term]:
+                scores[row] += idf * weight
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def retrieve(self, query: str, k: int = 5, filters: Optional[Dict] = None) -> List[Dict]:
+        """{content, source, lexical_score} records.
+
+        BM25 scores are unbounded and relative to the corpus, so they are not
+        reported as a 0-1 `score`; fusion supplies that from vector search.
+        """
+        hits = self.search(query, k * 4 if filters else k)
+        hits = [(row, score) for row, score in hits if matches_filter(self.records[row], filters)][:k]
+        return [{
+            'content': self.records[row]['content'],
+            'source': self.records[row].get('source', 'Unknown'),
+            'lexical_score': round(score, 4)
+        } for row, score in hits]
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict]], k: int = 60, limit: Optional[int] = None) -> List[Dict]:
+    """Merge ranked retrieval lists by summing 1 / (k + rank).
+
+    Records are matched on (source, content). `score` stays the calibrated
+    0-1 similarity of the lists that carry one (vector search): the best a
+    record had in any of them, or for a record found only by lexical search
+    the lowest such score among the results, since a term match says a chunk
+    belongs, not how close it is. `rank_score` is the fused score relative to
+    the best record and orders the results.
+    """
+    fused = {}
+    for documents in result_lists:
+        for rank, document in enumerate(documents, start=1):
+            key = (document['source'], document['content'])
+            entry = fused.get(key)
+            if entry is None:
+                fused[key] = entry = [0.0, {k: v for k, v in document.items() if k != 'score'}]
+            entry[0] += 1.0 / (k + rank)
+            if 'score' in document:
+                entry[1]['score'] = max(entry[1].get('score', 0.0), document['score'])
+    ranked = sorted(fused.values(), key=lambda e: -e[0])
+    ranked = ranked[:limit] if limit else ranked
+    scored = [document['score'] for _, document in ranked if 'score' in document]
+    floor = min(scored) if scored else 0.0
+    top = ranked[0][0] if ranked else 1.0
+    for value, document in ranked:
+        document.setdefault('score', floor)
+        document['rank_score'] = round(value / top, 4)
+    return [document for _, document in ranked]
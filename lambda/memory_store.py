@@ -0,0 +1,318 @@
+import copy
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from cache import LRUCache
+
+
+class VersionConflict(Exception):
+    """The stored session changed since it was read"""
+
+
+def _plain(value):
+    """DynamoDB Decimals back to int/float so contexts stay JSON-serializable"""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    return value
+
+
+class InMemoryMemoryBackend:
+    """Process-local backend for tests and offline measurement"""
+
+    def __init__(self):
+        self.items = {}
+        self.lock = threading.Lock()
+        self.reads = 0
+        self.version_reads = 0
+        self.writes = 0
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        with self.lock:
+            self.reads += 1
+            item = self.items.get(session_id)
+            return copy.deepcopy(item) if item is not None else None
+
+    def version(self, session_id: str) -> int:
+        with self.lock:
+            self.version_reads += 1
+            return (self.items.get(session_id) or {}).get('version', 0)
+
+    def write(self, session_id: str, expected_version: int, change: Dict):
+        with self.lock:
+            self.writes += 1
+            item = self.items.get(session_id)
+            if (item or {}).get('version', 0) != expected_version:
+                raise VersionConflict(session_id)
+            item = copy.deepcopy(item) if item else {'session_id': session_id, 'entities': {}, 'history': []}
+            _apply(item, change)
+            self.items[session_id] = item
+
+
+class SQLiteMemoryBackend:
+    """Single-file backend; the version check is an UPDATE ... WHERE version = ?"""
+
+    def __init__(self, path: str = ':memory:'):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS sessions "
+                          "(session_id TEXT PRIMARY KEY, item TEXT NOT NULL, version INTEGER NOT NULL)")
+        self.conn.commit()
+        self.lock = threading.Lock()
+        self.reads = 0
+        self.version_reads = 0
+        self.writes = 0
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        with self.lock:
+            self.reads += 1
+            row = self.conn.execute("SELECT item FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def version(self, session_id: str) -> int:
+        with self.lock:
+            self.version_reads += 1
+            row = self.conn.execute("SELECT version FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row[0] if row else 0
+
+    def write(self, session_id: str, expected_version: int, change: Dict):
+        # SQLite has no partial document update; the read-modify-write runs
+        # inside one transaction guarded by the version column instead
+        with self.lock:
+            self.writes += 1
+            row = self.conn.execute("SELECT item, version FROM sessions WHERE session_id = ?",
+                                    (session_id,)).fetchone()
+            if (row[1] if row else 0) != expected_version:
+                raise VersionConflict(session_id)
+            item = json.loads(row[0]) if row else {'session_id': session_id, 'entities': {}, 'history': []}
+            _apply(item, change)
+            with self.conn:
+                if row:
+                    self.conn.execute("UPDATE sessions SET item = ?, version = ? WHERE session_id = ? AND version = ?",
+                                      (json.dumps(item), item['version'], session_id, expected_version))
+                else:
+                    self.conn.execute("INSERT INTO sessions (session_id, item, version) VALUES (?, ?, ?)",
+                                      (session_id, json.dumps(item), item['version']))
+
+
+class DynamoDBMemoryBackend:
+    """One GetItem per read; writes are UpdateItem deltas conditioned on `version`"""
+
+    def __init__(self, table):
+        self.table = table
+        self.reads = 0
+        self.version_reads = 0
+        self.writes = 0
+
+    def get(self, session_id: str) -> Optional[Dict]:
+        self.reads += 1
+        item = self.table.get_item(Key={'session_id': session_id}).get('Item')
+        return _plain(item) if item is not None else None
+
+    def version(self, session_id: str) -> int:
+        """Strongly consistent read of the version attribute only, not the history"""
+        self.version_reads += 1
+        item = self.table.get_item(Key={'session_id': session_id}, ProjectionExpression='#v',
+                                   ExpressionAttributeNames={'#v': 'version'}, ConsistentRead=True).get('Item')
+        return int(item.get('version', 0)) if item else 0
+
+    def write(self, session_id: str, expected_version: int, change: Dict):
+        names = {'#v': 'version', '#u': 'updated_at', '#h': 'history', '#e': 'entities'}
+        values = {':v': change['version'], ':u': change['updated_at']}
+        sets = ['#v = :v', '#u = :u']
+        if change.get('summary') is not None:
+            names['#s'] = 'summary'
+            sets.append('#s = :s')
+            values[':s'] = change['summary']
+        if change.get('history') is not None:
+            sets.append('#h = :h')
+            values[':h'] = change['history']
+        else:
+            sets.append('#h = list_append(if_not_exists(#h, :empty), :turn)')
+            values[':turn'] = [change['append']]
+            values[':empty'] = []
+        if change.get('replace_entities'):
+            sets.append('#e = :e')
+            values[':e'] = change['entities']
+        else:
+            for i, (key, value) in enumerate(change['entities'].items()):
+                names[f'#k{i}'] = key
+                values[f':k{i}'] = value
+                sets.append(f'#e.#k{i} = :k{i}')
+        if expected_version:
+            condition = '#v = :expected'
+            values[':expected'] = expected_version
+        else:
+            condition = 'attribute_not_exists(#v)'
+        self.writes += 1
+        try:
+            self.table.update_item(
+                Key={'session_id': session_id},
+                UpdateExpression='SET ' + ', '.join(sets),
+                ConditionExpression=condition,
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=json.loads(json.dumps(values), parse_float=Decimal)
+            )
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            raise VersionConflict(session_id)
+
+
+def _apply(item: Dict, change: Dict):
+    """Apply a write delta to a full item (for backends without partial updates)"""
+    if change.get('replace_entities'):
+        item['entities'] = dict(change['entities'])
+    else:
+        item.setdefault('entities', {}).update(change['entities'])
+    if change.get('history') is not None:
+        item['history'] = list(change['history'])
+    else:
+        item.setdefault('history', []).append(change['append'])
+    if change.get('summary') is not None:
+        item['summary'] = change['summary']
+    item['version'] = change['version']
+    item['updated_at'] = change['updated_at']
+
+
+class MemoryStore:
+    """Session memory that reads once per request and writes only the delta.
+
+    Each turn appends one history entry and sets the entities that changed,
+    conditioned on the version that was read. On a conflict the session is
+    re-read and only what this turn changed (the entities that differ from
+    the context it read, and its history entry) is re-applied on top, so a
+    newer turn from another container is not overwritten. Recent sessions
+    are kept in an L1 cache keyed by session; a hit is used only after a
+    version-only read confirms it is current. History is rewritten in full
+    only when it has to be trimmed to `max_turns`.
+
+    With a `summarizer`, trimming folds the oldest turns into the session's
+    running `summary` and keeps only the newest `keep_turns` verbatim, so
+    the summary is refreshed once every `max_turns - keep_turns + 1` turns
+    rather than on every turn.
+    """
+
+    def __init__(self, backend, l1: Optional[LRUCache] = None, max_turns: int = 10,
+                 response_chars: int = 500, max_retries: int = 3, summarizer=None,
+                 keep_turns: Optional[int] = None):
+        self.backend = backend
+        self.l1 = l1
+        self.max_turns = max_turns
+        self.summarizer = summarizer
+        self.keep_turns = max(1, max_turns // 2) if keep_turns is None else keep_turns
+        self.response_chars = response_chars
+        self.max_retries = max_retries
+        self.counters = {'l1_hits': 0, 'l1_stale': 0, 'reads': 0, 'version_reads': 0, 'writes': 0, 'conflicts': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def empty(self, session_id: str) -> Dict:
+        return {'session_id': session_id, 'entities': {}, 'history': [], 'version': 0}
+
+    def _read(self, session_id: str) -> Dict:
+        self._count('reads')
+        item = self.backend.get(session_id)
+        if item is None:
+            return self.empty(session_id)
+        item.setdefault('entities', {})
+        item.setdefault('history', [])
+        item['version'] = int(item.get('version', 0))
+        return item
+
+    def load(self, session_id: str) -> Dict:
+        if self.l1 is not None:
+            cached = self.l1.get(session_id)
+            if cached is not None:
+                self._count('version_reads')
+                if self.backend.version(session_id) == cached['version']:
+                    self._count('l1_hits')
+                    return copy.deepcopy(cached)
+                self._count('l1_stale')
+        context = self._read(session_id)
+        if self.l1 is not None:
+            self.l1.put(session_id, copy.deepcopy(context))
+        return context
+
+    def record_turn(self, context: Dict, entities: Dict, query: str, response: str) -> Dict:
+        """Persist one turn against the context read earlier; returns the new context.
+
+        `entities` are the full profile computed from `context`; only those
+        that differ from it belong to this turn. The returned context carries
+        the version this turn was committed as.
+        """
+        session_id = context['session_id']
+        now = datetime.utcnow().isoformat()
+        turn = {'query': query, 'response': response[:self.response_chars], 'timestamp': now}
+        extracted = {k: v for k, v in entities.items() if context['entities'].get(k) != v}
+        # The summary is asked of the model at most once per turn, not once per attempt
+        folded = {}
+        for attempt in range(self.max_retries + 1):
+            change = self.delta(context, {**context['entities'], **extracted}, turn, now, folded)
+            try:
+                self._count('writes')
+                self.backend.write(session_id, context['version'], change)
+                break
+            except VersionConflict:
+                self._count('conflicts')
+                if attempt == self.max_retries:
+                    if self.l1 is not None:
+                        self.l1.pop(session_id)
+                    raise
+                context = self._read(session_id)
+        updated = copy.deepcopy(context)
+        _apply(updated, change)
+        updated['history'] = updated['history'][-self.max_turns:]
+        if self.l1 is not None:
+            self.l1.put(session_id, copy.deepcopy(updated))
+        return updated
+
+    def delta(self, context: Dict, entities: Dict, turn: Dict, now: str, folded: Optional[Dict] = None) -> Dict:
+        new = context['version'] == 0
+        changed = {k: v for k, v in entities.items() if context['entities'].get(k) != v}
+        change = {
+            'version': context['version'] + 1,
+            'updated_at': now,
+            'entities': {**context['entities'], **entities} if new else changed,
+            'replace_entities': new,
+            'append': turn,
+            'history': None
+        }
+        # New and legacy (unversioned) items, or a full window, get the whole list
+        if new or len(context['history']) + 1 > self.max_turns:
+            history = context['history'] + [turn]
+            if self.summarizer is not None and len(history) > self.max_turns:
+                dropped, history = history[:-self.keep_turns], history[-self.keep_turns:]
+                change['summary'] = self.fold(context.get('summary', ''), dropped, {} if folded is None else folded)
+            change['history'] = history[-self.max_turns:]
+        return change
+
+    def fold(self, summary: str, turns: List[Dict], folded: Dict) -> str:
+        """`summary` with `turns` folded in, calling the model only the first time for a turn.
+
+        `folded` keeps that first result across version-conflict retries. A
+        retry reuses it and adds locally only the turns it did not cover;
+        when another writer has folded the summary meanwhile, its summary is
+        the base instead.
+        """
+        if 'summary' not in folded:
+            folded.update(base=summary, turns=turns, summary=self.summarizer.fold(summary, turns))
+            return folded['summary']
+        covered = {(t['timestamp'], t['query']) for t in folded['turns']}
+        rest = [t for t in turns if (t['timestamp'], t['query']) not in covered]
+        base = folded['summary'] if summary == folded['base'] else summary
+        return self.summarizer.local(base, rest) if rest else base
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counters = dict(self.counters)
+        if self.summarizer is not None:
+            counters['summaries'] = self.summarizer.stats()
+        return counters
@@ -0,0 +1,19 @@
+from typing import Dict, Optional
+
+
+def matches_filter(record: Dict, filters: Optional[Dict]) -> bool:
+    """Evaluate the equals/notEquals/in/andAll/orAll subset of KB retrieval filters"""
+    if not filters:
+        return True
+    metadata = record.get('metadata', {})
+    if 'andAll' in filters:
+        return all(matches_filter(record, f) for f in filters['andAll'])
+    if 'orAll' in filters:
+        return any(matches_filter(record, f) for f in filters['orAll'])
+    if 'equals' in filters:
+        return metadata.get(filters['equals']['key']) == filters['equals']['value']
+    if 'notEquals' in filters:
+        return metadata.get(filters['notEquals']['key']) != filters['notEquals']['value']
+    if 'in' in filters:
+        return metadata.get(filters['in']['key']) in filters['in']['value']
+    raise ValueError(f"Unsupported filter: {', '.join(filters)}")
@@ -0,0 +1,82 @@
+import hashlib
+import json
+import threading
+from typing import Dict, Iterable, Optional
+
+from cache import LRUCache
+
+
+class ModelCallCache:
+    """Parsed invoke_model results keyed by a hash of the model id and canonical request body.
+
+    Only stages listed in `stages` are cached, so deterministic agents
+    (low-temperature extraction, analysis, validation) reuse results while
+    sampling agents never do. An in-container LRU sits in
+    front of an optional shared tier with the AnswerCache tier interface;
+    each entry remembers how long the original call took so hits can be
+    reported as latency saved.
+    """
+
+    def __init__(self, stages: Iterable[str], shared=None, max_entries: int = 2048, ttl_seconds: int = 3600):
+        self.stages = frozenset(stages)
+        self.local = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self.shared = shared
+        self.ttl_seconds = ttl_seconds
+        self.counts = {}
+        self._lock = threading.Lock()
+
+    def enabled(self, stage: str) -> bool:
+        return stage in self.stages
+
+    @staticmethod
+    def key(model_id: str, body: Dict) -> str:
+        canonical = json.dumps(body, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        return 'model:' + hashlib.sha256(f"{model_id}\n{canonical}".encode()).hexdigest()
+
+    def _count(self, stage: str, outcome: str, saved_ms: float = 0.0):
+        with self._lock:
+            counts = self.counts.setdefault(stage, {'hits': 0, 'misses': 0, 'latency_saved_ms': 0.0})
+            counts[outcome] += 1
+            counts['latency_saved_ms'] += saved_ms
+
+    def get(self, key: str, stage: str) -> Optional[Dict]:
+        entry = self.local.get(key)
+        if entry is None and self.shared is not None:
+            try:
+                entry = self.shared.get(key)
+            except Exception as e:
+                print(f"Model cache read error: {e}")
+            if entry is not None:
+                self.local.put(key, entry)
+        if entry is None:
+            self._count(stage, 'misses')
+            return None
+        self._count(stage, 'hits', entry['latency_ms'])
+        return entry['result']
+
+    def put(self, key: str, result: Dict, latency_ms: float):
+        entry = {'result': result, 'latency_ms': round(latency_ms, 1)}
+        self.local.put(key, entry)
+        if self.shared is not None:
+            try:
+                self.shared.put(key, entry, self.ttl_seconds)
+            except Exception as e:
+                print(f"Model cache write error: {e}")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stages = {stage: dict(counts) for stage, counts in self.counts.items()}
+        hits = sum(c['hits'] for c in stages.values())
+        total = hits + sum(c['misses'] for c in stages.values())
+        for counts in stages.values():
+            calls = counts['hits'] + counts['misses']
+            counts['hit_rate'] = round(counts['hits'] / calls, 4) if calls else 0.0
+            counts['latency_saved_ms'] = round(counts['latency_saved_ms'], 1)
+        return {
+            'hits': hits,
+            'misses': total - hits,
+            'hit_rate': round(hits / total, 4) if total else 0.0,
+            'latency_saved_ms': round(sum(c['latency_saved_ms'] for c in stages.values()), 1),
+            'stages': stages,
+            'entries': len(self.local)
+        }
@@ -1,12 +1,20 @@
 import json
-import boto3
 import os
 
-bedrock_runtime = boto3.client('bedrock-agent-runtime', region_name=os.environ['AWS_REGION'])
-bedrock_agent = boto3.client('bedrock-agent', region_name=os.environ['AWS_REGION'])
+from aws_clients import get_client
+from ingest import (JOB_COMPLETE, JOB_ENDED, S3ObjectStore, etag_manifest, has_changes, pending_manifest_name,
+                    s3_manifest, summarize, supported)
+from ingestion_watch import latest_ingestion_job
+
+bedrock_runtime = get_client('bedrock-agent-runtime', 'generation')
+bedrock_agent = get_client('bedrock-agent', 'admin')
 
 KB_ID = os.environ['KNOWLEDGE_BASE_ID']
 DS_ID = os.environ['DATA_SOURCE_ID']
+S3_BUCKET = os.environ.get('S3_BUCKET')
+# Kept outside the data source so the manifest is never ingested itself
+INGEST_MANIFEST_BUCKET = os.environ.get('INGEST_MANIFEST_BUCKET')
+INGEST_MANIFEST_KEY = os.environ.get('INGEST_MANIFEST_KEY', 'ingest-manifest.json')
 
 def query_rag(query, session_id=None):
     params = {
@@ -44,32 +52,94 @@ def query_rag(query, session_id=None):
         'timestamp': response['ResponseMetadata']['HTTPHeaders']['date']
     }
 
-def start_ingestion():
+def settle_pending_manifests(s3):
+    """Promote the pending manifest of a completed job to INGEST_MANIFEST_KEY and drop those of failed or
+    stopped jobs. Returns the ids of jobs still running."""
+    prefix = pending_manifest_name(INGEST_MANIFEST_KEY, '')
+    running = []
+    listed = s3.list_objects_v2(Bucket=INGEST_MANIFEST_BUCKET, Prefix=prefix).get('Contents', [])
+    for obj in listed:
+        job_id = obj['Key'][len(prefix):]
+        try:
+            status = bedrock_agent.get_ingestion_job(
+                knowledgeBaseId=KB_ID, dataSourceId=DS_ID, ingestionJobId=job_id
+            )['ingestionJob']['status']
+        except Exception as e:
+            print(f"Ingestion job lookup error for {job_id}: {e}")
+            running.append(job_id)
+            continue
+        if status not in JOB_ENDED:
+            running.append(job_id)
+            continue
+        if status == JOB_COMPLETE:
+            s3.copy_object(Bucket=INGEST_MANIFEST_BUCKET, Key=INGEST_MANIFEST_KEY,
+                           CopySource={'Bucket': INGEST_MANIFEST_BUCKET, 'Key': obj['Key']})
+        else:
+            print(f"Ingestion job {job_id} {status}; its documents are retried on the next incremental run")
+        s3.delete_object(Bucket=INGEST_MANIFEST_BUCKET, Key=obj['Key'])
+    return running
+
+def start_ingestion(incremental=False):
+    """Start an ingestion job; with `incremental`, only when the bucket differs from the last run's manifest"""
+    changes = None
+    if incremental:
+        if not (S3_BUCKET and INGEST_MANIFEST_BUCKET):
+            return {
+                'success': False,
+                'message': 'Set S3_BUCKET and INGEST_MANIFEST_BUCKET for incremental ingestion'
+            }
+        s3 = get_client('s3', 'admin')
+        running = settle_pending_manifests(s3)
+        if running:
+            return {
+                'success': False,
+                'message': 'An incremental ingestion job is still running; retry once it finishes',
+                'job_id': running[0],
+                'status': 'IN_PROGRESS'
+            }
+        objects = [o for o in S3ObjectStore(s3, S3_BUCKET).list_objects() if supported(o['key'])]
+        diff = s3_manifest(s3, INGEST_MANIFEST_BUCKET, INGEST_MANIFEST_KEY).diff(objects)
+        changes = summarize(diff)
+        if not has_changes(diff):
+            return {
+                'success': True,
+                'message': 'No document changes since the last ingestion',
+                'job_id': None,
+                'status': 'SKIPPED',
+                'changes': changes
+            }
+    
     response = bedrock_agent.start_ingestion_job(
         knowledgeBaseId=KB_ID,
         dataSourceId=DS_ID
     )
-    return {
+    result = {
         'success': True,
         'message': 'Document ingestion started successfully',
         'job_id': response['ingestionJob']['ingestionJobId'],
         'status': response['ingestionJob']['status']
     }
+    if incremental:
+        # Becomes the baseline only once the job completes (settle_pending_manifests)
+        s3.put_object(Bucket=INGEST_MANIFEST_BUCKET, Key=pending_manifest_name(INGEST_MANIFEST_KEY, result['job_id']),
+                      Body=etag_manifest(objects).to_json().encode())
+        result['changes'] = changes
+    return result
 
 def check_ingestion_status():
-    response = bedrock_agent.list_ingestion_jobs(
-        knowledgeBaseId=KB_ID,
-        dataSourceId=DS_ID,
-        maxResults=1
-    )
-    if not response['ingestionJobSummaries']:
+    job = latest_ingestion_job(bedrock_agent, KB_ID, DS_ID)
+    if job is None:
         return {
             'success': True,
             'status': 'NO_JOBS',
             'message': 'No ingestion jobs found'
         }
+    if INGEST_MANIFEST_BUCKET and job['status'] in JOB_ENDED:
+        try:
+            settle_pending_manifests(get_client('s3', 'admin'))
+        except Exception as e:
+            print(f"Pending manifest error: {e}")
     
-    job = response['ingestionJobSummaries'][0]
     stats = job.get('statistics', {})
     
     status_messages = {
@@ -104,7 +174,7 @@ def lambda_handler(event, context):
             }
         
         elif action == 'index':
-            result = start_ingestion()
+            result = start_ingestion(bool(body.get('incremental')))
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json'},
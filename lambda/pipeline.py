@@ -0,0 +1,219 @@
+import asyncio
+import contextvars
+import inspect
+import operator
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+
+# Guess for a dep that is the dep stage's own speculative result, once that finishes
+FROM_SPECULATION = object()
+
+
+class Stage:
+    """A unit of work in the pipeline graph.
+
+    `fn` receives a dict holding the pipeline inputs plus the results of
+    every stage listed in `deps`. `speculate` maps some of those deps to a
+    guess function over the results known so far, or to FROM_SPECULATION
+    to chain onto the speculative run of that dep's stage; the stage may then
+    start on the guessed values as soon as its remaining deps are available.
+    `matches` compares a guess with the real value (equality by default),
+    either as one function or per dep.
+    """
+
+    def __init__(self, name: str, fn: Callable[[Dict], Any], deps: Iterable[str] = (),
+                 speculate: Optional[Dict[str, Callable[[Dict], Any]]] = None,
+                 matches: Union[Callable[[Any, Any], bool], Dict[str, Callable[[Any, Any], bool]], None] = None):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.speculate = speculate or {}
+        self.matches = matches
+
+    def guess_matches(self, dep: str, guess: Any, actual: Any) -> bool:
+        matches = self.matches.get(dep) if isinstance(self.matches, dict) else self.matches
+        return (matches or operator.eq)(guess, actual)
+
+
+class PipelineScheduler:
+    """Runs a stage graph, starting each stage as soon as its inputs exist.
+
+    Speculative stages start early on guessed inputs. Once the real inputs
+    arrive the guesses are compared: a match keeps the speculative result,
+    a mismatch discards it and the stage re-runs on the real inputs.
+    """
+
+    def __init__(self, max_workers: int = 6, speculative: bool = True):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='stage')
+        self.speculative = speculative
+
+    def run(self, stages: List[Stage], inputs: Dict) -> Dict:
+        steps = self._steps(stages, inputs)
+        try:
+            waiting = next(steps)
+            while True:
+                wait(waiting, return_when=FIRST_COMPLETED)
+                waiting = next(steps)
+        except StopIteration as stop:
+            return stop.value
+
+    def _submit(self, stage: Stage, view: Dict, started: float):
+        def call():
+            begin = time.perf_counter()
+            value = stage.fn(view)
+            return value, begin - started, time.perf_counter() - begin
+        # Stages see the caller's context variables (e.g. the request trace)
+        return self.executor.submit(contextvars.copy_context().run, call)
+
+    def _steps(self, stages: List[Stage], inputs: Dict):
+        """Scheduling loop shared by the sync and async drivers.
+
+        Yields the futures it is blocked on; the driver resumes it once at
+        least one of them has completed.
+        """
+        by_name = {s.name: s for s in stages}
+        for s in stages:
+            for dep in s.deps:
+                if dep not in by_name and dep not in inputs:
+                    raise ValueError(f"Stage '{s.name}' depends on unknown stage '{dep}'")
+
+        started = time.perf_counter()
+        results = dict(inputs)
+        report = {'stages': {}, 'speculation': {}}
+        real = {}         # future -> stage name
+        speculative = {}  # stage name -> (future, guesses)
+        settled = set()   # stages whose speculation has been used up or ruled out
+        pending = set(by_name)
+
+        def submit(stage: Stage, view: Dict):
+            return self._submit(stage, view, started)
+
+        def finish(name: str, future):
+            value, offset, elapsed = future.result()
+            results[name] = value
+            report['stages'][name] = {
+                'start_ms': round(offset * 1000, 1),
+                'duration_ms': round(elapsed * 1000, 1)
+            }
+            pending.discard(name)
+
+        def base_view(stage: Stage) -> Dict:
+            view = {k: results[k] for k in inputs}
+            view.update({d: results[d] for d in stage.deps if d in results})
+            return view
+
+        def speculated(name: str) -> bool:
+            """Whether the speculative run of `name` finished cleanly"""
+            if name not in speculative:
+                return False
+            future = speculative[name][0]
+            return future.done() and not future.cancelled() and future.exception() is None
+
+        def schedule():
+            for name in sorted(pending):
+                stage = by_name[name]
+                if name in real.values():
+                    continue
+                if all(d in results for d in stage.deps):
+                    if name in speculative:
+                        future, guesses = speculative[name]
+                        if all(stage.guess_matches(d, g, results[d]) for d, g in guesses.items()):
+                            report['speculation'][name] = 'hit'
+                            continue
+                        report['speculation'][name] = 'miss'
+                        future.cancel()
+                        del speculative[name]
+                        settled.add(name)
+                    real[submit(stage, base_view(stage))] = name
+                elif (self.speculative and stage.speculate and name not in speculative
+                      and name not in settled):
+                    if not all(d in results for d in stage.deps if d not in stage.speculate):
+                        continue
+                    if not all(d in results or speculated(d) for d, guess in stage.speculate.items()
+                               if guess is FROM_SPECULATION):
+                        continue
+                    settled.add(name)
+                    try:
+                        guesses = {d: speculative[d][0].result()[0] if guess is FROM_SPECULATION else guess(results)
+                                   for d, guess in stage.speculate.items() if d not in results}
+                    except Exception as e:
+                        print(f"Speculation error for {name}: {e}")
+                        report['speculation'][name] = 'skipped'
+                        continue
+                    view = base_view(stage)
+                    view.update(guesses)
+                    speculative[name] = (submit(stage, view), guesses)
+
+        while pending:
+            schedule()
+
+            # Speculations confirmed by schedule() complete the stage once done
+            promoted = False
+            for name, (future, _) in list(speculative.items()):
+                if report['speculation'].get(name) != 'hit' or not future.done():
+                    continue
+                del speculative[name]
+                if future.exception() is None:
+                    finish(name, future)
+                    promoted = True
+                else:
+                    print(f"Speculative {name} error: {future.exception()}")
+                    report['speculation'][name] = 'error'
+                    real[submit(by_name[name], base_view(by_name[name]))] = name
+            if promoted:
+                continue
+
+            # A failed speculation is dropped; the stage runs for real later
+            for name, (future, _) in list(speculative.items()):
+                if future.done() and future.exception() is not None:
+                    print(f"Speculative {name} error: {future.exception()}")
+                    report['speculation'][name] = 'error'
+                    del speculative[name]
+
+            waiting = list(real) + [f for f, _ in speculative.values() if not f.done()]
+            if not waiting:
+                raise RuntimeError(f"Pipeline blocked on stages: {', '.join(sorted(pending))}")
+
+            yield waiting
+            for future in [f for f in real if f.done()]:
+                finish(real.pop(future), future)
+
+        # Unconfirmed speculations are no longer needed
+        for future, _ in speculative.values():
+            future.cancel()
+
+        report['total_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        results['_report'] = report
+        return results
+
+
+class AsyncPipelineScheduler(PipelineScheduler):
+    """asyncio driver for the same graph.
+
+    Stage functions run on the loop's executor; if one returns an awaitable
+    (an async agent call) it is awaited on the loop, so graphs can freely mix
+    sync helpers and async agents.
+    """
+
+    def __init__(self, speculative: bool = True):
+        self.speculative = speculative
+
+    async def run(self, stages: List[Stage], inputs: Dict) -> Dict:
+        steps = self._steps(stages, inputs)
+        try:
+            waiting = next(steps)
+            while True:
+                await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+                waiting = next(steps)
+        except StopIteration as stop:
+            return stop.value
+
+    def _submit(self, stage: Stage, view: Dict, started: float):
+        async def call():
+            begin = time.perf_counter()
+            value = await asyncio.to_thread(stage.fn, view)
+            if inspect.isawaitable(value):
+                value = await value
+            return value, begin - started, time.perf_counter() - begin
+        return asyncio.ensure_future(call())
@@ -0,0 +1,97 @@
+import re
+import zlib
+from typing import Dict, List
+
+import numpy as np
+
+from context_packer import estimate_tokens
+
+WORD = re.compile(r"\w+")
+HASH_SHIFT = np.uint64(32)
+
+
+def shingles(text: str, size: int = 3) -> np.ndarray:
+    """crc32 hashes of the word n-grams in `text`"""
+    words = WORD.findall(text.lower())
+    if len(words) < size:
+        grams = [' '.join(words)]
+    else:
+        grams = [' '.join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.unique(np.fromiter((zlib.crc32(g.encode()) for g in grams), dtype=np.uint64, count=len(grams)))
+
+
+def relevance_of(document: Dict) -> float:
+    """Ranking relevance: the fused rank of a hybrid result, else its similarity"""
+    return document.get('rank_score', document['score'])
+
+
+class Reranker:
+    """Near-duplicate removal and MMR reordering of retrieved chunks.
+
+    Chunks are compared by MinHash-estimated Jaccard similarity of their
+    word shingles. A chunk that mostly overlaps a better-ranked one (the
+    shared shingles cover `duplicate_threshold` of the smaller chunk, as
+    happens with overlapping chunking) is dropped; the rest are reordered by
+    maximal marginal relevance so the prompt window covers distinct text.
+    """
+
+    def __init__(self, num_perm: int = 64, duplicate_threshold: float = 0.8, mmr_lambda: float = 0.7,
+                 seed: int = 0):
+        rng = np.random.default_rng(seed)
+        # Multiply-shift hashing: (a * x + b) mod 2^64, top 32 bits
+        self.a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self.b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+        self.duplicate_threshold = duplicate_threshold
+        self.mmr_lambda = mmr_lambda
+
+    def signatures(self, texts: List[str]):
+        """MinHash signatures plus the shingle count of each text"""
+        out = np.empty((len(texts), len(self.a)), dtype=np.uint64)
+        sizes = np.empty(len(texts), dtype=np.float64)
+        for i, text in enumerate(texts):
+            hashes = shingles(text)
+            sizes[i] = len(hashes)
+            out[i] = ((hashes[:, None] * self.a + self.b) >> HASH_SHIFT).min(axis=0)
+        return out, sizes
+
+    def similarity(self, documents: List[Dict]):
+        """(Jaccard, containment) matrices; containment is relative to the smaller chunk"""
+        sig, sizes = self.signatures([d['content'] for d in documents])
+        jaccard = (sig[:, None, :] == sig[None, :, :]).mean(axis=2)
+        shared = jaccard / (1 + jaccard) * (sizes[:, None] + sizes[None, :])
+        containment = np.minimum(shared / np.minimum(sizes[:, None], sizes[None, :]), 1.0)
+        return jaccard, containment
+
+    def rerank(self, documents: List[Dict]) -> Dict:
+        """Returns {'documents', 'duplicates_removed', 'tokens_saved'}.
+
+        `tokens_saved` counts the estimated tokens of the dropped duplicates,
+        context budget they would otherwise have taken from distinct text.
+        """
+        if len(documents) < 2:
+            return {'documents': documents, 'duplicates_removed': 0, 'tokens_saved': 0}
+        sim, containment = self.similarity(documents)
+        order = np.argsort([-relevance_of(d) for d in documents], kind='stable')
+
+        kept, dropped = [], []
+        for i in order:
+            if kept and containment[i, kept].max() >= self.duplicate_threshold:
+                dropped.append(i)
+            else:
+                kept.append(i)
+
+        relevance = np.array([relevance_of(documents[i]) for i in kept], dtype=np.float64)
+        sub = sim[np.ix_(kept, kept)]
+        selected = [0]
+        remaining = list(range(1, len(kept)))
+        while remaining:
+            redundancy = sub[np.ix_(remaining, selected)].max(axis=1)
+            mmr = self.mmr_lambda * relevance[remaining] - (1 - self.mmr_lambda) * redundancy
+            selected.append(remaining.pop(int(np.argmax(mmr))))
+
+        tokens_saved = sum(estimate_tokens(documents[i]['content']) for i in dropped)
+        return {
+            'documents': [documents[kept[j]] for j in selected],
+            'duplicates_removed': len(dropped),
+            'tokens_saved': tokens_saved
+        }
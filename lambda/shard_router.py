@@ -0,0 +1,134 @@
+import contextvars
+import json
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+# Fan-out asks each shard for this many times the results, so per-shard
+# score statistics rest on more than the handful that will be kept
+FANOUT_DEPTH = 3
+
+Retriever = Callable[[Any, int, Optional[Dict]], List[Dict]]
+
+
+def load_shard_map(spec: str) -> Dict[str, Dict]:
+    """Policy type -> shard from a JSON object or the path of a JSON file.
+
+    A shard is a knowledge base id, an index directory, or an object with
+    `knowledge_base_id` (plus the `data_source_id` ingestion syncs) or `index`.
+    """
+    if os.path.exists(spec):
+        with open(spec) as f:
+            spec = f.read()
+    shards = {}
+    for policy_type, shard in json.loads(spec).items():
+        if isinstance(shard, str):
+            shard = {'target': shard}
+        else:
+            shard = {**shard, 'target': shard.get('knowledge_base_id') or shard['index']}
+        shards[normalize_policy_type(policy_type)] = shard
+    return shards
+
+
+def normalize_policy_type(policy_type) -> Optional[str]:
+    if not policy_type or not isinstance(policy_type, str):
+        return None
+    return " ".join(policy_type.lower().replace('_', ' ').split())
+
+
+def merge_normalized(results: Dict[str, List[Dict]], number_of_results: int) -> List[Dict]:
+    """Merge per-shard result lists whose raw scores are not comparable.
+
+    Each score becomes a z-score against its own shard's candidates, which
+    asks how far a hit stands out from the rest of that shard rather than
+    how large the shard's scores run: a shard with one strong match keeps
+    it, a shard returning uniformly weak matches does not crowd it out.
+    Scores are returned through a logistic, so they stay in (0, 1) like the
+    relevance scores of a single knowledge base. A shard whose candidates
+    all score the same (a single hit, say) has no spread to measure
+    against: its hits keep their raw score when it is a relevance score in
+    [0, 1], as knowledge bases and cosine indexes return, and otherwise
+    get the neutral 0.5. Duplicates (same source and text) keep their best
+    score.
+    """
+    merged = {}
+    for shard, docs in results.items():
+        if not docs:
+            continue
+        scores = [d['score'] for d in docs]
+        mean = sum(scores) / len(scores)
+        spread = (sum((x - mean) ** 2 for x in scores) / len(scores)) ** 0.5
+        for d in docs:
+            if spread > 0:
+                score = 1 / (1 + math.exp(-(d['score'] - mean) / spread))
+            else:
+                score = d['score'] if 0.0 <= d['score'] <= 1.0 else 0.5
+            key = (d['source'], d['content'])
+            if key not in merged or score > merged[key]['score']:
+                merged[key] = {**d, 'score': score, 'raw_score': d['score'], 'shard': shard}
+    ranked = sorted(merged.values(), key=lambda d: -d['score'])[:number_of_results]
+    for d in ranked:
+        d['score'] = round(d['score'], 4)
+    return ranked
+
+
+class ShardRouter:
+    """Sends a search to the shard of its policy type, or to the whole corpus.
+
+    `retrievers` maps a shard to a function (query, number_of_results,
+    filters) -> results; `routes` maps a policy type to a shard, and several
+    types may share one. A known policy type searches its shard only. An
+    unknown or missing one searches `default`, the retriever over the full
+    corpus, since documents outside every shard's prefix live only there;
+    without a default it fans out to all shards in parallel, FANOUT_DEPTH
+    times as deep, and merges with merge_normalized. A failing shard is
+    logged and contributes nothing.
+    """
+
+    def __init__(self, retrievers: Dict[str, Retriever], routes: Dict[str, str], max_workers: Optional[int] = None,
+                 default: Optional[str] = None):
+        unknown = (set(routes.values()) | ({default} if default is not None else set())) - set(retrievers)
+        if unknown:
+            raise ValueError(f"routes name shards without a retriever: {sorted(unknown)}")
+        self.retrievers = retrievers
+        self.routes = {normalize_policy_type(k): v for k, v in routes.items()}
+        self.default = default
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or len(retrievers), thread_name_prefix='shard')
+        self.counts = {'routed': 0, 'unrouted': 0, 'fanout': 0, 'errors': 0}
+        self._lock = threading.Lock()
+
+    def route(self, policy_type) -> Optional[str]:
+        return self.routes.get(normalize_policy_type(policy_type))
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counts[name] += 1
+
+    def _search(self, shard: str, query, number_of_results: int, filters: Optional[Dict]) -> List[Dict]:
+        try:
+            return self.retrievers[shard](query, number_of_results, filters)
+        except Exception as e:
+            print(f"Shard {shard} retrieval error: {e}")
+            self._count('errors')
+            return []
+
+    def retrieve(self, query, number_of_results: int = 5, filters: Dict = None, policy_type=None) -> List[Dict]:
+        shard = self.route(policy_type)
+        if shard is not None:
+            self._count('routed')
+            return [{**d, 'shard': shard} for d in self._search(shard, query, number_of_results, filters)]
+        if self.default is not None:
+            self._count('unrouted')
+            return self._search(self.default, query, number_of_results, filters)
+        self._count('fanout')
+        candidates = number_of_results * FANOUT_DEPTH
+        futures = {s: self.executor.submit(contextvars.copy_context().run, self._search, s, query, candidates, filters)
+                   for s in self.retrievers}
+        return merge_normalized({s: f.result() for s, f in futures.items()}, number_of_results)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            counts = dict(self.counts)
+        return {**counts, 'shards': len(set(self.routes.values())), 'default': self.default, 'routes': dict(self.routes)}
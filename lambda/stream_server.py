@@ -0,0 +1,80 @@
+import json
+import os
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import advanced_orchestrator as ao
+
+PORT = int(os.environ.get('PORT', '8080'))
+
+
+class StreamHandler(BaseHTTPRequestHandler):
+    """HTTP front for token streaming behind the Lambda Web Adapter.
+
+    Python handlers return one buffered response, so the streaming function
+    runs this server under the web adapter with a response-streaming
+    function URL (template.yaml). Each SSE event of a streaming query is
+    written as an HTTP chunk and flushed as soon as it is produced; any
+    other request goes to lambda_handler unchanged. Lambda sends one request
+    at a time per environment, so a single-threaded server keeps the async
+    orchestrator's loop warm.
+    """
+    
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        # Readiness check of the web adapter
+        self.send_body(200, 'application/json', json.dumps({'status': 'ok'}))
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get('Content-Length') or 0)).decode('utf-8')
+        try:
+            body = json.loads(raw) if raw else {}
+        except ValueError:
+            body = None
+        if (isinstance(body, dict) and body.get('action') == 'query' and body.get('stream')
+                and body.get('query') and ao.KB_ID):
+            self.stream(body)
+            return
+        response = ao.lambda_handler({'body': raw}, None)
+        self.send_body(response['statusCode'], response['headers'].get('Content-Type', 'application/json'),
+                       response['body'])
+
+    def send_body(self, status: int, content_type: str, text: str):
+        data = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def write_chunk(self, text: str):
+        data = text.encode('utf-8')
+        self.wfile.write(f"{len(data):X}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+    def stream(self, body):
+        session_id = body.get('session_id') or f"session-{int(ao.datetime.utcnow().timestamp())}"
+        deferred = bool(body.get('async_validation', ao.VALIDATION_MODE == 'deferred'))
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        try:
+            for chunk in ao.stream_query(body['query'], session_id, bool(body.get('debug')), deferred):
+                self.write_chunk(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            print("Stream client disconnected")
+            return
+        except Exception as e:
+            # The status line is already sent; report the failure in-band
+            print(f"Stream error: {e}")
+            self.write_chunk(ao.sse('error', {'success': False, 'error': str(e)}))
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+if __name__ == "__main__":
+    HTTPServer(('127.0.0.1', PORT), StreamHandler).serve_forever()
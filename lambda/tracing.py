@@ -0,0 +1,145 @@
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+METRICS_EMF = os.environ.get('METRICS_EMF', 'true').lower() == 'true'
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'RAGOrchestrator')
+
+_current = contextvars.ContextVar('trace', default=None)
+
+
+class Trace:
+    """Model calls and cache outcomes recorded while one request runs.
+
+    Outcomes are counted per event name, since a stage such as `embedding`
+    can run several times in one request. The active trace lives in a context variable, so agent code records
+    into it without it being passed around; pipeline stages and
+    asyncio.to_thread calls inherit the caller's context.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.calls = []
+        self.events = {}
+        self.lock = threading.Lock()
+
+    def call(self, stage: str, model_id: str, latency_ms: float, input_tokens: int, output_tokens: int, retries: int):
+        with self.lock:
+            self.calls.append({
+                'stage': stage,
+                'model_id': model_id,
+                'latency_ms': round(latency_ms, 1),
+                'input_tokens': input_tokens,
+                'output_tokens': output_tokens,
+                'retries': retries
+            })
+
+    def event(self, name: str, value):
+        with self.lock:
+            counts = self.events.setdefault(name, {})
+            counts[value] = counts.get(value, 0) + 1
+
+    def summary(self, report: Optional[Dict] = None) -> Dict:
+        with self.lock:
+            calls = list(self.calls)
+            events = {name: dict(counts) for name, counts in self.events.items()}
+        report = report or {}
+        return {
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 1),
+            'stages': report.get('stages', {}),
+            'speculation': report.get('speculation', {}),
+            'calls': calls,
+            'tokens': {
+                'input': sum(c['input_tokens'] for c in calls),
+                'output': sum(c['output_tokens'] for c in calls)
+            },
+            'retries': sum(c['retries'] for c in calls),
+            'cache': events
+        }
+
+
+@contextmanager
+def tracing():
+    trace = Trace()
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+def record_call(stage: str, model_id: str, started: float, usage: Optional[Dict] = None, retries: int = 0):
+    """Record one model or retrieval call that began at perf_counter() `started`"""
+    trace = _current.get()
+    if trace is None:
+        return
+    usage = usage or {}
+    trace.call(stage, model_id, (time.perf_counter() - started) * 1000,
+               usage.get('input_tokens', 0), usage.get('output_tokens', 0), retries)
+
+
+def record_event(name: str, value):
+    trace = _current.get()
+    if trace is not None:
+        trace.event(name, value)
+
+
+def retries_of(response: Dict) -> int:
+    return response.get('ResponseMetadata', {}).get('RetryAttempts', 0)
+
+
+def _emf(dimensions: Dict, metrics: Dict, units: Dict) -> Dict:
+    return {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [list(dimensions)],
+                'Metrics': [{'Name': name, 'Unit': units[name]} for name in metrics]
+            }]
+        },
+        **dimensions,
+        **metrics
+    }
+
+
+def emf_records(summary: Dict, mode: str) -> List[Dict]:
+    """CloudWatch Embedded Metric Format records: one per call stage and one per request"""
+    by_stage = {}
+    for c in summary['calls']:
+        s = by_stage.setdefault(c['stage'], {'LatencyMs': 0.0, 'InputTokens': 0, 'OutputTokens': 0, 'Retries': 0})
+        s['LatencyMs'] += c['latency_ms']
+        s['InputTokens'] += c['input_tokens']
+        s['OutputTokens'] += c['output_tokens']
+        s['Retries'] += c['retries']
+
+    def outcomes(name: str, value: str) -> int:
+        return summary['cache'].get(name, {}).get(value, 0)
+
+    units = {'LatencyMs': 'Milliseconds', 'InputTokens': 'Count', 'OutputTokens': 'Count', 'Retries': 'Count',
+             'Calls': 'Count', 'AnswerCacheHit': 'Count', 'ValidationSkipped': 'Count', 'ModelCacheHits': 'Count'}
+    records = [_emf({'Mode': mode, 'Stage': stage}, {**m, 'LatencyMs': round(m['LatencyMs'], 1)}, units)
+               for stage, m in by_stage.items()]
+    records.append(_emf({'Mode': mode}, {
+        'LatencyMs': summary['total_ms'],
+        'InputTokens': summary['tokens']['input'],
+        'OutputTokens': summary['tokens']['output'],
+        'Retries': summary['retries'],
+        'Calls': len(summary['calls']),
+        'AnswerCacheHit': min(1, outcomes('answer_cache', 'hit')),
+        'ValidationSkipped': min(1, outcomes('validation', 'local')),
+        'ModelCacheHits': sum(counts.get('hit', 0) for name, counts in summary['cache'].items()
+                              if name.startswith('model_cache:'))
+    }, units))
+    return records
+
+
+def emit(summary: Dict, mode: str):
+    if not METRICS_EMF:
+        return
+    for record in emf_records(summary, mode):
+        print(json.dumps(record))
@@ -0,0 +1,122 @@
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from cache import LRUCache
+
+PENDING = 'pending'
+COMPLETE = 'complete'
+
+
+def validation_id(session_id: str) -> str:
+    """Fresh id for one deferred validation.
+
+    Not derived from the turn number: that is only known after the memory
+    write, and two concurrent turns (or a stale cached context) would share it.
+    """
+    return f"{session_id}#{uuid.uuid4().hex}"
+
+
+class InMemoryValidationStore:
+    """Results held by this container only; for local runs and the in-process queue"""
+
+    def __init__(self, max_entries: int = 4096, ttl_seconds: int = 3600):
+        self.results = LRUCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+    def get(self, validation_id: str) -> Optional[Dict]:
+        return self.results.get(validation_id)
+
+    def put(self, validation_id: str, record: Dict):
+        self.results.put(validation_id, record)
+
+
+class DynamoDBValidationStore:
+    """Results shared across containers; expiry is enforced by the table TTL attribute"""
+
+    def __init__(self, table, ttl_seconds: int = 3600):
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, validation_id: str) -> Optional[Dict]:
+        item = self.table.get_item(Key={'validation_id': validation_id}).get('Item')
+        if item is None or int(item['expires_at']) <= time.time():
+            return None
+        return json.loads(item['record'])
+
+    def put(self, validation_id: str, record: Dict):
+        self.table.put_item(Item={
+            'validation_id': validation_id,
+            'record': json.dumps(record, default=str),
+            'expires_at': int(time.time() + self.ttl_seconds)
+        })
+
+
+class LocalValidationQueue:
+    """In-process stand-in for the work queue: jobs run on a small thread pool.
+
+    Work still running when Lambda freezes the container resumes on its
+    next invocation, so deployments should use the SQS queue instead.
+    """
+
+    def __init__(self, worker: Callable[[Dict], None], max_workers: int = 2):
+        self.worker = worker
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='validation')
+
+    def submit(self, job: Dict):
+        self.executor.submit(self._run, job)
+
+    def _run(self, job: Dict):
+        try:
+            self.worker(job)
+        except Exception as e:
+            print(f"Validation job error: {e}")
+
+
+class SQSValidationQueue:
+    """Jobs go to an SQS queue whose event source mapping invokes the handler"""
+
+    def __init__(self, client, queue_url: str):
+        self.client = client
+        self.queue_url = queue_url
+
+    def submit(self, job: Dict):
+        self.client.send_message(QueueUrl=self.queue_url, MessageBody=json.dumps(job, default=str))
+
+
+class DeferredValidation:
+    """Validation taken off the request path.
+
+    `defer` records a pending entry under the job's validation id, hands the
+    job to the queue and returns the pending marker the response carries;
+    `complete` runs on the worker side and stores the verdict. A failed
+    enqueue raises, so the caller can validate inline instead.
+    """
+
+    def __init__(self, store, queue):
+        self.store = store
+        self.queue = queue
+
+    def defer(self, job: Dict) -> Dict:
+        pending = {'status': PENDING, 'validation_id': job['validation_id']}
+        self.store.put(job['validation_id'], {**pending, 'queued_at': time.time()})
+        self.queue.submit(job)
+        return pending
+
+    def complete(self, job: Dict, validate: Callable[[Dict], Dict]) -> Dict:
+        record = {'status': COMPLETE, 'validation_id': job['validation_id'], 'validation': validate(job),
+                  'completed_at': time.time()}
+        self.store.put(job['validation_id'], record)
+        return record
+
+    def get(self, validation_id: str) -> Optional[Dict]:
+        return self.store.get(validation_id)
+
+
+def sqs_jobs(event: Dict) -> Optional[List[Dict]]:
+    """Message ids and queued jobs of an SQS event, or None for any other event"""
+    records = event.get('Records')
+    if not records or records[0].get('eventSource') != 'aws:sqs':
+        return None
+    return [{'message_id': r['messageId'], 'job': json.loads(r['body'])} for r in records]
@@ -0,0 +1,165 @@
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from metadata_filter import matches_filter
+
+BLOCK_ROWS = 65536
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Symmetric per-row int8 quantization; returns (codes, scales)"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.round(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def train_ivf(vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Spherical k-means; returns (centroids, assignment per row)"""
+    rng = np.random.default_rng(seed)
+    nlist = max(1, min(nlist, len(vectors)))
+    centroids = vectors[rng.choice(len(vectors), nlist, replace=False)].copy()
+    assign = np.zeros(len(vectors), dtype=np.int32)
+    for _ in range(iterations):
+        for start in range(0, len(vectors), BLOCK_ROWS):
+            block = vectors[start:start + BLOCK_ROWS]
+            assign[start:start + BLOCK_ROWS] = np.argmax(block @ centroids.T, axis=1)
+        for c in range(nlist):
+            members = vectors[assign == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+            else:
+                centroids[c] = vectors[rng.integers(len(vectors))]
+        centroids = _normalize(centroids)
+    return centroids, assign
+
+
+def build_index(path: str, embeddings: np.ndarray, records: List[Dict],
+                quantize: bool = False, nlist: int = 0) -> Dict:
+    """Write an index directory loadable by VectorIndex.
+
+    Rows are stored unit-normalized so scores are cosine similarities. With
+    `nlist` > 0 rows are clustered and stored list-by-list, so each IVF list
+    is one contiguous slice of the memory-mapped matrix.
+    """
+    if len(embeddings) != len(records):
+        raise ValueError("embeddings and records must have the same length")
+    os.makedirs(path, exist_ok=True)
+    vectors = _normalize(embeddings)
+    order = np.arange(len(vectors))
+    meta = {'count': int(len(vectors)), 'dim': int(vectors.shape[1]), 'quantized': bool(quantize), 'nlist': 0}
+
+    if nlist > 0:
+        centroids, assign = train_ivf(vectors, nlist)
+        order = np.argsort(assign, kind='stable')
+        offsets = np.searchsorted(assign[order], np.arange(len(centroids) + 1)).astype(np.int64)
+        np.save(os.path.join(path, 'centroids.npy'), centroids)
+        np.save(os.path.join(path, 'offsets.npy'), offsets)
+        meta['nlist'] = int(len(centroids))
+        vectors = vectors[order]
+
+    if quantize:
+        codes, scales = quantize_int8(vectors)
+        np.save(os.path.join(path, 'embeddings.i8.npy'), codes)
+        np.save(os.path.join(path, 'scales.npy'), scales)
+    else:
+        np.save(os.path.join(path, 'embeddings.f32.npy'), vectors)
+
+    with open(os.path.join(path, 'records.jsonl'), 'w') as f:
+        for i in order:
+            f.write(json.dumps(records[i]) + '\n')
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    return meta
+
+
+class VectorIndex:
+    """Memory-mapped embedding matrix with exact or IVF top-k search"""
+
+    def __init__(self, path: str, nprobe: Optional[int] = None):
+        self.nprobe = nprobe
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        if self.meta['quantized']:
+            self.matrix = np.load(os.path.join(path, 'embeddings.i8.npy'), mmap_mode='r')
+            self.scales = np.load(os.path.join(path, 'scales.npy'), mmap_mode='r')
+        else:
+            self.matrix = np.load(os.path.join(path, 'embeddings.f32.npy'), mmap_mode='r')
+            self.scales = None
+        self.centroids = None
+        self.offsets = None
+        if self.meta['nlist']:
+            self.centroids = np.load(os.path.join(path, 'centroids.npy'))
+            self.offsets = np.load(os.path.join(path, 'offsets.npy'))
+        with open(os.path.join(path, 'records.jsonl')) as f:
+            self.records = [json.loads(line) for line in f]
+
+    def __len__(self):
+        return self.meta['count']
+
+    def _score(self, start: int, end: int, query: np.ndarray) -> np.ndarray:
+        scores = np.empty(end - start, dtype=np.float32)
+        for block in range(start, end, BLOCK_ROWS):
+            stop = min(block + BLOCK_ROWS, end)
+            rows = self.matrix[block:stop]
+            if self.scales is not None:
+                scores[block - start:stop - start] = (rows.astype(np.float32) @ query) * self.scales[block:stop]
+            else:
+                scores[block - start:stop - start] = rows @ query
+        return scores
+
+    def search(self, query_vector, k: int = 5, nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        """Top-k (row, cosine score) pairs; `nprobe` limits IVF lists scanned"""
+        query = _normalize(np.asarray(query_vector, dtype=np.float32))
+        nprobe = nprobe or self.nprobe
+        if self.centroids is not None and nprobe:
+            lists = np.argsort(-(self.centroids @ query))[:nprobe]
+            spans = [(int(self.offsets[c]), int(self.offsets[c + 1])) for c in lists]
+        else:
+            spans = [(0, len(self))]
+
+        rows, scores = [], []
+        for start, end in spans:
+            if end > start:
+                rows.append(np.arange(start, end))
+                scores.append(self._score(start, end, query))
+        if not rows:
+            return []
+        rows = np.concatenate(rows)
+        scores = np.concatenate(scores)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(rows[i]), float(scores[i])) for i in top]
+
+    def retrieve(self, query_vector, k: int = 5, filters: Optional[Dict] = None,
+                 nprobe: Optional[int] = None) -> List[Dict]:
+        """Same {content, source, score} records RetrievalAgent returns"""
+        hits = self.search(query_vector, k * 4 if filters else k, nprobe)
+        hits = [(row, score) for row, score in hits if matches_filter(self.records[row], filters)]
+        return [{
+            'content': self.records[row]['content'],
+            'source': self.records[row].get('source', 'Unknown'),
+            'score': score
+        } for row, score in hits[:k]]
+
+
+def synthetic_corpus(count: int, dim: int, clusters: int = 32, seed: int = 0):
+    """Clustered random embeddings + placeholder records for offline builds"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(clusters, size=count)
+    embeddings = centers[labels] + 0.6 * rng.standard_normal((count, dim)).astype(np.float32)
+    records = [{'content': f"Synthetic chunk {i} (topic {labels[i]})", 'source': f"synthetic://topic-{labels[i]}/{i}"}
+               for i in range(count)]
+    return embeddings, records
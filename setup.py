@@ -8,6 +8,9 @@ load_dotenv()
 
 region = os.getenv('AWS_REGION', 'us-east-1')
 bucket_name = os.getenv('S3_BUCKET', 'team3-policy-documents')
+# Optional per-policy-type knowledge bases, e.g. "vacation,retirement,benefits"; each
+# indexes only s3://<bucket>/<policy type>/ and KB_SHARDS routes queries to it
+shard_types = [t.strip() for t in os.getenv('KB_SHARD_TYPES', '').split(',') if t.strip()]
 
 bedrock_agent = boto3.client('bedrock-agent', region_name=region)
 aoss = boto3.client('opensearchserverless', region_name=region)
@@ -195,7 +198,6 @@ os_client = OpenSearch(
     timeout=300
 )
 
-index_name = 'policy-docs-index'
 index_body = {
     "settings": {"index.knn": True},
     "mappings": {
@@ -207,17 +209,68 @@ index_body = {
     }
 }
 
-try:
-    if os_client.indices.exists(index=index_name):
-        print(f"Deleting existing index {index_name} to recreate with FAISS...")
-        os_client.indices.delete(index=index_name)
-        time.sleep(5)
+def create_vector_index(index_name):
+    try:
+        if os_client.indices.exists(index=index_name):
+            print(f"Deleting existing index {index_name} to recreate with FAISS...")
+            os_client.indices.delete(index=index_name)
+            time.sleep(5)
+        
+        result = os_client.indices.create(index=index_name, body=index_body)
+        print(f"Created index with FAISS: {index_name}")
+    except Exception as e:
+        print(f"Index operation error: {e}")
+        print("Attempting to continue anyway...")
+
+def create_knowledge_base(name, index_name, prefix=None, data_source_name=None):
+    """Knowledge base over `index_name` with an S3 data source (limited to `prefix` when given)"""
+    kb_response = bedrock_agent.create_knowledge_base(
+        name=name,
+        roleArn=role_arn,
+        knowledgeBaseConfiguration={
+            'type': 'VECTOR',
+            'vectorKnowledgeBaseConfiguration': {
+                'embeddingModelArn': f'arn:aws:bedrock:{region}::foundation-model/amazon.titan-embed-text-v1'
+            }
+        },
+        storageConfiguration={
+            'type': 'OPENSEARCH_SERVERLESS',
+            'opensearchServerlessConfiguration': {
+                'collectionArn': collection_arn,
+                'vectorIndexName': index_name,
+                'fieldMapping': {
+                    'vectorField': 'vector',
+                    'textField': 'text',
+                    'metadataField': 'metadata'
+                }
+            }
+        }
+    )
+    kb_id = kb_response['knowledgeBase']['knowledgeBaseId']
+    print(f"Created Knowledge Base: {kb_id}")
     
-    result = os_client.indices.create(index=index_name, body=index_body)
-    print(f"Created index with FAISS: {index_name}")
-except Exception as e:
-    print(f"Index operation error: {e}")
-    print("Attempting to continue anyway...")
+    s3_configuration = {'bucketArn': f'arn:aws:s3:::{bucket_name}'}
+    if prefix:
+        s3_configuration['inclusionPrefixes'] = [prefix]
+    ds_response = bedrock_agent.create_data_source(
+        knowledgeBaseId=kb_id,
+        name=data_source_name or f'{name}-S3',
+        dataSourceConfiguration={
+            'type': 'S3',
+            's3Configuration': s3_configuration
+        }
+    )
+    ds_id = ds_response['dataSource']['dataSourceId']
+    print(f"Created Data Source: {ds_id}")
+    return kb_id, ds_id
+
+def shard_slug(policy_type):
+    return policy_type.lower().replace(' ', '-')
+
+index_name = 'policy-docs-index'
+create_vector_index(index_name)
+for policy_type in shard_types:
+    create_vector_index(f'policy-docs-{shard_slug(policy_type)}')
 
 print("Waiting for index to be ready...")
 time.sleep(20)
@@ -229,47 +282,15 @@ try:
 except Exception as e:
     print(f"Cannot verify index: {e}")
 
-# Create Knowledge Base
-kb_response = bedrock_agent.create_knowledge_base(
-    name='PolicyDocsKB',
-    roleArn=role_arn,
-    knowledgeBaseConfiguration={
-        'type': 'VECTOR',
-        'vectorKnowledgeBaseConfiguration': {
-            'embeddingModelArn': f'arn:aws:bedrock:{region}::foundation-model/amazon.titan-embed-text-v1'
-        }
-    },
-    storageConfiguration={
-        'type': 'OPENSEARCH_SERVERLESS',
-        'opensearchServerlessConfiguration': {
-            'collectionArn': collection_arn,
-            'vectorIndexName': 'policy-docs-index',
-            'fieldMapping': {
-                'vectorField': 'vector',
-                'textField': 'text',
-                'metadataField': 'metadata'
-            }
-        }
-    }
-)
-
-kb_id = kb_response['knowledgeBase']['knowledgeBaseId']
-print(f"Created Knowledge Base: {kb_id}")
-
-# Create Data Source
-ds_response = bedrock_agent.create_data_source(
-    knowledgeBaseId=kb_id,
-    name='S3PolicyDocs',
-    dataSourceConfiguration={
-        'type': 'S3',
-        's3Configuration': {
-            'bucketArn': f'arn:aws:s3:::{bucket_name}'
-        }
-    }
-)
+# Create Knowledge Base over the whole bucket
+kb_id, ds_id = create_knowledge_base('PolicyDocsKB', index_name, data_source_name='S3PolicyDocs')
 
-ds_id = ds_response['dataSource']['dataSourceId']
-print(f"Created Data Source: {ds_id}")
+# Per-policy-type shards; the full knowledge base above answers every type without one
+shards = {}
+for policy_type in shard_types:
+    slug = shard_slug(policy_type)
+    shard_kb_id, shard_ds_id = create_knowledge_base(f'PolicyDocsKB-{slug}', f'policy-docs-{slug}', f'{slug}/')
+    shards[policy_type.lower()] = {'knowledge_base_id': shard_kb_id, 'data_source_id': shard_ds_id}
 
 # Update .env file
 env_content = f"""AWS_REGION={region}
@@ -277,6 +298,8 @@ S3_BUCKET={bucket_name}
 KNOWLEDGE_BASE_ID={kb_id}
 DATA_SOURCE_ID={ds_id}
 """
+if shards:
+    env_content += f"KB_SHARDS={json.dumps(shards, separators=(',', ':'))}\n"
 
 with open('.env', 'w') as f:
     f.write(env_content)
@@ -284,3 +307,5 @@ with open('.env', 'w') as f:
 print("\n✓ Setup complete! .env file updated with:")
 print(f"  KNOWLEDGE_BASE_ID={kb_id}")
 print(f"  DATA_SOURCE_ID={ds_id}")
+if shards:
+    print(f"  KB_SHARDS for {', '.join(shards)}")
@@ -0,0 +1,50 @@
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+
+load_dotenv()
+
+import aws_clients
+from vector_index import build_index, synthetic_corpus
+
+EMBEDDING_MODEL_ID = "amazon.titan-embed-text-v1"
+
+def load_chunks(path):
+    """JSONL with one {"content", "source", "metadata"} record per line"""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def embed_chunks(chunks):
+    embeddings = []
+    for i, chunk in enumerate(chunks):
+        response = aws_clients.invoke_model(EMBEDDING_MODEL_ID, json.dumps({"inputText": chunk['content']}), 'embedding')
+        embeddings.append(json.loads(response['body'].read())['embedding'])
+        if (i + 1) % 100 == 0:
+            print(f"Embedded {i + 1}/{len(chunks)} chunks")
+    return np.asarray(embeddings, dtype=np.float32)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build a memory-mapped vector index for RETRIEVAL_BACKEND=local')
+    parser.add_argument('output', help='Index directory (copy into lambda/ and set VECTOR_INDEX_PATH)')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--chunks', help='JSONL chunks to embed with Titan')
+    source.add_argument('--synthetic', type=int, help='Generate N synthetic embeddings (no AWS calls)')
+    parser.add_argument('--dim', type=int, default=1536, help='Synthetic embedding dimension')
+    parser.add_argument('--quantize', action='store_true', help='Store int8 codes instead of float32')
+    parser.add_argument('--nlist', type=int, default=0, help='IVF lists (0 = exact search only)')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        embeddings, records = synthetic_corpus(args.synthetic, args.dim)
+    else:
+        records = load_chunks(args.chunks)
+        embeddings = embed_chunks(records)
+
+    meta = build_index(args.output, embeddings, records, quantize=args.quantize, nlist=args.nlist)
+    print(f"Index written to {args.output}: {json.dumps(meta)}")
@@ -0,0 +1,70 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+
+import numpy as np
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+
+load_dotenv()
+
+import aws_clients
+from embedding_store import EmbeddingStore
+from ingest import IncrementalIngestor, LocalObjectStore, S3ObjectStore
+
+EMBEDDING_MODEL_ID = "amazon.titan-embed-text-v1"
+
+def titan_embed(text):
+    response = aws_clients.invoke_model(EMBEDDING_MODEL_ID, json.dumps({"inputText": text}), 'embedding')
+    return json.loads(response['body'].read())['embedding']
+
+def fake_embedder(dim):
+    """Deterministic pseudo-embeddings seeded by the text, for offline runs"""
+    def embed(text):
+        seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], 'little')
+        return np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return embed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Incrementally (re)build the local vector index from a document store')
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--bucket', default=os.getenv('S3_BUCKET'), help='Documents bucket (default S3_BUCKET)')
+    source.add_argument('--local-dir', help='Directory standing in for the bucket (no AWS calls for listing)')
+    parser.add_argument('--prefix', default='')
+    parser.add_argument('--state', default='ingest_state', help='Manifest, chunk and vector state directory')
+    parser.add_argument('--index', help='Vector index directory to rebuild when documents change')
+    parser.add_argument('--chunk-size', type=int, default=300, help='Words per chunk')
+    parser.add_argument('--overlap', type=int, default=50, help='Words shared by consecutive chunks')
+    parser.add_argument('--batch-size', type=int, default=16, help='Chunks per embedding batch')
+    parser.add_argument('--workers', type=int, default=4, help='Concurrent embedding batches')
+    parser.add_argument('--max-in-flight', type=int, help='Queued batches before reading pauses (default 2 x workers)')
+    parser.add_argument('--embedding-cache', help='Persistent embedding store directory shared across runs and indexes')
+    parser.add_argument('--embedding-cache-entries', type=int, default=200000, help='Vectors kept before LRU compaction')
+    parser.add_argument('--fake-embeddings', type=int, metavar='DIM', help='Use offline pseudo-embeddings of DIM dimensions')
+    parser.add_argument('--quantize', action='store_true', help='Store int8 codes instead of float32')
+    parser.add_argument('--nlist', type=int, default=0, help='IVF lists (0 = exact search only)')
+    args = parser.parse_args()
+
+    if args.local_dir:
+        store = LocalObjectStore(args.local_dir, args.prefix)
+    elif args.bucket:
+        store = S3ObjectStore(aws_clients.get_client('s3', 'admin'), args.bucket, args.prefix)
+    else:
+        print("Set S3_BUCKET in .env or pass --bucket / --local-dir")
+        exit(1)
+
+    embed = fake_embedder(args.fake_embeddings) if args.fake_embeddings else titan_embed
+    model_id = f"fake-{args.fake_embeddings}" if args.fake_embeddings else EMBEDDING_MODEL_ID
+    cache = EmbeddingStore(args.embedding_cache, model_id, max_entries=args.embedding_cache_entries) if args.embedding_cache else None
+    embed_batch = cache.cached_batch(lambda texts: [embed(t) for t in texts], 'chunk') if cache is not None else None
+    ingestor = IncrementalIngestor(store, embed, args.state, chunk_size=args.chunk_size, overlap=args.overlap,
+                                  batch_size=args.batch_size, workers=args.workers, max_in_flight=args.max_in_flight,
+                                  embed_batch=embed_batch)
+    report = ingestor.run(args.index, quantize=args.quantize, nlist=args.nlist)
+    if cache is not None:
+        cache.flush()
+        report['embedding_cache'] = cache.stats()
+    print(json.dumps(report, indent=2))
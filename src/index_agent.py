@@ -1,10 +1,19 @@
-import boto3
+import argparse
+import glob
+import json
 import os
+import sys
 from dotenv import load_dotenv
 
 load_dotenv()
 
-client = boto3.client('bedrock-agent', region_name=os.getenv('AWS_REGION', 'us-east-1'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+from aws_clients import get_client
+from ingest import (JOB_COMPLETE, JOB_ENDED, Manifest, S3ObjectStore, etag_manifest, has_changes,
+                    pending_manifest_name, summarize, supported)
+from shard_router import load_shard_map
+
+client = get_client('bedrock-agent', 'admin')
 
 def index_documents(knowledge_base_id, data_source_id):
     response = client.start_ingestion_job(
@@ -14,7 +23,63 @@ def index_documents(knowledge_base_id, data_source_id):
     print(f"Ingestion job started: {response['ingestionJob']['ingestionJobId']}")
     return response['ingestionJob']['ingestionJobId']
 
+def settle_pending_manifests(knowledge_base_id, data_source_id, manifest_path):
+    """Promote the pending manifest of a completed job and drop those of failed or stopped jobs.
+    Returns the ids of jobs still running."""
+    prefix = pending_manifest_name(manifest_path, '')
+    running = []
+    for pending in sorted(glob.glob(glob.escape(prefix) + '*')):
+        job_id = pending[len(prefix):]
+        try:
+            status = client.get_ingestion_job(
+                knowledgeBaseId=knowledge_base_id, dataSourceId=data_source_id, ingestionJobId=job_id
+            )['ingestionJob']['status']
+        except Exception as e:
+            print(f"Ingestion job lookup error for {job_id}: {e}")
+            running.append(job_id)
+            continue
+        if status not in JOB_ENDED:
+            running.append(job_id)
+        elif status == JOB_COMPLETE:
+            os.replace(pending, manifest_path)
+        else:
+            print(f"Ingestion job {job_id} {status}; its documents are retried by this run")
+            os.remove(pending)
+    return running
+
+def index_changed_documents(knowledge_base_id, data_source_id, bucket, manifest_path):
+    """Start ingestion only when the bucket differs from the manifest of the last completed run"""
+    running = settle_pending_manifests(knowledge_base_id, data_source_id, manifest_path)
+    if running:
+        print(f"Ingestion job {running[0]} is still running; run again once it finishes")
+        return None
+    store = S3ObjectStore(get_client('s3', 'admin'), bucket)
+    objects = [o for o in store.list_objects() if supported(o['key'])]
+    diff = Manifest.load(manifest_path).diff(objects)
+    print(f"Document changes: {json.dumps(summarize(diff))}")
+    if not has_changes(diff):
+        print("No changes since the last ingestion; skipping")
+        return None
+    job_id = index_documents(knowledge_base_id, data_source_id)
+    # Becomes the baseline only once the job completes (settled by the next run)
+    etag_manifest(objects).save(pending_manifest_name(manifest_path, job_id))
+    return job_id
+
+def index_shards(spec):
+    """Start ingestion for every shard knowledge base in KB_SHARDS that names its data source"""
+    jobs = {}
+    for policy_type, shard in load_shard_map(spec).items():
+        if shard.get('knowledge_base_id') and shard.get('data_source_id'):
+            print(f"Shard {policy_type}:")
+            jobs[policy_type] = index_documents(shard['knowledge_base_id'], shard['data_source_id'])
+    return jobs
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--incremental', action='store_true', help='Skip the job when no document changed')
+    parser.add_argument('--manifest', default='.ingest-manifest.json')
+    args = parser.parse_args()
+    
     kb_id = os.getenv('KNOWLEDGE_BASE_ID')
     ds_id = os.getenv('DATA_SOURCE_ID')
     
@@ -22,4 +87,15 @@ if __name__ == "__main__":
         print("Set KNOWLEDGE_BASE_ID and DATA_SOURCE_ID in .env")
         exit(1)
     
-    index_documents(kb_id, ds_id)
+    if args.incremental:
+        if not os.getenv('S3_BUCKET'):
+            print("Set S3_BUCKET in .env")
+            exit(1)
+        job_id = index_changed_documents(kb_id, ds_id, os.getenv('S3_BUCKET'), args.manifest)
+        # Shards index subsets of the same bucket, so they change exactly when it does
+        if job_id and os.getenv('KB_SHARDS'):
+            index_shards(os.getenv('KB_SHARDS'))
+    else:
+        index_documents(kb_id, ds_id)
+        if os.getenv('KB_SHARDS'):
+            index_shards(os.getenv('KB_SHARDS'))
@@ -1,11 +1,14 @@
-import boto3
 import os
+import sys
 import json
 from dotenv import load_dotenv
 
 load_dotenv()
 
-client = boto3.client('bedrock-agent-runtime', region_name=os.getenv('AWS_REGION', 'us-east-1'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+from aws_clients import get_client
+
+client = get_client('bedrock-agent-runtime', 'generation')
 
 HISTORY_FILE = '.chat_history.json'
 
@@ -19,22 +22,46 @@ def save_history(history):
     with open(HISTORY_FILE, 'w') as f:
         json.dump(history[-10:], f, indent=2)  # Keep last 10 exchanges
 
-def query_rag(query, knowledge_base_id, session_id):
-    response = client.retrieve_and_generate(
-        input={'text': query},
-        retrieveAndGenerateConfiguration={
+def rag_params(query, knowledge_base_id, session_id):
+    params = {
+        'input': {'text': query},
+        'retrieveAndGenerateConfiguration': {
             'type': 'KNOWLEDGE_BASE',
             'knowledgeBaseConfiguration': {
                 'knowledgeBaseId': knowledge_base_id,
                 'modelArn': f"arn:aws:bedrock:{os.getenv('AWS_REGION')}::foundation-model/anthropic.claude-3-sonnet-20240229-v1:0"
             }
-        },
-        sessionId=session_id
-    )
+        }
+    }
+    if session_id:
+        params['sessionId'] = session_id
+    return params
+
+def query_rag(query, knowledge_base_id, session_id):
+    response = client.retrieve_and_generate(**rag_params(query, knowledge_base_id, session_id))
     return response['output']['text'], response['sessionId']
 
+def print_stream(events, out=sys.stdout):
+    """Print text events as they arrive and return the reassembled answer"""
+    pieces = []
+    for event in events:
+        text = event.get('output', {}).get('text')
+        if text:
+            pieces.append(text)
+            out.write(text)
+            out.flush()
+    return ''.join(pieces)
+
+def query_rag_stream(query, knowledge_base_id, session_id):
+    response = client.retrieve_and_generate_stream(**rag_params(query, knowledge_base_id, session_id))
+    print("\nAssistant: ", end='', flush=True)
+    answer = print_stream(response['stream'])
+    print("\n")
+    return answer, response['sessionId']
+
 if __name__ == "__main__":
     kb_id = os.getenv('KNOWLEDGE_BASE_ID')
+    stream = '--no-stream' not in sys.argv
     
     if not kb_id:
         print("Set KNOWLEDGE_BASE_ID in .env")
@@ -61,10 +88,13 @@ if __name__ == "__main__":
         if not query:
             continue
         
-        answer, session_id = query_rag(query, kb_id, session_id)
+        if stream:
+            answer, session_id = query_rag_stream(query, kb_id, session_id)
+        else:
+            answer, session_id = query_rag(query, kb_id, session_id)
+            print(f"\nAssistant: {answer}\n")
         
         history.append({'query': query, 'answer': answer, 'session_id': session_id})
         save_history(history)
         
-        print(f"\nAssistant: {answer}\n")
         print(f"{'-'*60}\n")
@@ -1,10 +1,13 @@
-import boto3
 import os
+import sys
 from dotenv import load_dotenv
 
 load_dotenv()
 
-client = boto3.client('bedrock-agent', region_name=os.getenv('AWS_REGION', 'us-east-1'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lambda'))
+from aws_clients import get_client
+
+client = get_client('bedrock-agent', 'admin')
 
 def delete_knowledge_base():
     """Clean up resources"""
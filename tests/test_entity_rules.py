@@ -0,0 +1,60 @@
+import pytest
+
+from entity_rules import RuleBasedEntityExtractor
+
+THRESHOLD = 0.8
+
+
+@pytest.fixture(scope='module')
+def rules():
+    return RuleBasedEntityExtractor()
+
+
+@pytest.mark.parametrize('query, entities', [
+    ("I'm a police officer with 15 years of service in Los Angeles County. How many vacation days do I get?",
+     {'department': 'police', 'years_of_service': 15, 'county': 'Los Angeles', 'policy_type': 'vacation'}),
+    ("How many sick days do police officers get in California?",
+     {'department': 'police', 'state': 'California', 'policy_type': 'sick leave'}),
+    ("firefighter with fifteen years", {'department': 'fire', 'years_of_service': 15}),
+    ("How many vacation days do I get?", {'policy_type': 'vacation'}),
+    ("Can I carry over unused days?", {}),
+])
+def test_fully_explained_queries_are_confident(rules, query, entities):
+    result = rules.extract(query)
+    assert result['entities'] == entities
+    assert result['confidence'] >= THRESHOLD
+
+
+def test_relative_update_uses_existing_years(rules):
+    result = rules.extract("change that to 20", {'years_of_service': 15})
+    assert result['entities'] == {'years_of_service': 20}
+    assert result['confidence'] >= THRESHOLD
+
+
+@pytest.mark.parametrize('query', [
+    "librarian in Seattle",
+    "nurse in Chicago with 12 years",
+    "I'm a librarian with 20 years in California",
+    "What about Dallas?",
+    "what about dallas?",
+    "I've worked here since 2005",
+    "Can I carry over vacation OR get paid out?",
+    "police officer in OR",
+    "Can I take 30 days of vacation at once?",
+    "I am not a police officer anymore",
+    "I work for the department of motor vehicles",
+])
+def test_unexplained_queries_fall_back_to_the_model(rules, query):
+    assert rules.extract(query)['confidence'] < THRESHOLD
+
+
+def test_year_without_unit_is_not_years_of_service(rules):
+    result = rules.extract("I've worked here since 2005")
+    assert 'years_of_service' not in result['entities']
+    assert 'year without unit 2005' in result['signals']
+
+
+def test_capitalized_state_code_still_matches(rules):
+    result = rules.extract("police officer in TX with 10 years")
+    assert result['entities'] == {'department': 'police', 'state': 'Texas', 'years_of_service': 10}
+    assert result['confidence'] >= THRESHOLD
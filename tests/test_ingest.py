@@ -0,0 +1,32 @@
+import types
+
+from ingest import pdf_pages
+
+
+class StreamOnlyStore:
+    """Serves an object in blocks and refuses whole reads"""
+
+    def __init__(self, data):
+        self.data = data
+
+    def stream(self, key, block_size):
+        for i in range(0, len(self.data), block_size):
+            yield self.data[i:i + block_size]
+
+    def get(self, key):
+        raise AssertionError("PDF read whole")
+
+
+class SplitReader:
+    """Reader stand-in: one page per line of the file it is given"""
+
+    def __init__(self, f):
+        self.pages = (types.SimpleNamespace(extract_text=lambda line=line: line.decode().strip())
+                      for line in f)
+
+
+def test_pdf_is_spooled_from_the_stream_and_read_page_by_page():
+    store = StreamOnlyStore(b"first page\nsecond page\n\nfourth page\n")
+    pages = pdf_pages(SplitReader, store, 'handbook.pdf', block_size=4)
+    assert next(pages) == 'first page'
+    assert list(pages) == ['second page', '', 'fourth page']
@@ -0,0 +1,37 @@
+from grounding import GroundingChecker
+from lexical_index import BM25Index, reciprocal_rank_fusion
+
+RECORDS = [{'content': f"Tier {i} members use plan code PX-{i} for dental claims", 'source': f"s3://policies/plan-{i}.txt"}
+           for i in range(20)]
+
+
+def vector_hits(*pairs):
+    return [{**RECORDS[row], 'score': score} for row, score in pairs]
+
+
+def test_fused_score_is_the_vector_similarity():
+    lexical = BM25Index(RECORDS).retrieve("plan code PX-7", 4)
+    fused = reciprocal_rank_fusion([vector_hits((3, 0.31), (4, 0.29), (5, 0.22)), lexical], limit=5)
+
+    assert max(d['score'] for d in fused) == 0.31
+    # Found only by BM25: ranked by fusion, but no more similar than the weakest vector hit
+    px7 = next(d for d in fused if d['source'].endswith('plan-7.txt'))
+    assert px7['score'] == 0.22 and px7['rank_score'] == 1.0
+    assert all('lexical_score' not in d or d['lexical_score'] > 0 for d in fused)
+
+
+def test_weak_hybrid_results_do_not_pass_the_grounding_gate():
+    lexical = BM25Index(RECORDS).retrieve("plan code PX-7", 4)
+    fused = reciprocal_rank_fusion([vector_hits((3, 0.31)), lexical], limit=5)
+    query, answer = "Which plan code do tier 7 members use?", "Tier 7 members use plan code PX-7 for dental claims."
+    checker = GroundingChecker(min_score=0.5)
+
+    assert checker.check(query, answer, fused)['supported_claims'] == [answer]
+    assert checker.verdict(query, answer, fused) is None
+    assert checker.verdict(query, answer, [{**d, 'score': 0.8} for d in fused]) is not None
+
+
+def test_records_without_tokens_build_an_empty_index():
+    index = BM25Index([{'content': ''}, {'content': '-- !!'}])
+    assert len(index) == 2
+    assert index.search('vacation') == []
@@ -0,0 +1,90 @@
+import pytest
+
+from cache import LRUCache
+from conversation_summary import ConversationSummarizer
+from memory_store import InMemoryMemoryBackend, MemoryStore, SQLiteMemoryBackend
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request):
+    return InMemoryMemoryBackend() if request.param == 'memory' else SQLiteMemoryBackend()
+
+
+def container(backend):
+    """A warm container: its own store and L1 over the shared backend"""
+    return MemoryStore(backend, l1=LRUCache(max_entries=16, ttl_seconds=300))
+
+
+def take_turn(store, session_id, extracted, query):
+    context = store.load(session_id)
+    return store.record_turn(context, {**context['entities'], **extracted}, query, f"answer to {query}")
+
+
+def test_l1_entry_is_revalidated_after_another_containers_turn(backend):
+    a, b = container(backend), container(backend)
+    take_turn(a, 's', {'department': 'police', 'years_of_service': 15}, 'q1')
+    take_turn(b, 's', {'years_of_service': 20}, 'q2')
+
+    context = a.load('s')
+    assert context['entities']['years_of_service'] == 20
+    assert [h['query'] for h in context['history']] == ['q1', 'q2']
+    assert a.stats()['l1_stale'] == 1
+
+
+def test_current_l1_entry_skips_the_full_read(backend):
+    a = container(backend)
+    take_turn(a, 's', {'department': 'police'}, 'q1')
+    reads = backend.reads
+
+    assert a.load('s')['entities'] == {'department': 'police'}
+    assert backend.reads == reads
+    assert a.stats()['l1_hits'] == 1
+
+
+def test_conflict_reapplies_only_this_turns_changes(backend):
+    a, b = container(backend), container(backend)
+    take_turn(a, 's', {'department': 'police', 'years_of_service': 15}, 'q1')
+
+    # A reads, B commits a newer turn, then A writes against its stale read
+    stale = a.load('s')
+    take_turn(b, 's', {'years_of_service': 20}, 'q2')
+    updated = a.record_turn(stale, {**stale['entities'], 'policy_type': 'vacation'}, 'q3', 'r3')
+
+    stored = backend.get('s')
+    assert stored['entities'] == {'department': 'police', 'years_of_service': 20, 'policy_type': 'vacation'}
+    assert [h['query'] for h in stored['history']] == ['q1', 'q2', 'q3']
+    assert updated['version'] == stored['version'] == 3
+    assert a.stats()['conflicts'] == 1
+
+
+def test_conflict_keeps_a_correction_made_this_turn(backend):
+    a, b = container(backend), container(backend)
+    take_turn(a, 's', {'years_of_service': 15, 'state': 'Texas'}, 'q1')
+
+    stale = a.load('s')
+    take_turn(b, 's', {'state': 'Oregon'}, 'q2')
+    a.record_turn(stale, {**stale['entities'], 'years_of_service': 25}, 'q3', 'r3')
+
+    assert backend.get('s')['entities'] == {'years_of_service': 25, 'state': 'Oregon'}
+
+
+def test_conflict_retry_does_not_summarize_again(backend):
+    prompts = []
+    summarizer = ConversationSummarizer(lambda prompt: prompts.append(prompt) or "Asked about leave.")
+    a = MemoryStore(backend, l1=LRUCache(max_entries=16, ttl_seconds=300), max_turns=3, keep_turns=1,
+                    summarizer=summarizer)
+    b = container(backend)
+    for q in ('q1', 'q2', 'q3'):
+        take_turn(b, 's', {}, q)
+
+    # A folds on its stale read, conflicts with B's turn and retries
+    stale = a.load('s')
+    take_turn(b, 's', {}, 'q4')
+    a.record_turn(stale, stale['entities'], 'q5', 'r5')
+
+    stored = backend.get('s')
+    assert len(prompts) == 1
+    assert a.stats()['conflicts'] == 1
+    assert [h['query'] for h in stored['history']] == ['q5']
+    # The turn the first fold never saw is added without another model call
+    assert stored['summary'] == "Asked about leave. Asked: q4."
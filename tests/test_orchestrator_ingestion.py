@@ -0,0 +1,94 @@
+import io
+import types
+
+import pytest
+
+
+class NoSuchKey(Exception):
+    pass
+
+
+class FakeS3:
+    """Two buckets in a dict: documents and the manifest bucket"""
+
+    exceptions = types.SimpleNamespace(NoSuchKey=NoSuchKey)
+
+    def __init__(self):
+        self.objects = {}
+
+    def get_paginator(self, name):
+        s3 = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix=''):
+                yield s3.list_objects_v2(Bucket, Prefix)
+        return Paginator()
+
+    def list_objects_v2(self, Bucket, Prefix=''):
+        return {'Contents': [{'Key': k, 'ETag': f'"{v[1]}"', 'Size': len(v[0])}
+                             for (b, k), v in sorted(self.objects.items()) if b == Bucket and k.startswith(Prefix)]}
+
+    def put_object(self, Bucket, Key, Body, etag='m'):
+        self.objects[(Bucket, Key)] = (Body, etag)
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise NoSuchKey(Key)
+        return {'Body': io.BytesIO(self.objects[(Bucket, Key)][0])}
+
+    def copy_object(self, Bucket, Key, CopySource):
+        self.objects[(Bucket, Key)] = self.objects[(CopySource['Bucket'], CopySource['Key'])]
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+
+class FakeAgent:
+    def __init__(self):
+        self.jobs = {}
+
+    def start_ingestion_job(self, knowledgeBaseId, dataSourceId):
+        job_id = f"job-{len(self.jobs) + 1}"
+        self.jobs[job_id] = 'STARTING'
+        return {'ingestionJob': {'ingestionJobId': job_id, 'status': 'STARTING'}}
+
+    def get_ingestion_job(self, knowledgeBaseId, dataSourceId, ingestionJobId):
+        return {'ingestionJob': {'ingestionJobId': ingestionJobId, 'status': self.jobs[ingestionJobId]}}
+
+
+@pytest.fixture
+def ingestion(monkeypatch):
+    monkeypatch.setenv('KNOWLEDGE_BASE_ID', 'kb')
+    monkeypatch.setenv('DATA_SOURCE_ID', 'ds')
+    monkeypatch.setenv('AWS_REGION', 'us-east-1')
+    import orchestrator
+    s3, agent = FakeS3(), FakeAgent()
+    monkeypatch.setattr(orchestrator, 'S3_BUCKET', 'docs')
+    monkeypatch.setattr(orchestrator, 'INGEST_MANIFEST_BUCKET', 'state')
+    monkeypatch.setattr(orchestrator, 'get_client', lambda service, stage='default': s3)
+    monkeypatch.setattr(orchestrator, 'bedrock_agent', agent)
+    return types.SimpleNamespace(start_ingestion=orchestrator.start_ingestion, s3=s3, agent=agent)
+
+
+def test_failed_job_leaves_its_documents_for_the_next_run(ingestion):
+    s3, agent = ingestion.s3, ingestion.agent
+    s3.put_object('docs', 'a.txt', b'a', etag='1')
+
+    first = ingestion.start_ingestion(incremental=True)
+    assert first['changes']['new'] == 1
+    assert ingestion.start_ingestion(incremental=True)['status'] == 'IN_PROGRESS'
+
+    agent.jobs[first['job_id']] = 'FAILED'
+    retry = ingestion.start_ingestion(incremental=True)
+    assert retry['job_id'] != first['job_id']
+    assert retry['changes']['new'] == 1
+
+
+def test_completed_job_becomes_the_baseline(ingestion):
+    s3, agent = ingestion.s3, ingestion.agent
+    s3.put_object('docs', 'a.txt', b'a', etag='1')
+
+    job = ingestion.start_ingestion(incremental=True)
+    agent.jobs[job['job_id']] = 'COMPLETE'
+    assert ingestion.start_ingestion(incremental=True)['status'] == 'SKIPPED'
+    assert [k for b, k in s3.objects if b == 'state'] == ['ingest-manifest.json']
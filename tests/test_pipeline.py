@@ -0,0 +1,136 @@
+import asyncio
+import threading
+import time
+
+from pipeline import FROM_SPECULATION, AsyncPipelineScheduler, PipelineScheduler, Stage
+
+
+class StubAgents:
+    """Extractor, enhancer and retriever with injected delays that record their calls"""
+
+    def __init__(self, extracted, extract_delay=0.15, enhance_delay=0.02, retrieve_delay=0.02):
+        self.extracted = extracted
+        self.extract_delay = extract_delay
+        self.enhance_delay = enhance_delay
+        self.retrieve_delay = retrieve_delay
+        self.calls = {'extract': [], 'enhance': [], 'retrieve': []}
+        self.lock = threading.Lock()
+        # Set by the first retrieval; extraction can wait on it to observe overlap
+        self.retrieved = threading.Event()
+        self.overlap_timeout = None
+        self.overlapped = None
+
+    def record(self, name, value):
+        with self.lock:
+            self.calls[name].append(value)
+
+    def extract(self, r):
+        if self.overlap_timeout is not None:
+            self.overlapped = self.retrieved.wait(self.overlap_timeout)
+        time.sleep(self.extract_delay)
+        self.record('extract', r['query'])
+        return self.extracted
+
+    def enhance(self, r):
+        time.sleep(self.enhance_delay)
+        self.record('enhance', dict(r['entities']))
+        context = ", ".join(f"{k}: {v}" for k, v in sorted(r['entities'].items()))
+        return f"{r['query']} [{context}]"
+
+    def retrieve(self, r):
+        time.sleep(self.retrieve_delay)
+        self.record('retrieve', r['enhanced_query'])
+        self.retrieved.set()
+        return [f"doc for {r['enhanced_query']}"]
+
+    def stages(self, memory_entities):
+        return [
+            Stage('context', lambda r: {'entities': memory_entities}),
+            Stage('entities', self.extract, deps=['context']),
+            Stage('enhanced_query', self.enhance, deps=['entities', 'context'],
+                  speculate={'entities': lambda r: r['context']['entities']}),
+            Stage('retrieved', self.retrieve, deps=['enhanced_query'],
+                  speculate={'enhanced_query': FROM_SPECULATION}),
+        ]
+
+
+def test_hit_keeps_speculative_results():
+    agents = StubAgents({'department': 'police'})
+    agents.overlap_timeout = 5
+    results = PipelineScheduler().run(agents.stages({'department': 'police'}), {'query': 'vacation days'})
+
+    assert results['_report']['speculation'] == {'enhanced_query': 'hit', 'retrieved': 'hit'}
+    assert results['retrieved'] == ['doc for vacation days [department: police]']
+    assert len(agents.calls['enhance']) == 1
+    assert len(agents.calls['retrieve']) == 1
+    # Retrieval finished while extraction was still running, not after it
+    assert agents.overlapped
+
+
+def test_miss_reruns_on_real_inputs():
+    agents = StubAgents({'department': 'fire'})
+    results = PipelineScheduler().run(agents.stages({'department': 'police'}), {'query': 'vacation days'})
+
+    assert results['_report']['speculation']['enhanced_query'] == 'miss'
+    assert results['enhanced_query'] == 'vacation days [department: fire]'
+    assert results['retrieved'] == ['doc for vacation days [department: fire]']
+    assert agents.calls['enhance'] == [{'department': 'police'}, {'department': 'fire'}]
+
+
+def test_miss_discards_chained_speculation():
+    # Enhancement finishes well before extraction, so retrieval speculates on the stale rewrite
+    agents = StubAgents({'department': 'fire'}, extract_delay=0.2)
+    results = PipelineScheduler().run(agents.stages({'department': 'police'}), {'query': 'vacation days'})
+
+    assert results['_report']['speculation'] == {'enhanced_query': 'miss', 'retrieved': 'miss'}
+    assert agents.calls['retrieve'] == ['vacation days [department: police]', 'vacation days [department: fire]']
+    assert results['retrieved'] == ['doc for vacation days [department: fire]']
+
+
+def test_retrieval_waits_without_speculative_enhancement():
+    # Extraction wins the race: the enhancement guess is ruled out before it
+    # finishes, and retrieval never runs on a query nobody asked for
+    agents = StubAgents({'department': 'fire'}, extract_delay=0.0, enhance_delay=0.1)
+    results = PipelineScheduler().run(agents.stages({'department': 'police'}), {'query': 'vacation days'})
+
+    assert 'retrieved' not in results['_report']['speculation']
+    assert agents.calls['retrieve'] == ['vacation days [department: fire]']
+
+
+def test_failed_speculation_is_dropped_and_rerun():
+    agents = StubAgents({'department': 'police'})
+    stages = agents.stages({'department': 'police'})
+    stages[-1] = Stage('retrieved', _fail_once(agents.retrieve), deps=['enhanced_query'],
+                       speculate={'enhanced_query': FROM_SPECULATION})
+    results = PipelineScheduler().run(stages, {'query': 'vacation days'})
+
+    assert results['_report']['speculation']['retrieved'] == 'error'
+    assert results['retrieved'] == ['doc for vacation days [department: police]']
+
+
+def test_speculation_disabled():
+    agents = StubAgents({'department': 'police'})
+    results = PipelineScheduler(speculative=False).run(agents.stages({'department': 'police'}), {'query': 'q'})
+
+    assert results['_report']['speculation'] == {}
+    assert len(agents.calls['enhance']) == 1
+    assert len(agents.calls['retrieve']) == 1
+
+
+def test_async_scheduler_hit_and_miss():
+    for extracted, outcome in (({'department': 'police'}, 'hit'), ({'department': 'fire'}, 'miss')):
+        agents = StubAgents(extracted)
+        results = asyncio.run(AsyncPipelineScheduler().run(agents.stages({'department': 'police'}), {'query': 'q'}))
+        assert results['_report']['speculation']['enhanced_query'] == outcome
+        assert results['retrieved'] == [f"doc for q [department: {extracted['department']}]"]
+
+
+def _fail_once(fn):
+    failed = []
+
+    def call(r):
+        if not failed:
+            failed.append(True)
+            raise RuntimeError("transient failure")
+        return fn(r)
+    return call
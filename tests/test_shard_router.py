@@ -0,0 +1,75 @@
+from ingestion_watch import IngestionGeneration, generation_of
+from shard_router import ShardRouter
+
+
+def retriever(name, docs):
+    def search(query, n, filters):
+        return [{'source': f"{name}/{d}", 'content': d, 'score': 0.5} for d in docs][:n]
+    return search
+
+
+def shards(**extra):
+    retrievers = {'vac': retriever('vac', ['accrual']), 'ret': retriever('ret', ['pension']),
+                  'main': retriever('main', ['accrual', 'pension', 'dress code'])}
+    return ShardRouter(retrievers, {'vacation': 'vac', 'retirement': 'ret'}, **extra)
+
+
+def test_unmapped_types_search_the_main_knowledge_base():
+    router = shards(default='main')
+    assert [d['shard'] for d in router.retrieve('q', 5, None, 'Vacation')] == ['vac']
+    for policy_type in (None, 'dress code', 'unknown'):
+        assert [d['content'] for d in router.retrieve('q', 5, None, policy_type)] == ['accrual', 'pension', 'dress code']
+    assert router.stats()['unrouted'] == 3 and router.stats()['fanout'] == 0
+
+
+def test_without_a_default_unmapped_types_fan_out():
+    router = ShardRouter({'vac': retriever('vac', ['accrual']), 'ret': retriever('ret', ['pension'])},
+                         {'vacation': 'vac', 'retirement': 'ret'})
+    assert {d['shard'] for d in router.retrieve('q', 5, None, None)} == {'vac', 'ret'}
+    assert router.stats()['fanout'] == 1
+
+
+def test_generation_changes_when_a_shard_is_reingested():
+    jobs = [{'ingestionJobId': 'main-1', 'status': 'COMPLETE'}, {'ingestionJobId': 'vac-1', 'status': 'COMPLETE'}]
+    generation = IngestionGeneration(lambda: [dict(j) for j in jobs], refresh_seconds=0)
+    before = generation.current()
+    jobs[1] = {'ingestionJobId': 'vac-2', 'status': 'IN_PROGRESS'}
+    assert generation.current() != before
+    assert generation_of([None, jobs[1]]) == 'none|vac-2:IN_PROGRESS'
+    assert generation_of([]) == 'none'
+
+
+def scored(name, scores):
+    def search(query, n, filters):
+        return [{'source': f"{name}/{i}", 'content': f"{name} {i}", 'score': score}
+                for i, score in enumerate(scores)][:n]
+    return search
+
+
+def test_fan_out_keeps_a_single_strong_match():
+    router = ShardRouter({'busy': scored('busy', [0.9, 0.7, 0.5, 0.3, 0.1]), 'sparse': scored('sparse', [0.95])},
+                         {'vacation': 'busy', 'retirement': 'sparse'})
+    results = router.retrieve('q', 3, None, None)
+
+    assert [d['source'] for d in results] == ['sparse/0', 'busy/0', 'busy/1']
+    assert results[0]['score'] == 0.95
+    # Scores of a busy shard are still normalized against its own spread
+    assert 0.5 < results[2]['score'] < results[1]['score'] < 0.95
+
+
+def test_fan_out_normalizes_shards_on_different_scales():
+    router = ShardRouter({'small': scored('small', [0.2, 0.1, 0.1]), 'large': scored('large', [9.0, 8.5, 8.0, 8.4])},
+                         {'vacation': 'small', 'retirement': 'large'})
+    results = router.retrieve('q', 2, None, None)
+
+    # Each shard's standout hit leads, however large its raw scores run
+    assert {d['source'] for d in results} == {'small/0', 'large/0'}
+    assert all(0 < d['score'] < 1 for d in results)
+
+
+def test_uniform_scores_off_the_relevance_scale_do_not_crowd_out():
+    router = ShardRouter({'busy': scored('busy', [0.9, 0.7, 0.5, 0.3, 0.1]), 'flat': scored('flat', [2.6, 2.6, 2.6])},
+                         {'vacation': 'busy', 'retirement': 'flat'})
+    results = router.retrieve('q', 2, None, None)
+
+    assert [d['source'] for d in results] == ['busy/0', 'busy/1']
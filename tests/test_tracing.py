@@ -0,0 +1,17 @@
+import tracing
+
+
+def test_repeated_stage_outcomes_are_all_counted():
+    with tracing.tracing() as trace:
+        for outcome in ('hit', 'miss', 'hit'):
+            tracing.record_event('model_cache:embedding', outcome)
+        tracing.record_event('model_cache:extraction', 'miss')
+        tracing.record_event('answer_cache', 'miss')
+        tracing.record_event('validation', 'local')
+    summary = trace.summary()
+
+    assert summary['cache']['model_cache:embedding'] == {'hit': 2, 'miss': 1}
+    request = tracing.emf_records(summary, 'sync')[-1]
+    assert request['ModelCacheHits'] == 2
+    assert request['AnswerCacheHit'] == 0
+    assert request['ValidationSkipped'] == 1
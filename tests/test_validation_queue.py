@@ -0,0 +1,32 @@
+from validation_queue import COMPLETE, PENDING, DeferredValidation, InMemoryValidationStore, validation_id
+
+
+class RecordingQueue:
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, job):
+        self.jobs.append(job)
+
+
+def test_concurrent_turns_of_a_session_keep_separate_verdicts():
+    deferred = DeferredValidation(InMemoryValidationStore(), RecordingQueue())
+    # Both turns read the same context version before either memory write lands
+    first = deferred.defer({'validation_id': validation_id('s'), 'answer': 'a1'})
+    second = deferred.defer({'validation_id': validation_id('s'), 'answer': 'a2'})
+    assert first['validation_id'] != second['validation_id']
+
+    for job in deferred.queue.jobs:
+        deferred.complete(job, lambda job: {'is_valid': job['answer'] == 'a1'})
+
+    assert deferred.get(first['validation_id'])['validation'] == {'is_valid': True}
+    assert deferred.get(second['validation_id'])['validation'] == {'is_valid': False}
+    assert deferred.get(first['validation_id'])['status'] == COMPLETE
+
+
+def test_pending_until_the_worker_completes():
+    deferred = DeferredValidation(InMemoryValidationStore(), RecordingQueue())
+    pending = deferred.defer({'validation_id': validation_id('s')})
+    assert pending['status'] == PENDING
+    assert pending['validation_id'].startswith('s#')
+    assert deferred.get(pending['validation_id'])['status'] == PENDING